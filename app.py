@@ -1,4 +1,5 @@
 # app.py
+import click
 import datetime
 from datetime import timedelta
 
@@ -20,6 +21,62 @@ def create_app(config_name='default'):
     migrate.init_app(app, db)
     csrf.init_app(app)
 
+    # Catalog search index, kept in sync from product commits
+    from services.search import init_search
+    init_search(app)
+
+    # Typeahead suggestions from a shared, memory-mapped prefix index
+    from services.suggest import init_suggest
+    init_suggest(app)
+
+    # Facet counts for product listings, cached per filter combination
+    from services.facets import init_facets
+    init_facets(app)
+
+    # Bitmap index resolving listing filter combinations to product ids
+    from services.attribute_index import init_attribute_index
+    init_attribute_index(app)
+
+    # Category tree for subtree listings
+    from services.category_tree import init_category_tree
+    init_category_tree(app)
+
+    # Active product counts per category (with subtree rollups) and brand
+    from services.product_counts import init_product_counts
+    init_product_counts(app)
+
+    # Categories, featured products and brands shared by every template
+    from services.global_context import init_global_context
+    init_global_context(app)
+
+    # Product page views, buffered in memory and flushed in batches
+    from services.view_counter import init_view_counter
+    init_view_counter(app)
+
+    # Thumbnails and responsive WebP derivatives of uploaded images
+    from services.images import init_images
+    init_images(app)
+
+    # Fingerprinted, precompressed static files with immutable caching
+    from services.static_assets import init_static_assets
+    init_static_assets(app)
+
+    # Cached variation matrices for the product page option picker
+    from services.variation_matrix import init_variation_matrix
+    init_variation_matrix(app)
+
+    # Server-side guest carts behind an opaque cart id cookie
+    from services.cart_store import init_cart_store
+    init_cart_store(app)
+
+    # Memoized cart pricing (line totals, GST, shipping, coupons)
+    from services.pricing import init_pricing
+    init_pricing(app)
+
+    # Background worker for bulk catalog imports
+    from services.catalog_import import init_catalog_import
+    init_catalog_import(app)
+
     # Session timeout handling - AUTO LOGOUT AFTER 10 MINUTES INACTIVITY
     @app.before_request
     def before_request():
@@ -58,29 +115,15 @@ def create_app(config_name='default'):
     @app.context_processor
     def inject_global_vars():
         """Inject global variables into all templates"""
-        from models.category import Category
-        from models.product import Product
-        from models.brand import Brand
+        from services.global_context import get_catalog_context
 
         try:
-            categories = Category.query.filter_by(is_active=True).all()
-            featured_products = Product.query.filter_by(
-                is_featured=True,
-                status='active'
-            ).limit(8).all()
-            brands = Brand.query.filter_by(is_active=True).all()
-
-            # Create site_settings fallback from config
-            site_settings = {
-                'free_shipping_threshold': str(app.config.get('FREE_SHIPPING_THRESHOLD', 999)),
-                'return_period_days': str(app.config.get('RETURN_PERIOD_DAYS', 10)),
-                'gst_number': '',
-                'store_name': 'Pavitra Enterprises',
-                'store_email': 'support@pavitraenterprises.com',
-                'store_phone': '+91-9711317009',
-                'currency': app.config.get('CURRENCY', 'INR'),
-                'currency_symbol': app.config.get('CURRENCY_SYMBOL', '₹')
-            }
+            # Cached snapshot, rebuilt after catalog commits or GLOBAL_CONTEXT_TTL
+            catalog = get_catalog_context()
+            categories = catalog['categories']
+            featured_products = catalog['featured_products']
+            brands = catalog['brands']
+            site_settings = catalog['site_settings']
 
         except Exception as e:
             print(f"Error loading global data: {e}")
@@ -100,19 +143,18 @@ def create_app(config_name='default'):
     @app.context_processor
     def inject_user_data():
         """Inject user-specific data"""
-        from models.wishlist import Wishlist
-        from models.cart import ShoppingCart
+        from services.cart_store import guest_cart_quantity
 
         wishlist_count = 0
         cart_count = 0
 
         if current_user.is_authenticated:
-            wishlist_count = Wishlist.query.filter_by(user_id=current_user.id).count()
-            cart_count = ShoppingCart.query.filter_by(user_id=current_user.id).count()
+            # Counters live on the user row Flask-Login already loaded
+            wishlist_count = current_user.get_wishlist_count()
+            cart_count = current_user.get_cart_quantity()
         else:
-            # Session-based cart for guests
-            if 'cart' in session:
-                cart_count = sum(item.get('quantity', 0) for item in session['cart'])
+            # Server-side cart behind the guest's cart id cookie
+            cart_count = guest_cart_quantity()
 
         return dict(
             user_wishlist_count=wishlist_count,
@@ -139,10 +181,12 @@ def register_blueprints(app):
     from routes.auth_routes import auth_bp
     from routes.shop_routes import shop_bp
     from routes.admin_routes import admin_bp
+    from routes.api_routes import api_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(shop_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp)
 
 
 def register_error_handlers(app):
@@ -191,6 +235,161 @@ def register_commands(app):
         db.session.commit()
         print("Admin user created: admin@pavitra.com / admin123")
 
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Rebuild the product search index"""
+        from services.search import get_product_search
+
+        product_search = get_product_search()
+        count = product_search.rebuild()
+        print(f"Indexed {count} products using the '{product_search.backend.name}' search backend")
+
+    @app.cli.command('rebuild-suggest-index')
+    def rebuild_suggest_index():
+        """Rebuild the search typeahead snapshot"""
+        from services.suggest import get_suggest_index
+
+        suggest_index = get_suggest_index()
+        count = suggest_index.rebuild()
+        print(f"Wrote {count} suggestion keys to {suggest_index.path}")
+
+    @app.cli.command('rebuild-review-stats')
+    def rebuild_review_stats():
+        """Recompute product rating aggregates from approved reviews"""
+        from models.review import rebuild_rating_aggregates
+
+        corrected = rebuild_rating_aggregates()
+        print(f"Corrected rating aggregates for {corrected} products")
+
+    @app.cli.command('rebuild-category-paths')
+    def rebuild_category_paths_command():
+        """Recompute category materialized paths from parent_id"""
+        from models.category import rebuild_category_paths
+
+        fixed = rebuild_category_paths()
+        print(f"Fixed paths for {fixed} categories")
+
+    @app.cli.command('build-recommendations')
+    @click.option('--full', is_flag=True, help='Recompute every product instead of those changed since the last run')
+    def build_recommendations_command(full):
+        """Build related and frequently-bought-together products"""
+        from services.recommendations import build_recommendations, refresh_recommendations
+
+        count = build_recommendations() if full else refresh_recommendations()
+        print(f"Recommendations computed for {count} products")
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint and precompress static CSS/JS/vendor files into static/dist"""
+        from services.static_assets import build_assets, brotli, get_static_assets
+
+        manifest = build_assets(app.static_folder, app.config.get('STATIC_ASSET_DIRS', ['css', 'js', 'vendor']))
+        get_static_assets().reload()
+        print(f"Fingerprinted {len(manifest)} static files into static/dist")
+        if brotli is None:
+            print("brotli is not installed; only gzip variants were written")
+
+    @app.cli.command('process-images')
+    @click.option('--force', is_flag=True, help='Re-render images that already have derivatives')
+    def process_images(force):
+        """Create thumbnails and WebP/srcset derivatives for existing product, category and review images"""
+        from services.images import backfill_images
+
+        processed, failed, skipped = backfill_images(force=force)
+        print(f"Processed {processed} images ({failed} failed, {skipped} skipped)")
+
+    @app.cli.command('build-sitemap')
+    @click.option('--delta', is_flag=True, help='Only rewrite shards with products changed since the last run')
+    def build_sitemap(delta):
+        """Write sharded, gzipped sitemaps and the sitemap.xml index"""
+        from services.feeds import build_sitemaps
+
+        with app.test_request_context(base_url=app.config['SITE_URL']):
+            result = build_sitemaps(delta=delta)
+        print(f"Wrote {result['shards']} sitemap files with {result['urls']} URLs")
+
+    @app.cli.command('build-product-feed')
+    @click.option('--delta', is_flag=True, help='Only products changed since the last run')
+    @click.option('--format', 'formats', type=click.Choice(['xml', 'tsv']), multiple=True,
+                  help='Feed formats to write (default: both)')
+    def build_product_feed_command(delta, formats):
+        """Write the merchant product feed as gzipped XML and TSV"""
+        from services.feeds import build_product_feed
+
+        with app.test_request_context(base_url=app.config['SITE_URL']):
+            count = build_product_feed(delta=delta, formats=formats or ('xml', 'tsv'))
+        print(f"Wrote {count} products to the {'delta ' if delta else ''}product feed")
+
+    @app.cli.command('import-catalog')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--admin-email', help='Admin recorded as performing the stock movements')
+    def import_catalog(path, admin_email):
+        """Create or update products from a CSV/JSONL file (optionally .gz), upserting by SKU"""
+        from services.catalog_import import create_import_job, run_import
+
+        admin = User.query.filter_by(email=admin_email).first() if admin_email else None
+        try:
+            job = create_import_job(os.path.basename(path), os.path.abspath(path), admin.id if admin else None)
+        except ValueError as e:
+            print(e)
+            return
+        job = run_import(job.id)
+        print(f"Import {job.status}: {job.message}")
+        if job.report_path:
+            print(f"Rejected rows: {job.report_path}")
+
+    @app.cli.command('purge-guest-carts')
+    @click.option('--days', type=int, help='Idle days before a guest cart is removed (default CART_TTL_DAYS)')
+    def purge_guest_carts(days):
+        """Delete guest carts nobody has touched for CART_TTL_DAYS"""
+        from services.cart_store import get_cart_store
+
+        days = days if days is not None else app.config.get('CART_TTL_DAYS', 30)
+        count = get_cart_store().purge(datetime.datetime.utcnow() - timedelta(days=days))
+        print(f"Removed {count} guest carts idle for more than {days} days")
+
+    @app.cli.command('advise-indexes')
+    def advise_indexes():
+        """EXPLAIN the SQL behind the hot storefront pages and report scans and sorts"""
+        from services.query_advisor import advise
+
+        report = advise(app)
+        flagged = [entry for entry in report if entry['issues']]
+        for entry in flagged:
+            print("-" * 70)
+            print(' '.join(entry['statement'].split())[:300])
+            for step in entry['issues']:
+                problem = 'full scan' if step.full_scan else 'sort without index'
+                print(f"  {problem}: {step.detail}")
+            for table, columns in entry['suggestions'].items():
+                print(f"  suggested index: {table} ({', '.join(columns)})")
+        print(f"{len(report)} statements captured, {len(flagged)} with full scans or sorts")
+
+    @app.cli.command('check-query-plans')
+    @click.option('--min-rows', type=int, default=None,
+                  help='On MySQL, skip queries on tables smaller than this (default QUERY_PLAN_MIN_ROWS)')
+    def check_query_plans_command(min_rows):
+        """Fail when a hot query no longer uses its index"""
+        import sys
+        from services.query_advisor import check_query_plans
+
+        if min_rows is None:
+            min_rows = app.config.get('QUERY_PLAN_MIN_ROWS', 1000)
+        failed = 0
+        for name, passed, used, details in check_query_plans(min_rows):
+            if passed is None:
+                print(f"SKIP {name}: table below {min_rows} rows, index {used}")
+                continue
+            print(f"{'OK  ' if passed else 'FAIL'} {name}: index {used}")
+            if not passed:
+                failed += 1
+                for detail in details:
+                    print(f"       {detail}")
+        if failed:
+            print(f"{failed} hot queries lost their index")
+            sys.exit(1)
+        print("All hot queries use their indexes")
+
     @app.cli.command('seed-data')
     def seed_data():
         """Seed sample data"""
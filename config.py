@@ -48,8 +48,98 @@ class Config:
     DEFAULT_COUNTRY_CODE = '+91'
     DEFAULT_GST_RATE = 18.0
     FREE_SHIPPING_THRESHOLD = 999.00
+    SHIPPING_FLAT_RATE = 49.00  # charged below FREE_SHIPPING_THRESHOLD
+    GST_HOME_STATE = os.getenv('GST_HOME_STATE', '')  # seller's state; other states are charged IGST
     RETURN_PERIOD_DAYS = 10
 
+    # Storefront listings (keyset pagination)
+    PRODUCTS_PER_PAGE = 24
+    MAX_PRODUCTS_PER_PAGE = 96
+
+    # Product search: 'auto', 'memory', 'sqlite_fts5' or 'mysql_fulltext'
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+    SEARCH_SYNC_INTERVAL = 30  # seconds between polls for other workers' edits
+    SEARCH_MAX_RESULTS = 1000
+
+    # Search typeahead (memory-mapped prefix index shared by all workers)
+    SUGGEST_SNAPSHOT_PATH = os.getenv('SUGGEST_SNAPSHOT_PATH')  # defaults to instance/suggest_index.bin
+    SUGGEST_OVERLAY_LIMIT = 500  # entries changed since the snapshot before it is rebuilt
+    SUGGEST_SYNC_INTERVAL = 30  # seconds between polls for other workers' edits
+    SUGGEST_RELOAD_INTERVAL = 5  # seconds between checks for a newer snapshot file
+    SUGGEST_MAX_RESULTS = 20
+
+    # Faceted navigation
+    PRICE_BUCKET_BOUNDARIES = [500, 1000, 2500, 5000, 10000, 25000]  # INR
+    FACET_CACHE_SIZE = 512
+    FACET_CACHE_TTL = 300  # seconds
+    ATTRIBUTE_INDEX_SYNC_INTERVAL = 30  # seconds between polls for other workers' edits
+    ATTRIBUTE_INDEX_MAX_IDS = 5000  # broader filter matches fall back to SQL predicates
+
+    # Category tree used for subtree listings
+    CATEGORY_TREE_TTL = 300  # seconds
+
+    # Active product counts per category and brand
+    PRODUCT_COUNT_CACHE_TTL = 300  # seconds
+
+    # Categories, featured products and brands injected into every template
+    GLOBAL_CONTEXT_TTL = 60  # seconds; other workers' edits show up within this
+
+    # Product view counting (buffered per worker, flushed in batches)
+    VIEW_COUNT_FLUSH_INTERVAL = 30  # seconds
+    VIEW_COUNT_FLUSH_THRESHOLD = 1000  # buffered views that trigger an early flush
+
+    # Product recommendations (flask build-recommendations)
+    RECOMMENDATION_TOP_K = 12  # neighbours stored per product and kind
+    RECOMMENDATION_CANDIDATES = 200  # best sellers per category compared for related products
+
+    # Product page variation matrices (option value combination -> variation)
+    VARIATION_MATRIX_CACHE_SIZE = 2048  # products per process
+    VARIATION_MATRIX_CACHE_TTL = 300  # seconds
+
+    # Image derivatives (thumbnails, resized WebP + JPEG/PNG copies for srcset)
+    IMAGE_DERIVATIVE_WIDTHS = [320, 640, 1024, 1600]  # px; never upscaled
+    IMAGE_THUMBNAIL_SIZE = 160  # px, square crop
+    IMAGE_WEBP_QUALITY = 80
+    IMAGE_JPEG_QUALITY = 82
+    IMAGE_WORKERS = 2  # resize threads per worker process
+    IMAGE_CACHE_SIZE = 4096  # image URLs whose derivatives are cached per process
+    IMAGE_CACHE_TTL = 300  # seconds
+
+    # Fingerprinted static assets (flask build-assets); url_for('static') resolves through the manifest
+    STATIC_ASSET_MANIFEST = True
+    STATIC_ASSET_DIRS = ['css', 'js', 'vendor']
+
+    # Conditional GET for catalog pages; change on deploys that alter templates to retire old ETags
+    ETAG_SALT = os.getenv('ETAG_SALT', '')
+
+    # Sitemaps and merchant feed (flask build-sitemap / flask build-product-feed)
+    SITE_URL = os.getenv('SITE_URL', 'https://www.pavitraenterprises.com')
+    FEED_OUTPUT_DIR = os.getenv('FEED_OUTPUT_DIR')  # defaults to instance/feeds
+    SITEMAP_SHARD_SIZE = 50000  # product ids per sitemap file (the protocol's URL limit)
+    FEED_BATCH_SIZE = 1000  # rows fetched per round trip from the server-side cursor
+
+    # Public catalog API (/api/v1)
+    API_CACHE_MAX_AGE = 60  # seconds clients and CDNs may reuse a response
+
+    # Bulk catalog import (admin upload or flask import-catalog)
+    IMPORT_FOLDER = os.getenv('IMPORT_FOLDER')  # defaults to instance/imports; uploads and error reports
+    IMPORT_CHUNK_SIZE = 1000  # rows validated and written per transaction
+
+    # Admin CSV/JSONL exports
+    EXPORT_BATCH_SIZE = 1000  # rows per server-side cursor fetch and per response chunk
+
+    # Guest carts (services/cart_store.py): 'database' or 'memory' (single process only)
+    CART_STORE_BACKEND = os.getenv('CART_STORE_BACKEND', 'database')
+    CART_COOKIE_NAME = 'cart_id'
+    CART_TTL_DAYS = 30  # cookie lifetime and idle days before flask purge-guest-carts removes a cart
+
+    # Cart pricing memo (services/pricing.py), keyed on cart contents
+    PRICING_CACHE_SIZE = 4096  # priced carts per process
+    PRICING_CACHE_TTL = 60  # seconds; other workers' price edits show up within this
+
+    # flask check-query-plans: on MySQL, hot queries on smaller tables are skipped (the optimizer may scan them)
+    QUERY_PLAN_MIN_ROWS = 1000
+
     # Payment Methods (India)
     PAYMENT_METHODS = [
         'cash_on_delivery',
@@ -66,6 +156,7 @@ class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     TESTING = False
+    STATIC_ASSET_MANIFEST = False  # edited CSS/JS shows up without a rebuild
 
 
 class ProductionConfig(Config):
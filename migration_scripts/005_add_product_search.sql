@@ -0,0 +1,20 @@
+-- =============================================
+-- Migration: Product search documents (MySQL FULLTEXT backend)
+-- One denormalized row per product: name, SKU, tags/brand/category names
+-- and descriptions, kept in sync by services/search.py.
+-- Populate after running with: flask rebuild-search-index
+-- =============================================
+
+USE pavitra;
+
+CREATE TABLE IF NOT EXISTS product_search (
+    product_id INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL DEFAULT '',
+    sku VARCHAR(100) NOT NULL DEFAULT '',
+    keywords TEXT,
+    body LONGTEXT,
+
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+
+    FULLTEXT INDEX ft_product_search (name, sku, keywords, body)
+) ENGINE=InnoDB;
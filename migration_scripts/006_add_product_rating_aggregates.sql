@@ -0,0 +1,41 @@
+-- =============================================
+-- Migration: Product review aggregates
+-- Sum, count and per-star histogram of approved reviews stored on each
+-- product, kept current by the Review model listeners (models/review.py).
+-- Re-check at any time with: flask rebuild-review-stats
+-- =============================================
+
+USE pavitra;
+
+ALTER TABLE products
+    ADD COLUMN rating_sum INT NOT NULL DEFAULT 0,
+    ADD COLUMN rating_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN rating_1_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN rating_2_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN rating_3_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN rating_4_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN rating_5_count INT NOT NULL DEFAULT 0;
+
+-- Backfill from existing approved reviews (updated_at kept as is)
+UPDATE products p
+JOIN (
+    SELECT product_id,
+           SUM(rating) AS rating_sum,
+           COUNT(*) AS rating_count,
+           SUM(rating = 1) AS rating_1_count,
+           SUM(rating = 2) AS rating_2_count,
+           SUM(rating = 3) AS rating_3_count,
+           SUM(rating = 4) AS rating_4_count,
+           SUM(rating = 5) AS rating_5_count
+    FROM product_reviews
+    WHERE status = 'approved'
+    GROUP BY product_id
+) r ON r.product_id = p.id
+SET p.rating_sum = r.rating_sum,
+    p.rating_count = r.rating_count,
+    p.rating_1_count = r.rating_1_count,
+    p.rating_2_count = r.rating_2_count,
+    p.rating_3_count = r.rating_3_count,
+    p.rating_4_count = r.rating_4_count,
+    p.rating_5_count = r.rating_5_count,
+    p.updated_at = p.updated_at;
@@ -0,0 +1,19 @@
+-- =============================================
+-- Migration: Cart and wishlist counters on users
+-- Header badge counts read from the user row instead of COUNT/SUM queries
+-- on every page.  Kept current by the ShoppingCart and Wishlist model
+-- listeners; the columns are NOT NULL and backfilled here, so reads never
+-- have to recount and write.
+-- =============================================
+
+USE pavitra;
+
+ALTER TABLE users
+    ADD COLUMN cart_quantity INT NOT NULL DEFAULT 0,
+    ADD COLUMN wishlist_count INT NOT NULL DEFAULT 0;
+
+-- Backfill from existing carts and wishlists (updated_at kept as is)
+UPDATE users u
+SET u.cart_quantity = (SELECT COALESCE(SUM(c.quantity), 0) FROM shopping_cart c WHERE c.user_id = u.id),
+    u.wishlist_count = (SELECT COUNT(*) FROM wishlists w WHERE w.user_id = u.id),
+    u.updated_at = u.updated_at;
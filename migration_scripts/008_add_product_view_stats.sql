@@ -0,0 +1,18 @@
+-- =============================================
+-- Migration: Hourly product view series
+-- Product page views per product per hour (UTC), flushed in batches by
+-- services/view_counter.py alongside products.view_count.
+-- =============================================
+
+USE pavitra;
+
+CREATE TABLE IF NOT EXISTS product_view_stats (
+    product_id INT NOT NULL,
+    hour DATETIME NOT NULL,
+    views INT NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (product_id, hour),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+
+    INDEX idx_product_view_stats_hour (hour)
+);
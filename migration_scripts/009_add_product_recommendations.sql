@@ -0,0 +1,25 @@
+-- =============================================
+-- Migration: Product recommendations
+-- Top-K related and frequently-bought-together products per product,
+-- written by: flask build-recommendations [--full]
+-- =============================================
+
+USE pavitra;
+
+CREATE TABLE IF NOT EXISTS product_recommendations (
+    product_id INT NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    position INT NOT NULL,
+    related_product_id INT NOT NULL,
+    score DOUBLE NOT NULL DEFAULT 0,
+    computed_at DATETIME,
+
+    PRIMARY KEY (product_id, kind, position),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    FOREIGN KEY (related_product_id) REFERENCES products(id) ON DELETE CASCADE,
+
+    INDEX idx_computed_at (computed_at)
+);
+
+-- Covering index for the order_items self-join that finds co-purchases
+CREATE INDEX idx_order_items_product_order ON order_items (product_id, order_id);
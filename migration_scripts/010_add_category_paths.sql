@@ -0,0 +1,31 @@
+-- =============================================
+-- Migration: Materialized category paths
+-- path holds the ids from the root down, e.g. '/1/5/', so a whole subtree
+-- is one indexed prefix match.  Kept current by the Category model
+-- listeners; repair at any time with: flask rebuild-category-paths
+-- =============================================
+
+USE pavitra;
+
+ALTER TABLE categories
+    ADD COLUMN path VARCHAR(255) NULL AFTER parent_id,
+    ADD COLUMN depth INT DEFAULT 0 AFTER path,
+    ADD INDEX idx_path (path);
+
+-- Backfill from parent_id (updated_at kept as is)
+UPDATE categories c
+JOIN (
+    WITH RECURSIVE tree (id, path, depth) AS (
+        SELECT id, CAST(CONCAT('/', id, '/') AS CHAR(255)), 0
+        FROM categories
+        WHERE parent_id IS NULL
+        UNION ALL
+        SELECT child.id, CONCAT(tree.path, child.id, '/'), tree.depth + 1
+        FROM categories child
+        JOIN tree ON child.parent_id = tree.id
+    )
+    SELECT id, path, depth FROM tree
+) t ON t.id = c.id
+SET c.path = t.path,
+    c.depth = t.depth,
+    c.updated_at = c.updated_at;
@@ -0,0 +1,33 @@
+-- =============================================
+-- Migration: Composite indexes for the hot listing queries
+-- Each index leads with the equality filters the storefront always applies
+-- (status, then category/brand/product/user) and ends with the ORDER BY
+-- columns, so listings read rows in order instead of sorting them.
+-- Verify the plans after applying with: flask check-query-plans
+-- =============================================
+
+USE pavitra;
+
+-- Product listings: newest, per category, per brand, featured, best selling, price
+ALTER TABLE products
+    ADD INDEX ix_products_status_created (status, created_at, id),
+    ADD INDEX ix_products_status_category_created (status, category_id, created_at, id),
+    ADD INDEX ix_products_status_brand_created (status, brand_id, created_at, id),
+    ADD INDEX ix_products_status_featured (status, is_featured),
+    ADD INDEX ix_products_status_total_sold (status, total_sold, id),
+    ADD INDEX ix_products_status_price (status, base_price, id),
+    ADD INDEX ix_products_updated_at (updated_at),
+    -- Every status index above starts with status; idx_category and idx_brand stay for the foreign keys
+    DROP INDEX idx_status;
+
+-- Approved reviews of a product, newest first
+ALTER TABLE product_reviews
+    ADD INDEX ix_product_reviews_product_status_created (product_id, status, created_at);
+
+-- Admin order list by status and a customer's order history, newest first
+ALTER TABLE orders
+    ADD INDEX ix_orders_status_created (status, created_at),
+    ADD INDEX ix_orders_user_created (user_id, created_at);
+
+-- Cart line lookups are served by the existing unique_user_product_variation key;
+-- order_items (product_id, order_id) was added in 009_add_product_recommendations.sql
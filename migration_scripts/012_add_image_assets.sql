@@ -0,0 +1,22 @@
+-- =============================================
+-- Migration: Image derivatives
+-- One row per uploaded image with its thumbnail and resized WebP/JPEG
+-- copies, written by services/images.py.  Process existing images with:
+-- flask process-images
+-- =============================================
+
+USE pavitra;
+
+CREATE TABLE IF NOT EXISTS image_assets (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    source_url VARCHAR(500) NOT NULL,
+    content_hash VARCHAR(20),
+    width INT,
+    height INT,
+    variants JSON,
+    status ENUM('ready', 'failed') DEFAULT 'ready',
+    error VARCHAR(500),
+    processed_at DATETIME,
+
+    UNIQUE KEY unique_source_url (source_url)
+);
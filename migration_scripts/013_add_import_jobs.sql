@@ -0,0 +1,35 @@
+-- =============================================
+-- Migration: Bulk catalog imports
+-- One row per CSV/JSONL import run by services/catalog_import.py, with its
+-- progress counters and the path of the rejected-rows report.  Stock
+-- movements written by an import reference the job.
+-- =============================================
+
+USE pavitra;
+
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    filename VARCHAR(255) NOT NULL,
+    file_path VARCHAR(500) NOT NULL,
+    file_format VARCHAR(10) NOT NULL,
+    status ENUM('queued', 'running', 'completed', 'failed') DEFAULT 'queued',
+
+    total_rows INT DEFAULT 0,
+    processed_rows INT DEFAULT 0,
+    created_count INT DEFAULT 0,
+    updated_count INT DEFAULT 0,
+    error_count INT DEFAULT 0,
+    report_path VARCHAR(500),
+    message TEXT,
+
+    created_by INT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+
+    FOREIGN KEY (created_by) REFERENCES users(id),
+    INDEX idx_created_at (created_at)
+);
+
+ALTER TABLE stock_movements
+    MODIFY reference_type ENUM('order', 'purchase_order', 'adjustment', 'import', 'other') DEFAULT 'other';
@@ -0,0 +1,31 @@
+-- =============================================
+-- Migration: Server-side guest carts
+-- Guest carts move out of the signed session cookie into these tables
+-- (services/cart_store.py).  The browser only keeps an opaque cart id
+-- cookie; the cart is merged into shopping_cart when the guest logs in.
+-- Carts idle for CART_TTL_DAYS are removed by flask purge-guest-carts.
+-- =============================================
+
+USE pavitra;
+
+CREATE TABLE IF NOT EXISTS guest_carts (
+    id VARCHAR(64) PRIMARY KEY,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_guest_carts_updated (updated_at)
+);
+
+CREATE TABLE IF NOT EXISTS guest_cart_items (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    cart_id VARCHAR(64) NOT NULL,
+    product_id INT NOT NULL,
+    variation_id INT NULL,
+    variation_key INT NOT NULL DEFAULT 0,
+    quantity INT NOT NULL DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (cart_id) REFERENCES guest_carts(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    FOREIGN KEY (variation_id) REFERENCES product_variations(id),
+    -- variation_key is variation_id or 0: NULL variation ids would never collide here
+    UNIQUE KEY uq_guest_cart_items_line (cart_id, product_id, variation_key)
+);
@@ -6,13 +6,17 @@ from .category import Category
 from .brand import Brand
 from .order import Order, OrderItem
 from .wishlist import Wishlist
-from .cart import ShoppingCart
+from .cart import ShoppingCart, GuestCart, GuestCartItem
 from .review import Review, ReviewHelpfulness
 from .coupon import Coupon, CouponUsage
 from .stock import StockMovement, StockAlert
 from .password_history import PasswordHistory
 from .payment import PaymentMethod, PaymentTransaction
 from .order_history import OrderHistory
+from .product_view import ProductViewStat
+from .product_recommendation import ProductRecommendation
+from .image_asset import ImageAsset
+from .import_job import ImportJob
 
 # Make all models available for import
 __all__ = [
@@ -21,9 +25,10 @@ __all__ = [
     'ProductVariation', 'VariationAttribute',
     'Category', 'Brand',
     'Order', 'OrderItem',
-    'Wishlist', 'ShoppingCart',
+    'Wishlist', 'ShoppingCart', 'GuestCart', 'GuestCartItem',
     'Review', 'ReviewHelpfulness',
     'Coupon', 'CouponUsage',
     'StockMovement', 'StockAlert',
-    'PasswordHistory', 'PaymentMethod', 'PaymentTransaction', 'OrderHistory'
+    'PasswordHistory', 'PaymentMethod', 'PaymentTransaction', 'OrderHistory',
+    'ProductViewStat', 'ProductRecommendation', 'ImageAsset', 'ImportJob'
 ]
\ No newline at end of file
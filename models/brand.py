@@ -28,9 +28,9 @@ class Brand(db.Model):
     products = db.relationship('Product', backref='brand', lazy=True)
 
     def get_product_count(self):
-        """Get active products count for this brand"""
-        from .product import Product
-        return Product.query.filter_by(brand_id=self.id, status='active').count()
+        """Get active products count for this brand, from the shared count cache"""
+        from services.product_counts import get_product_counts
+        return get_product_counts().brand(self.id)
 
     def to_dict(self):
         """Convert to dictionary"""
@@ -1,16 +1,23 @@
 # models/cart.py
 from extension import db
 from datetime import datetime
+from sqlalchemy import event, inspect
+from .user import adjust_user_counter
 
 
 class ShoppingCart(db.Model):
     __tablename__ = 'shopping_cart'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', 'variation_id', name='unique_user_product_variation'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # active_history keeps the previous value for the User.cart_quantity listeners below
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False),
+                                 active_history=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     variation_id = db.Column(db.Integer, db.ForeignKey('product_variations.id'))
-    quantity = db.Column(db.Integer, nullable=False, default=1)
+    quantity = db.column_property(db.Column(db.Integer, nullable=False, default=1), active_history=True)
     cart_data = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -20,10 +27,84 @@ class ShoppingCart(db.Model):
     variation = db.relationship('ProductVariation', backref='cart_items')
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'product_id': self.product_id,
-            'variation_id': self.variation_id,
-            'quantity': self.quantity,
-            'product': self.product.to_dict() if self.product else None
-        }
\ No newline at end of file
+        return ShoppingCart.to_dict_many([self])[0]
+
+    @staticmethod
+    def to_dict_many(items):
+        """Serialize cart items, loading and serializing their products in bulk"""
+        from models.product import Product
+
+        items = list(items)
+        product_ids = {item.product_id for item in items}
+        products = Product.query.filter(Product.id.in_(product_ids)).all() if product_ids else []
+        product_data = {data['id']: data for data in Product.to_dict_many(products)}
+        return [{
+            'id': item.id,
+            'product_id': item.product_id,
+            'variation_id': item.variation_id,
+            'quantity': item.quantity,
+            'product': product_data.get(item.product_id)
+        } for item in items]
+
+
+class GuestCart(db.Model):
+    """Server-side cart of a guest, found through the opaque cart id cookie (services/cart_store.py)"""
+    __tablename__ = 'guest_carts'
+    __table_args__ = (
+        db.Index('ix_guest_carts_updated', 'updated_at'),
+    )
+
+    id = db.Column(db.String(64), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    items = db.relationship('GuestCartItem', backref='cart', lazy=True, cascade='all, delete-orphan',
+                            passive_deletes=True)
+
+
+class GuestCartItem(db.Model):
+    __tablename__ = 'guest_cart_items'
+    __table_args__ = (
+        # One line per product and variation; NULLs never collide in a unique key, so it uses variation_key
+        db.UniqueConstraint('cart_id', 'product_id', 'variation_key', name='uq_guest_cart_items_line'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.String(64), db.ForeignKey('guest_carts.id', ondelete='CASCADE'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    variation_id = db.Column(db.Integer, db.ForeignKey('product_variations.id'))
+    variation_key = db.Column(db.Integer, nullable=False, default=0)  # variation_id, or 0 without one
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Keep User.cart_quantity in step with cart rows, in the same transaction
+def _previous_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), key)
+
+
+@event.listens_for(ShoppingCart, 'after_insert')
+def _cart_item_inserted(mapper, connection, item):
+    adjust_user_counter(connection, item.user_id, 'cart_quantity', item.quantity or 0)
+
+
+@event.listens_for(ShoppingCart, 'after_update')
+def _cart_item_updated(mapper, connection, item):
+    state = inspect(item)
+    old_user_id = _previous_value(state, 'user_id')
+    old_quantity = _previous_value(state, 'quantity') or 0
+    if old_user_id == item.user_id:
+        adjust_user_counter(connection, item.user_id, 'cart_quantity', (item.quantity or 0) - old_quantity)
+    else:
+        adjust_user_counter(connection, old_user_id, 'cart_quantity', -old_quantity)
+        adjust_user_counter(connection, item.user_id, 'cart_quantity', item.quantity or 0)
+
+
+@event.listens_for(ShoppingCart, 'after_delete')
+def _cart_item_deleted(mapper, connection, item):
+    state = inspect(item)
+    adjust_user_counter(connection, _previous_value(state, 'user_id'), 'cart_quantity',
+                        -(_previous_value(state, 'quantity') or 0))
@@ -1,6 +1,8 @@
 # models/category.py
 from extension import db
 from datetime import datetime
+from sqlalchemy import event, func, inspect, literal, select, update
+from sqlalchemy.orm.attributes import set_committed_value
 import uuid
 
 
@@ -17,6 +19,9 @@ class Category(db.Model):
     meta_title = db.Column(db.String(255))
     meta_description = db.Column(db.Text)
     parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
+    # Materialized path of ids from the root, e.g. '/1/5/'; kept by the listeners below
+    path = db.Column(db.String(255), index=True)
+    depth = db.Column(db.Integer, default=0)
     image_url = db.Column(db.String(500))
     banner_url = db.Column(db.String(500))
     sort_order = db.Column(db.Integer, default=0)
@@ -36,10 +41,28 @@ class Category(db.Model):
     # Relationships
     products = db.relationship('Product', backref='category', lazy=True)
 
-    def get_product_count(self):
-        """Get active products count in this category"""
-        from .product import Product
-        return Product.query.filter_by(category_id=self.id, status='active').count()
+    def get_descendant_ids(self, include_self=True):
+        """Ids of every category below this one, in one indexed path query"""
+        query = db.session.query(Category.id).filter(Category.path.startswith(self.path))
+        if not include_self:
+            query = query.filter(Category.id != self.id)
+        return [row[0] for row in query]
+
+    def descendants(self, include_self=False):
+        """Categories below this one, shallowest first"""
+        query = Category.query.filter(Category.path.startswith(self.path))
+        if not include_self:
+            query = query.filter(Category.id != self.id)
+        return query.order_by(Category.depth, Category.sort_order, Category.id).all()
+
+    def get_ancestor_ids(self):
+        """Ids from the root down to the parent, read from the path"""
+        return [int(part) for part in (self.path or '').strip('/').split('/') if part][:-1]
+
+    def get_product_count(self, include_subcategories=False):
+        """Get active products count in this category, from the shared count cache"""
+        from services.product_counts import get_product_counts
+        return get_product_counts().category(self.id, include_subcategories)
 
     def get_featured_products(self, limit=8):
         """Get featured products from this category"""
@@ -61,5 +84,86 @@ class Category(db.Model):
             'image_url': self.image_url,
             'parent_id': self.parent_id,
             'product_count': self.get_product_count(),
+            'subtree_product_count': self.get_product_count(include_subcategories=True),
             'is_featured': self.is_featured
-        }
\ No newline at end of file
+        }
+
+
+# Materialized path maintenance
+def _parent_path(connection, parent_id):
+    if not parent_id:
+        return '/', -1
+    row = connection.execute(
+        select(Category.path, Category.depth).where(Category.id == parent_id)
+    ).first()
+    if row is None:
+        raise ValueError(f'Parent category {parent_id} does not exist')
+    return row.path, row.depth
+
+
+@event.listens_for(Category, 'after_insert')
+def _category_inserted(mapper, connection, category):
+    parent_path, parent_depth = _parent_path(connection, category.parent_id)
+    path = f'{parent_path}{category.id}/'
+    connection.execute(update(Category.__table__).where(Category.id == category.id)
+                       .values(path=path, depth=parent_depth + 1, updated_at=Category.updated_at))
+    set_committed_value(category, 'path', path)
+    set_committed_value(category, 'depth', parent_depth + 1)
+
+
+@event.listens_for(Category, 'before_update')
+def _category_moving(mapper, connection, category):
+    if not inspect(category).attrs.parent_id.history.has_changes() or not category.parent_id:
+        return
+    parent_path, _ = _parent_path(connection, category.parent_id)
+    if category.path and parent_path.startswith(category.path):
+        raise ValueError('A category cannot be moved under itself or one of its subcategories')
+
+
+@event.listens_for(Category, 'after_update')
+def _category_moved(mapper, connection, category):
+    if not inspect(category).attrs.parent_id.history.has_changes():
+        return
+    old_path = connection.execute(select(Category.path).where(Category.id == category.id)).scalar()
+    parent_path, parent_depth = _parent_path(connection, category.parent_id)
+    new_path = f'{parent_path}{category.id}/'
+    if old_path == new_path:
+        return
+    depth_change = parent_depth + 1 - (old_path.count('/') - 2)
+    # Rewrite the prefix of the whole subtree in one statement
+    connection.execute(
+        update(Category.__table__)
+        .where(Category.path.startswith(old_path))
+        .values(path=literal(new_path, db.String) + func.substr(Category.path, len(old_path) + 1, type_=db.String),
+                depth=Category.depth + depth_change,
+                updated_at=Category.updated_at)
+    )
+    set_committed_value(category, 'path', new_path)
+    set_committed_value(category, 'depth', parent_depth + 1)
+
+
+def rebuild_category_paths():
+    """Recompute every path and depth from parent_id; returns the number of categories fixed"""
+    rows = db.session.query(Category.id, Category.parent_id, Category.path, Category.depth).all()
+    parents = {row.id: row.parent_id for row in rows}
+    paths = {}
+
+    def path_of(category_id, seen=()):
+        if category_id not in paths:
+            parent_id = parents.get(category_id)
+            if parent_id is None or parent_id not in parents or parent_id in seen:
+                paths[category_id] = f'/{category_id}/'
+            else:
+                paths[category_id] = f'{path_of(parent_id, seen + (category_id,))}{category_id}/'
+        return paths[category_id]
+
+    fixed = 0
+    for row in rows:
+        path = path_of(row.id)
+        depth = path.count('/') - 2
+        if row.path != path or row.depth != depth:
+            db.session.execute(update(Category.__table__).where(Category.id == row.id)
+                               .values(path=path, depth=depth, updated_at=Category.updated_at))
+            fixed += 1
+    db.session.commit()
+    return fixed
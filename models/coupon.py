@@ -71,15 +71,8 @@ class Coupon(db.Model):
 
     def calculate_discount(self, cart_total):
         """Calculate discount amount"""
-        if self.discount_type == 'percentage':
-            discount = (cart_total * self.discount_value) / 100
-            if self.maximum_discount_amount and discount > self.maximum_discount_amount:
-                return float(self.maximum_discount_amount)
-            return float(discount)
-        elif self.discount_type == 'fixed_amount':
-            return float(self.discount_value)
-        else:  # free_shipping
-            return 0
+        from services.pricing import coupon_discount, money
+        return float(coupon_discount(self, money(cart_total)))
 
     def to_dict(self):
         return {
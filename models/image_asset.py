@@ -0,0 +1,29 @@
+# models/image_asset.py
+from extension import db
+from datetime import datetime
+
+
+class ImageAsset(db.Model):
+    """Resized/WebP derivatives of an uploaded image, written by services/images.py"""
+    __tablename__ = 'image_assets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_url = db.Column(db.String(500), unique=True, nullable=False)
+    content_hash = db.Column(db.String(20))
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    # {'webp': [[width, url], ...], 'fallback': [[width, url], ...], 'thumbnail': {'webp': url, 'fallback': url}}
+    variants = db.Column(db.JSON)
+    status = db.Column(db.Enum('ready', 'failed', name='image_asset_status'), default='ready')
+    error = db.Column(db.String(500))
+    processed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'source_url': self.source_url,
+            'content_hash': self.content_hash,
+            'width': self.width,
+            'height': self.height,
+            'variants': self.variants or {},
+            'status': self.status
+        }
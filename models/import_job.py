@@ -0,0 +1,57 @@
+# models/import_job.py
+from extension import db
+from datetime import datetime
+
+
+class ImportJob(db.Model):
+    """One bulk catalog import run by services/catalog_import.py"""
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)  # as uploaded
+    file_path = db.Column(db.String(500), nullable=False)
+    file_format = db.Column(db.String(10), nullable=False)  # csv / jsonl
+    status = db.Column(db.Enum('queued', 'running', 'completed', 'failed', name='import_job_status'),
+                       default='queued')
+
+    total_rows = db.Column(db.Integer, default=0)
+    processed_rows = db.Column(db.Integer, default=0)
+    created_count = db.Column(db.Integer, default=0)
+    updated_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    report_path = db.Column(db.String(500))  # CSV of rejected rows
+    message = db.Column(db.Text)
+
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    creator = db.relationship('User')
+
+    @property
+    def progress(self):
+        """Percentage of rows processed"""
+        if self.status == 'completed':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, int(self.processed_rows * 100 / self.total_rows))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'total_rows': self.total_rows or 0,
+            'processed_rows': self.processed_rows or 0,
+            'created': self.created_count or 0,
+            'updated': self.updated_count or 0,
+            'errors': self.error_count or 0,
+            'progress': self.progress,
+            'message': self.message,
+            'has_report': bool(self.error_count),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
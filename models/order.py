@@ -10,6 +10,10 @@ from .order_history import OrderHistory
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_status_created', 'status', 'created_at'),
+        db.Index('ix_orders_user_created', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
@@ -160,6 +164,10 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
+    __table_args__ = (
+        # Co-purchase self-join in services/recommendations.py (migration 009)
+        db.Index('idx_order_items_product_order', 'product_id', 'order_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
@@ -183,8 +191,9 @@ class OrderItem(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def calculate_gst(self):
-        """Calculate GST amount for this item"""
-        self.gst_amount = (self.total_price * self.gst_rate) / 100
+        """Calculate GST amount for this item (total_price excludes GST)"""
+        from services.pricing import split_gst
+        self.gst_amount = split_gst(self.total_price, self.gst_rate, inclusive=False)[1]
 
     def to_dict(self):
         return {
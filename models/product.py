@@ -22,6 +22,17 @@ product_tag_relations = db.Table('product_tag_relations',
 
 class Product(db.Model):
     __tablename__ = 'products'
+    # Composite indexes for storefront listings: status first, then the filter, then the sort
+    # (migration_scripts/011_add_composite_indexes.sql; checked by flask check-query-plans)
+    __table_args__ = (
+        db.Index('ix_products_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_products_status_category_created', 'status', 'category_id', 'created_at', 'id'),
+        db.Index('ix_products_status_brand_created', 'status', 'brand_id', 'created_at', 'id'),
+        db.Index('ix_products_status_featured', 'status', 'is_featured'),
+        db.Index('ix_products_status_total_sold', 'status', 'total_sold', 'id'),
+        db.Index('ix_products_status_price', 'status', 'base_price', 'id'),
+        db.Index('ix_products_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
@@ -91,6 +102,15 @@ class Product(db.Model):
     wishlist_count = db.Column(db.Integer, default=0)
     total_sold = db.Column(db.Integer, default=0)
 
+    # Review aggregates over approved reviews, maintained by models/review.py
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_1_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_2_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_3_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_4_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_5_count = db.Column(db.Integer, default=0, nullable=False)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -114,21 +134,24 @@ class Product(db.Model):
     wishlists = db.relationship('Wishlist', backref='product', lazy=True)
     stock_movements = db.relationship('StockMovement', backref='product', lazy=True)
 
+    @staticmethod
+    def stock_status_for(stock_quantity, low_stock_threshold, track_inventory=True, allow_backorders=False):
+        """Stock status for the given inventory values (also used by bulk imports)"""
+        if not track_inventory:
+            return 'in_stock'
+
+        if stock_quantity <= 0:
+            if allow_backorders:
+                return 'on_backorder'
+            return 'out_of_stock'
+        elif stock_quantity <= low_stock_threshold:
+            return 'low_stock'
+        return 'in_stock'
+
     def update_stock_status(self):
         """Update stock status based on current quantity"""
-        if not self.track_inventory:
-            self.stock_status = 'in_stock'
-            return
-
-        if self.stock_quantity <= 0:
-            if self.allow_backorders:
-                self.stock_status = 'on_backorder'
-            else:
-                self.stock_status = 'out_of_stock'
-        elif self.stock_quantity <= self.low_stock_threshold:
-            self.stock_status = 'low_stock'
-        else:
-            self.stock_status = 'in_stock'
+        self.stock_status = self.stock_status_for(self.stock_quantity, self.low_stock_threshold,
+                                                  self.track_inventory, self.allow_backorders)
 
     def add_stock(self, quantity, reason="Stock adjustment", performed_by=None, reference_type="adjustment",
                   reference_id=None):
@@ -203,19 +226,6 @@ class Product(db.Model):
             return int(((self.compare_price - self.base_price) / self.compare_price) * 100)
         return 0
 
-    def get_average_rating(self):
-        """Calculate average rating from approved reviews"""
-        if not self.reviews:
-            return 0
-        approved_reviews = [r for r in self.reviews if r.status == 'approved']
-        if not approved_reviews:
-            return 0
-        return sum(r.rating for r in approved_reviews) / len(approved_reviews)
-
-    def get_review_count(self):
-        """Get count of approved reviews"""
-        return len([r for r in self.reviews if r.status == 'approved'])
-
     def get_attributes_dict(self):
         """Get product attributes as dictionary"""
         return {av.attribute.name: av.value for av in self.attribute_values}
@@ -242,28 +252,73 @@ class Product(db.Model):
 
     def to_dict(self):
         """Convert to dictionary for API responses"""
-        return {
-            'id': self.id,
-            'sku': self.sku,
-            'name': self.name,
-            'slug': self.slug,
-            'base_price': float(self.base_price),
-            'compare_price': float(self.compare_price) if self.compare_price else None,
-            'stock_quantity': self.stock_quantity,
-            'stock_status': self.stock_status,
-            'is_in_stock': self.is_in_stock(),
-            'available_quantity': self.get_available_quantity(),
-            'main_image_url': self.main_image_url,
-            'is_featured': self.is_featured,
-            'is_on_sale': self.is_on_sale,
-            'discount_percentage': self.get_discount_percentage(),
-            'average_rating': self.get_average_rating(),
-            'review_count': self.get_review_count(),
-            'category_id': self.category_id,
-            'brand_id': self.brand_id,
-            'attributes': self.get_attributes_dict(),
-            'tags': [tag.name for tag in self.tags]
-        }
+        return Product.to_dict_many([self])[0]
+
+    @classmethod
+    def load_tags(cls, product_ids, batch_size=1000):
+        """{product_id: [tag name]} with one IN query per batch"""
+        tags = {}
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            rows = db.session.query(product_tag_relations.c.product_id, ProductTag.name) \
+                .join(ProductTag, ProductTag.id == product_tag_relations.c.tag_id) \
+                .filter(product_tag_relations.c.product_id.in_(batch)) \
+                .order_by(ProductTag.id)
+            for product_id, name in rows:
+                tags.setdefault(product_id, []).append(name)
+        return tags
+
+    @classmethod
+    def load_attributes(cls, product_ids, batch_size=1000):
+        """{product_id: {attribute name: value}} with one IN query per batch"""
+        attributes = {}
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            rows = db.session.query(product_attribute_association.c.product_id,
+                                    ProductAttribute.name, ProductAttributeValue.value) \
+                .join(ProductAttributeValue,
+                      ProductAttributeValue.id == product_attribute_association.c.attribute_value_id) \
+                .join(ProductAttribute, ProductAttribute.id == ProductAttributeValue.attribute_id) \
+                .filter(product_attribute_association.c.product_id.in_(batch)) \
+                .order_by(ProductAttributeValue.id)
+            for product_id, name, value in rows:
+                attributes.setdefault(product_id, {})[name] = value
+        return attributes
+
+    @classmethod
+    def to_dict_many(cls, products, batch_size=1000):
+        """Serialize ``products`` like to_dict(), fetching tags and attributes
+        with one IN query each per batch instead of several queries per product"""
+        products = list(products)
+        ids = [product.id for product in products]
+        tags = cls.load_tags(ids, batch_size)
+        attributes = cls.load_attributes(ids, batch_size)
+
+        return [{
+            'id': product.id,
+            'sku': product.sku,
+            'name': product.name,
+            'slug': product.slug,
+            'base_price': float(product.base_price),
+            'compare_price': float(product.compare_price) if product.compare_price else None,
+            'stock_quantity': product.stock_quantity,
+            'stock_status': product.stock_status,
+            'is_in_stock': product.is_in_stock(),
+            'available_quantity': product.get_available_quantity(),
+            'main_image_url': product.main_image_url,
+            'is_featured': product.is_featured,
+            'is_on_sale': product.is_on_sale,
+            'discount_percentage': product.get_discount_percentage(),
+            'average_rating': product.get_average_rating(),
+            'review_count': product.get_review_count(),
+            'rating_histogram': product.get_rating_histogram(),
+            'category_id': product.category_id,
+            'brand_id': product.brand_id,
+            'attributes': attributes.get(product.id, {}),
+            'tags': tags.get(product.id, [])
+        } for product in products]
 
     def get_main_image(self):
         """Get main product image URL with fallback"""
@@ -297,19 +352,18 @@ class Product(db.Model):
         return 0
 
     def get_average_rating(self):
-        """Calculate average rating from approved reviews"""
-        if not self.reviews:
-            return 0
-        approved_reviews = [r for r in self.reviews if getattr(r, 'status', 'approved') == 'approved']
-        if not approved_reviews:
+        """Average rating of approved reviews, from the stored aggregates"""
+        if not self.rating_count:
             return 0
-        return round(sum(r.rating for r in approved_reviews) / len(approved_reviews), 1)
+        return round(self.rating_sum / self.rating_count, 1)
 
     def get_review_count(self):
-        """Get count of approved reviews"""
-        if not self.reviews:
-            return 0
-        return len([r for r in self.reviews if getattr(r, 'status', 'approved') == 'approved'])
+        """Count of approved reviews, from the stored aggregates"""
+        return self.rating_count or 0
+
+    def get_rating_histogram(self):
+        """Approved review counts per star, 5 down to 1"""
+        return {star: getattr(self, f'rating_{star}_count') or 0 for star in range(5, 0, -1)}
 
     @property
     def image_url(self):
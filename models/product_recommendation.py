@@ -0,0 +1,26 @@
+# models/product_recommendation.py
+from extension import db
+from datetime import datetime
+
+
+class ProductRecommendation(db.Model):
+    """Top-K neighbours per product, written by services/recommendations.py"""
+    __tablename__ = 'product_recommendations'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)  # bought_together, related
+    position = db.Column(db.Integer, primary_key=True)  # 1 = best
+    related_product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    related_product = db.relationship('Product', foreign_keys=[related_product_id])
+
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'kind': self.kind,
+            'position': self.position,
+            'related_product_id': self.related_product_id,
+            'score': self.score
+        }
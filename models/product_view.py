@@ -0,0 +1,22 @@
+# models/product_view.py
+from extension import db
+
+
+class ProductViewStat(db.Model):
+    """Product page views per product per hour, written by services/view_counter.py"""
+    __tablename__ = 'product_view_stats'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)  # UTC, truncated to the hour
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('idx_product_view_stats_hour', 'hour'),
+    )
+
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'hour': self.hour.isoformat() if self.hour else None,
+            'views': self.views
+        }
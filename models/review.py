@@ -1,19 +1,25 @@
 # models/review.py
 from extension import db
 from datetime import datetime
+from sqlalchemy import event, func, inspect, update
 import uuid
 
 
 class Review(db.Model):
     __tablename__ = 'product_reviews'
+    __table_args__ = (
+        db.Index('ix_product_reviews_product_status_created', 'product_id', 'status', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    # active_history keeps the previous value for the rating aggregate listeners below
+    product_id = db.column_property(db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False),
+                                    active_history=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     order_item_id = db.Column(db.Integer, db.ForeignKey('order_items.id'))
 
-    rating = db.Column(db.Integer, nullable=False)
+    rating = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)
     title = db.Column(db.String(255))
     comment = db.Column(db.Text)
 
@@ -21,7 +27,7 @@ class Review(db.Model):
     review_images = db.Column(db.JSON)
 
     # Status
-    status = db.Column(db.String(20), default='pending')
+    status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)
     is_verified_purchase = db.Column(db.Boolean, default=False)
 
     # Helpfulness
@@ -66,4 +72,105 @@ class ReviewHelpfulness(db.Model):
     review_id = db.Column(db.Integer, db.ForeignKey('product_reviews.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     is_helpful = db.Column(db.Boolean, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Product review aggregates
+# Approved reviews count towards Product.rating_sum, rating_count and the
+# rating_N_count histogram.  The listeners below apply each change as an
+# atomic "col = col + n" UPDATE in the same transaction as the review, so
+# concurrent reviews never overwrite each other's counts.
+RATING_STARS = range(1, 6)
+
+
+def _rating_contribution(product_id, rating, status):
+    """(product_id, rating) a review adds to its product's aggregates, or None"""
+    if status != 'approved' or product_id is None or rating is None:
+        return None
+    return product_id, rating
+
+
+def _apply_rating_delta(connection, contribution, sign):
+    from models.product import Product
+
+    product_id, rating = contribution
+    values = {
+        'rating_sum': Product.rating_sum + sign * rating,
+        'rating_count': Product.rating_count + sign,
+        # Counter bumps are not product edits; keep updated_at as it was
+        'updated_at': Product.updated_at
+    }
+    if rating in RATING_STARS:
+        column = getattr(Product, f'rating_{rating}_count')
+        values[column.key] = column + sign
+    connection.execute(update(Product.__table__).where(Product.id == product_id).values(values))
+
+
+def _previous_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), key)
+
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    contribution = _rating_contribution(review.product_id, review.rating, review.status)
+    if contribution:
+        _apply_rating_delta(connection, contribution, 1)
+
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, review):
+    state = inspect(review)
+    old = _rating_contribution(_previous_value(state, 'product_id'),
+                               _previous_value(state, 'rating'),
+                               _previous_value(state, 'status'))
+    new = _rating_contribution(review.product_id, review.rating, review.status)
+    if old == new:
+        return
+    if old:
+        _apply_rating_delta(connection, old, -1)
+    if new:
+        _apply_rating_delta(connection, new, 1)
+
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, review):
+    state = inspect(review)
+    contribution = _rating_contribution(_previous_value(state, 'product_id'),
+                                        _previous_value(state, 'rating'),
+                                        _previous_value(state, 'status'))
+    if contribution:
+        _apply_rating_delta(connection, contribution, -1)
+
+
+def rebuild_rating_aggregates():
+    """Recompute every product's review aggregates; returns the number of products corrected"""
+    from models.product import Product
+
+    histogram_columns = [f'rating_{star}_count' for star in RATING_STARS]
+    expected = {}
+    rows = db.session.query(Review.product_id, Review.rating, func.count(Review.id)) \
+        .filter(Review.status == 'approved') \
+        .group_by(Review.product_id, Review.rating)
+    for product_id, rating, total in rows:
+        values = expected.setdefault(product_id, dict.fromkeys(['rating_sum', 'rating_count'] + histogram_columns, 0))
+        values['rating_sum'] += rating * total
+        values['rating_count'] += total
+        if rating in RATING_STARS:
+            values[f'rating_{rating}_count'] += total
+
+    columns = [Product.rating_sum, Product.rating_count] + [getattr(Product, c) for c in histogram_columns]
+    empty = dict.fromkeys(['rating_sum', 'rating_count'] + histogram_columns, 0)
+    corrections = []
+    for row in db.session.query(Product.id, Product.updated_at, *columns):
+        values = expected.get(row.id, empty)
+        if any((getattr(row, key) or 0) != value for key, value in values.items()):
+            # Pass updated_at through so the bulk update doesn't stamp it
+            corrections.append(dict(values, id=row.id, updated_at=row.updated_at))
+
+    if corrections:
+        db.session.execute(update(Product), corrections)
+    db.session.commit()
+    return len(corrections)
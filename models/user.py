@@ -3,6 +3,7 @@ from extension import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy import func, update
 import uuid
 import bcrypt
 from .password_history import PasswordHistory
@@ -34,6 +35,10 @@ class User(UserMixin, db.Model):
     date_of_birth = db.Column(db.Date)
     gender = db.Column(db.Enum('male', 'female', 'other'))
 
+    # Header badge counters, kept in step by the cart and wishlist listeners
+    cart_quantity = db.Column(db.Integer, nullable=False, default=0)
+    wishlist_count = db.Column(db.Integer, nullable=False, default=0)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -75,6 +80,23 @@ class User(UserMixin, db.Model):
         """Get total orders count"""
         return len(self.orders)
 
+    def get_cart_quantity(self):
+        """Total quantity of all cart items, from the cached counter"""
+        from .cart import ShoppingCart
+        return self._get_counter('cart_quantity', func.sum(ShoppingCart.quantity), ShoppingCart.user_id)
+
+    def get_wishlist_count(self):
+        """Number of wishlist items, from the cached counter"""
+        from .wishlist import Wishlist
+        return self._get_counter('wishlist_count', func.count(Wishlist.id), Wishlist.user_id)
+
+    def _get_counter(self, key, aggregate, user_column):
+        value = getattr(self, key)
+        if value is None:
+            # Not flushed yet; count without writing, since a read-only request never commits
+            value = db.session.query(aggregate).filter(user_column == self.id).scalar() or 0
+        return value
+
     def get_default_address(self):
         """Get user's default shipping address"""
         return UserAddress.query.filter_by(user_id=self.id, is_default=True).first()
@@ -140,4 +162,14 @@ class User(UserMixin, db.Model):
         """Check if password should be changed based on age"""
         return self.get_password_age_days() >= max_age_days
 
-# ✅ CLASS ENDS HERE - NO MORE METHODS AFTER THIS
\ No newline at end of file
+# ✅ CLASS ENDS HERE - NO MORE METHODS AFTER THIS
+
+
+def adjust_user_counter(connection, user_id, key, delta):
+    """Atomically add ``delta`` to a User counter column inside the current flush"""
+    if not user_id or not delta:
+        return
+    column = getattr(User, key)
+    connection.execute(update(User.__table__)
+                       .where(User.id == user_id)
+                       .values({key: column + delta, 'updated_at': User.updated_at}))
\ No newline at end of file
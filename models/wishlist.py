@@ -1,13 +1,17 @@
 # models/wishlist.py
 from extension import db
 from datetime import datetime
+from sqlalchemy import event, inspect
+from .user import adjust_user_counter
 
 
 class Wishlist(db.Model):
     __tablename__ = 'wishlists'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # active_history keeps the previous value for the User.wishlist_count listeners below
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False),
+                                 active_history=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -17,4 +21,24 @@ class Wishlist(db.Model):
             'user_id': self.user_id,
             'product_id': self.product_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+
+# Keep User.wishlist_count in step with wishlist rows, in the same transaction
+@event.listens_for(Wishlist, 'after_insert')
+def _wishlist_item_inserted(mapper, connection, item):
+    adjust_user_counter(connection, item.user_id, 'wishlist_count', 1)
+
+
+@event.listens_for(Wishlist, 'after_update')
+def _wishlist_item_updated(mapper, connection, item):
+    history = inspect(item).attrs.user_id.history
+    if history.deleted and history.deleted[0] != item.user_id:
+        adjust_user_counter(connection, history.deleted[0], 'wishlist_count', -1)
+        adjust_user_counter(connection, item.user_id, 'wishlist_count', 1)
+
+
+@event.listens_for(Wishlist, 'after_delete')
+def _wishlist_item_deleted(mapper, connection, item):
+    history = inspect(item).attrs.user_id.history
+    adjust_user_counter(connection, history.deleted[0] if history.deleted else item.user_id, 'wishlist_count', -1)
@@ -1,5 +1,5 @@
 # routes/admin_routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
 from flask_login import login_required, current_user
 from sqlalchemy import desc, func, or_
 from datetime import datetime, timedelta
@@ -14,7 +14,15 @@ from models.user import User
 from models.stock import StockMovement, StockAlert
 from models.review import Review
 from models.coupon import Coupon
+from models.import_job import ImportJob
 from extension import db
+from services.search import search_product_ids
+from services.images import save_upload
+from services.catalog_import import FIELDS as IMPORT_FIELDS, get_import_runner, save_import_upload
+from services.exports import (
+    EXPORT_FORMATS, ORDER_COLUMNS, PRODUCT_COLUMNS, STOCK_MOVEMENT_COLUMNS, export_response, order_export,
+    export_columns, product_export, stock_movement_export
+)
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -28,6 +36,22 @@ def require_admin():
         return redirect(url_for('shop.index'))
 
 
+def save_uploaded_images(field, folder):
+    """Store the images posted in ``field`` (derivatives render in the background); returns their URLs"""
+    return [save_upload(file_storage, folder) for file_storage in request.files.getlist(field)
+            if file_storage and file_storage.filename]
+
+
+def apply_product_images(product):
+    """Set main image and append gallery images uploaded with the product form"""
+    main_images = save_uploaded_images('main_image', 'products')
+    if main_images:
+        product.main_image_url = main_images[0]
+    gallery = save_uploaded_images('gallery_images', 'products')
+    if gallery:
+        product.image_gallery = (product.image_gallery or []) + gallery
+
+
 @admin_bp.route('/')
 def dashboard():
     """Admin dashboard with comprehensive stats"""
@@ -88,6 +112,51 @@ def dashboard():
         return render_template('admin/admin_dashboard.html')
 
 
+def product_list_filters(args):
+    """Filter values from the product list query string (also used by its export)"""
+    return {
+        'category_id': args.get('category_id', type=int),
+        'stock_filter': args.get('stock_filter'),
+        'status_filter': args.get('status_filter', 'all'),
+        'search_query': args.get('q', '')
+    }
+
+
+def product_list_criteria(filters):
+    """WHERE criteria for the product list filters"""
+    criteria = []
+
+    if filters['search_query']:
+        criteria.append(Product.id.in_(search_product_ids(filters['search_query'])))
+
+    if filters['category_id']:
+        criteria.append(Product.category_id == filters['category_id'])
+
+    if filters['status_filter'] != 'all':
+        criteria.append(Product.status == filters['status_filter'])
+
+    if filters['stock_filter'] == 'low':
+        criteria += [
+            Product.stock_quantity <= Product.low_stock_threshold,
+            Product.track_inventory == True
+        ]
+    elif filters['stock_filter'] == 'out':
+        criteria += [
+            Product.stock_quantity == 0,
+            Product.track_inventory == True
+        ]
+    elif filters['stock_filter'] == 'in_stock':
+        criteria.append(Product.stock_quantity > 0)
+
+    return criteria
+
+
+def export_format():
+    """Requested export format; the order export modal's 'json' means JSON Lines"""
+    file_format = request.args.get('format', 'csv')
+    return 'jsonl' if file_format == 'json' else file_format
+
+
 @admin_bp.route('/products')
 def products():
     """Product management with stock information"""
@@ -96,43 +165,10 @@ def products():
         per_page = 20
 
         # Get filter parameters
-        category_id = request.args.get('category_id', type=int)
-        stock_filter = request.args.get('stock_filter')
-        status_filter = request.args.get('status_filter', 'all')
-        search_query = request.args.get('q', '')
-
-        # Build query
-        query = Product.query
-
-        if search_query:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search_query}%'),
-                    Product.sku.ilike(f'%{search_query}%'),
-                    Product.description.ilike(f'%{search_query}%')
-                )
-            )
-
-        if category_id:
-            query = query.filter(Product.category_id == category_id)
-
-        if status_filter != 'all':
-            query = query.filter(Product.status == status_filter)
-
-        if stock_filter == 'low':
-            query = query.filter(
-                Product.stock_quantity <= Product.low_stock_threshold,
-                Product.track_inventory == True
-            )
-        elif stock_filter == 'out':
-            query = query.filter(
-                Product.stock_quantity == 0,
-                Product.track_inventory == True
-            )
-        elif stock_filter == 'in_stock':
-            query = query.filter(Product.stock_quantity > 0)
+        filters = product_list_filters(request.args)
 
         # Get products with pagination
+        query = Product.query.filter(*product_list_criteria(filters))
         products_pagination = query.order_by(Product.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
@@ -143,16 +179,25 @@ def products():
                                products=products_pagination.items,
                                pagination=products_pagination,
                                categories=categories,
-                               category_id=category_id,
-                               stock_filter=stock_filter,
-                               status_filter=status_filter,
-                               search_query=search_query)
+                               **filters)
 
     except Exception as e:
         flash(f'Error loading products: {str(e)}', 'danger')
         return redirect(url_for('admin.dashboard'))
 
 
+@admin_bp.route('/products/export')
+def export_products():
+    """Stream the filtered product list as CSV or JSONL"""
+    file_format = export_format()
+    if file_format not in EXPORT_FORMATS:
+        flash('Products can be exported as CSV or JSONL', 'danger')
+        return redirect(url_for('admin.products'))
+    statement = product_export(*product_list_criteria(product_list_filters(request.args))) \
+        .order_by(Product.created_at.desc(), Product.id.desc())
+    return export_response(statement, PRODUCT_COLUMNS, 'products', file_format)
+
+
 @admin_bp.route('/products/new', methods=['GET', 'POST'])
 def new_product():
     """Add new product"""
@@ -203,6 +248,7 @@ def new_product():
                 track_inventory=track_inventory,
                 is_returnable=is_returnable
             )
+            apply_product_images(product)
 
             db.session.add(product)
             db.session.commit()
@@ -225,6 +271,45 @@ def new_product():
         return redirect(url_for('admin.products'))
 
 
+@admin_bp.route('/products/import', methods=['GET', 'POST'])
+def import_products():
+    """Bulk create/update products from a CSV or JSONL upload, run in the background"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSONL file to import', 'danger')
+            return redirect(url_for('admin.import_products'))
+        try:
+            job = save_import_upload(upload, current_user.id)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.import_products'))
+        get_import_runner().submit(job.id)
+        flash(f'Import #{job.id} started; progress is shown below', 'success')
+        return redirect(url_for('admin.import_products'))
+
+    jobs = ImportJob.query.order_by(ImportJob.created_at.desc()).limit(20).all()
+    return render_template('admin/product_import.html', jobs=jobs, fields=['sku'] + list(IMPORT_FIELDS))
+
+
+@admin_bp.route('/imports/<int:job_id>')
+def import_status(job_id):
+    """Progress of one import job (polled by the import page)"""
+    job = ImportJob.query.get_or_404(job_id)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@admin_bp.route('/imports/<int:job_id>/errors')
+def import_errors(job_id):
+    """CSV of the rows an import rejected, with the reason for each"""
+    job = ImportJob.query.get_or_404(job_id)
+    if not job.report_path:
+        flash('This import has no rejected rows', 'info')
+        return redirect(url_for('admin.import_products'))
+    return send_file(job.report_path, mimetype='text/csv', as_attachment=True,
+                     download_name=f'import-{job.id}-errors.csv')
+
+
 @admin_bp.route('/products/<int:product_id>/edit', methods=['GET', 'POST'])
 def edit_product(product_id):
     """Edit existing product"""
@@ -255,6 +340,7 @@ def edit_product(product_id):
             product.is_returnable = 'is_returnable' in request.form
 
             product.update_stock_status()  # Update stock status based on new quantity
+            apply_product_images(product)
 
             db.session.commit()
             flash('Product updated successfully!', 'success')
@@ -357,46 +443,71 @@ def delete_product(product_id):
     return redirect(url_for('admin.products'))
 
 
+def order_list_filters(args):
+    """Filter values from the order list query string; the export modal sends date_range/start_date/end_date"""
+    return {
+        'status_filter': args.get('status', 'all'),
+        'payment_filter': args.get('payment_status', 'all'),
+        'date_filter': args.get('date_range') or args.get('date_filter', 'all'),
+        'start_date': args.get('start_date', ''),
+        'end_date': args.get('end_date', ''),
+        'search_query': args.get('q', '')
+    }
+
+
+def order_list_criteria(filters):
+    """WHERE criteria for the order list filters"""
+    criteria = []
+    search_query = filters['search_query']
+    date_filter = filters['date_filter']
+
+    if search_query:
+        criteria.append(
+            or_(
+                Order.order_number.ilike(f'%{search_query}%'),
+                Order.customer_email.ilike(f'%{search_query}%') if hasattr(Order, 'customer_email') else False,
+                Order.id.ilike(f'%{search_query}%')
+            )
+        )
+
+    if filters['status_filter'] != 'all':
+        criteria.append(Order.status == filters['status_filter'])
+
+    if filters['payment_filter'] != 'all':
+        criteria.append(Order.payment_status == filters['payment_filter'])
+
+    if date_filter == 'today':
+        today = datetime.utcnow().date()
+        criteria.append(func.date(Order.created_at) == today)
+    elif date_filter == 'week':
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        criteria.append(Order.created_at >= week_ago)
+    elif date_filter == 'month':
+        month_ago = datetime.utcnow() - timedelta(days=30)
+        criteria.append(Order.created_at >= month_ago)
+    elif date_filter == 'custom':
+        try:
+            if filters['start_date']:
+                criteria.append(Order.created_at >= datetime.strptime(filters['start_date'], '%Y-%m-%d'))
+            if filters['end_date']:
+                end = datetime.strptime(filters['end_date'], '%Y-%m-%d') + timedelta(days=1)
+                criteria.append(Order.created_at < end)
+        except ValueError:
+            pass
+
+    return criteria
+
+
 @admin_bp.route('/orders')
 def orders():
     """Order management with filtering"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = 20
-        status_filter = request.args.get('status', 'all')
-        payment_filter = request.args.get('payment_status', 'all')
-        date_filter = request.args.get('date_filter', 'all')
-        search_query = request.args.get('q', '')
-
-        # Build query
-        query = Order.query
-
-        if search_query:
-            query = query.filter(
-                or_(
-                    Order.order_number.ilike(f'%{search_query}%'),
-                    Order.customer_email.ilike(f'%{search_query}%') if hasattr(Order, 'customer_email') else False,
-                    Order.id.ilike(f'%{search_query}%')
-                )
-            )
-
-        if status_filter != 'all':
-            query = query.filter(Order.status == status_filter)
-
-        if payment_filter != 'all':
-            query = query.filter(Order.payment_status == payment_filter)
-
-        if date_filter == 'today':
-            today = datetime.utcnow().date()
-            query = query.filter(func.date(Order.created_at) == today)
-        elif date_filter == 'week':
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            query = query.filter(Order.created_at >= week_ago)
-        elif date_filter == 'month':
-            month_ago = datetime.utcnow() - timedelta(days=30)
-            query = query.filter(Order.created_at >= month_ago)
+        filters = order_list_filters(request.args)
 
         # Get orders with pagination
+        query = Order.query.filter(*order_list_criteria(filters))
         orders_pagination = query.order_by(Order.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
@@ -404,16 +515,30 @@ def orders():
         return render_template('admin/orders.html',
                                orders=orders_pagination.items,
                                pagination=orders_pagination,
-                               status_filter=status_filter,
-                               payment_filter=payment_filter,
-                               date_filter=date_filter,
-                               search_query=search_query)
+                               status_filter=filters['status_filter'],
+                               payment_filter=filters['payment_filter'],
+                               date_filter=filters['date_filter'],
+                               search_query=filters['search_query'])
 
     except Exception as e:
         flash(f'Error loading orders: {str(e)}', 'danger')
         return redirect(url_for('admin.dashboard'))
 
 
+@admin_bp.route('/orders/export')
+def export_orders():
+    """Stream the filtered order list as CSV or JSONL (?exclude=customer,products,payment drops column groups)"""
+    file_format = export_format()
+    if file_format not in EXPORT_FORMATS:
+        flash('Orders can be exported as CSV or JSON', 'danger')
+        return redirect(url_for('admin.orders'))
+    exclude = {group for value in request.args.getlist('exclude') for group in value.split(',')}
+    columns = export_columns(ORDER_COLUMNS, exclude)
+    statement = order_export(columns).where(*order_list_criteria(order_list_filters(request.args))) \
+        .order_by(Order.created_at.desc(), Order.id.desc())
+    return export_response(statement, columns, 'orders', file_format)
+
+
 @admin_bp.route('/orders/<int:order_id>/update-status', methods=['POST'])
 def update_order_status(order_id):
     """Update order status"""
@@ -507,6 +632,25 @@ def stock_management():
         return redirect(url_for('admin.dashboard'))
 
 
+@admin_bp.route('/stock/export')
+def export_stock_movements():
+    """Stream the stock movement log as CSV or JSONL, optionally one movement type or product"""
+    file_format = export_format()
+    if file_format not in EXPORT_FORMATS:
+        flash('Stock movements can be exported as CSV or JSONL', 'danger')
+        return redirect(url_for('admin.stock_management'))
+    criteria = []
+    movement_type = request.args.get('movement_type', 'all')
+    if movement_type != 'all':
+        criteria.append(StockMovement.movement_type == movement_type)
+    product_id = request.args.get('product_id', type=int)
+    if product_id:
+        criteria.append(StockMovement.product_id == product_id)
+    statement = stock_movement_export(*criteria) \
+        .order_by(StockMovement.performed_at.desc(), StockMovement.id.desc())
+    return export_response(statement, STOCK_MOVEMENT_COLUMNS, 'stock-movements', file_format)
+
+
 @admin_bp.route('/stock/add', methods=['POST'])
 def add_stock():
     """Add stock to product"""
@@ -663,6 +807,9 @@ def new_category():
             is_active=is_active,
             is_featured=is_featured
         )
+        images = save_uploaded_images('image', 'categories')
+        if images:
+            category.image_url = images[0]
 
         db.session.add(category)
         db.session.commit()
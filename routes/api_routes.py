@@ -0,0 +1,88 @@
+# routes/api_routes.py
+"""Read-only catalog API (v1) for the mobile app.
+
+GET /api/v1/products            ?fields= &sort= &cursor= &per_page= plus the storefront filters
+GET /api/v1/products/<slug>     ?fields=
+GET /api/v1/categories          ?fields=
+
+Responses are public, carry an ETag and ``Cache-Control: public,
+max-age=API_CACHE_MAX_AGE`` and answer matching revalidations with 304.
+"""
+from flask import Blueprint, current_app, jsonify, request
+
+from models.category import Category
+from models.product import Product
+from services.catalog_api import (
+    CATEGORY_FIELDS, DEFAULT_CATEGORY_FIELDS, DEFAULT_PRODUCT_LIST_FIELDS, PRODUCT_FIELDS, PRODUCT_RELATIONS,
+    InvalidFields, category_query, parse_fields, product_query, serialize_rows
+)
+from services.pagination import DEFAULT_PRODUCT_SORT, PRODUCT_SORTS, get_per_page, keyset_paginate, ranked_paginate
+from services.product_filters import ProductFilters
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def cacheable(response):
+    """Public caching plus ETag revalidation for an API response"""
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('API_CACHE_MAX_AGE', 60)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@api_bp.errorhandler(InvalidFields)
+def invalid_fields(error):
+    return jsonify({'success': False, 'message': str(error)}), 400
+
+
+@api_bp.route('/products')
+def products():
+    """Active products, filtered like the storefront listing and cursor-paginated"""
+    names = parse_fields(request.args.get('fields'), PRODUCT_FIELDS, DEFAULT_PRODUCT_LIST_FIELDS, PRODUCT_RELATIONS)
+    filters = ProductFilters.from_args(request.args)
+    per_page = get_per_page()
+
+    if filters.search and request.args.get('sort', 'relevance') == 'relevance':
+        query = filters.apply(product_query(names).filter(Product.status == 'active'))
+        page = ranked_paginate(query, filters.search_ids, cursor=request.args.get('cursor'), per_page=per_page)
+    else:
+        sort = request.args.get('sort', DEFAULT_PRODUCT_SORT)
+        if sort not in PRODUCT_SORTS:
+            sort = DEFAULT_PRODUCT_SORT
+        query = filters.apply(product_query(names, PRODUCT_SORTS[sort][0]).filter(Product.status == 'active'))
+        page = keyset_paginate(query, sort, cursor=request.args.get('cursor'), per_page=per_page)
+
+    pagination = page.to_dict()
+    pagination['next_url'] = page.next_url()
+    pagination['prev_url'] = page.prev_url()
+    return cacheable(jsonify({
+        'success': True,
+        'products': serialize_rows(page.items, names, PRODUCT_FIELDS, PRODUCT_RELATIONS),
+        'pagination': pagination
+    }))
+
+
+@api_bp.route('/products/<slug>')
+def product(slug):
+    """One active product; every field unless ?fields= narrows it"""
+    names = parse_fields(request.args.get('fields'), PRODUCT_FIELDS,
+                         list(PRODUCT_FIELDS) + list(PRODUCT_RELATIONS), PRODUCT_RELATIONS)
+    row = product_query(names).filter(Product.slug == slug, Product.status == 'active').first()
+    if row is None:
+        return jsonify({'success': False, 'message': 'Product not found'}), 404
+    return cacheable(jsonify({
+        'success': True,
+        'product': serialize_rows([row], names, PRODUCT_FIELDS, PRODUCT_RELATIONS)[0]
+    }))
+
+
+@api_bp.route('/categories')
+def categories():
+    """Active categories, each subtree listed together, with subtree product counts"""
+    names = parse_fields(request.args.get('fields'), CATEGORY_FIELDS, DEFAULT_CATEGORY_FIELDS)
+    rows = category_query(names).filter(Category.is_active == True) \
+        .order_by(Category.path, Category.sort_order, Category.id).all()
+    return cacheable(jsonify({
+        'success': True,
+        'categories': serialize_rows(rows, names, CATEGORY_FIELDS)
+    }))
@@ -4,6 +4,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from models.user import User
 from extension import db
+from services.cart_store import forget_guest_cart, merge_guest_cart
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -54,8 +55,13 @@ def register():
             db.session.add(user)
             db.session.commit()
 
-            # Log the user in
+            # Log the user in, keeping what they added to the cart as a guest
             login_user(user)
+            try:
+                merge_guest_cart(user)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error merging guest cart for user {user.id}: {e}")
             flash('Registration successful! Welcome to Pavitra Enterprises.', 'success')
             return redirect(url_for('shop.index'))
 
@@ -91,6 +97,13 @@ def login():
             user.last_login = datetime.utcnow()
             db.session.commit()
 
+            # Fold the guest cart into the customer's cart
+            try:
+                merge_guest_cart(user)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error merging guest cart for user {user.id}: {e}")
+
             flash(f'Welcome back, {user.first_name}!', 'success')
 
             # Redirect to next page if exists
@@ -120,6 +133,6 @@ def check_session():
 @login_required
 def logout():
     logout_user()
-    session.pop('cart', None)  # Clear session cart
+    forget_guest_cart()  # Start the next visitor with an empty guest cart
     flash('You have been logged out successfully', 'info')
     return redirect(url_for('shop.index'))
\ No newline at end of file
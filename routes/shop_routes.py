@@ -1,7 +1,8 @@
 # routes/shop_routes.py
-from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash
+from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash, current_app, \
+    make_response, send_from_directory, abort
 from flask_login import current_user, login_required, logout_user
-from models.product import Product
+from models.product import Product, ProductVariation
 from models.category import Category
 from models.review import Review
 from models.brand import Brand
@@ -10,7 +11,22 @@ from models.wishlist import Wishlist
 from models.order import Order
 from models.user import User
 from models.address import UserAddress
+from models.coupon import Coupon
 from extension import db
+from services.pagination import PRODUCT_SORTS, DEFAULT_PRODUCT_SORT, keyset_paginate, ranked_paginate, get_per_page
+from services.facets import get_facets
+from services.product_filters import ProductFilters
+from services.suggest import get_suggest_index
+from services.view_counter import record_product_view
+from services.recommendations import BOUGHT_TOGETHER, RELATED, get_recommended_products
+from services.category_tree import get_category_tree
+from services.images import preload_image_assets
+from services.feeds import feed_dir
+from services.http_cache import CacheValidators, listing_validators, product_page_validators
+from services.variation_matrix import get_variation_matrix
+from services.cart import cart_entries
+from services.cart_store import cart_quantity_limit, get_cart_store, guest_cart_id, guest_cart_quantity
+from services.pricing import price_cart, pricing_to_dict
 
 shop_bp = Blueprint('shop', __name__)
 
@@ -34,6 +50,9 @@ def index():
         status='active'
     ).order_by(Product.total_sold.desc()).limit(8).all()
 
+    # Image derivatives for every card on the page in one query
+    preload_image_assets([product.main_image_url for product in featured_products + new_arrivals + best_sellers])
+
     return render_template('index.html',
                            featured_products=featured_products,
                            new_arrivals=new_arrivals,
@@ -43,46 +62,42 @@ def index():
 @shop_bp.route('/products')
 def products():
     """All products page with filtering"""
-    category_slug = request.args.get('category')
-    search_query = request.args.get('q')
-    featured = request.args.get('featured')
+    filters = ProductFilters.from_args(request.args)
     new_arrivals = request.args.get('new_arrivals')
-    on_sale = request.args.get('on_sale')
     best_sellers = request.args.get('best_sellers')
 
     # Base query
-    query = Product.query.filter_by(status='active')
-
-    # Filter by category
-    if category_slug:
-        category = Category.query.filter_by(slug=category_slug, is_active=True).first()
-        if category:
-            query = query.filter_by(category_id=category.id)
-
-    # Search
-    if search_query:
-        query = query.filter(
-            Product.name.ilike(f'%{search_query}%') |
-            Product.description.ilike(f'%{search_query}%') |
-            Product.short_description.ilike(f'%{search_query}%')
-        )
+    query = filters.apply(Product.query.filter_by(status='active'))
+
+    # Legacy flags map onto the keyset sort orders
+    default_sort = 'best_selling' if best_sellers else 'newest' if new_arrivals else DEFAULT_PRODUCT_SORT
+    if filters.search and request.args.get('sort', 'relevance') == 'relevance' \
+            and not (best_sellers or new_arrivals):
+        sort = 'relevance'
+        page = ranked_paginate(query, filters.search_ids, cursor=request.args.get('cursor'),
+                               per_page=get_per_page())
+    else:
+        sort = get_sort(default_sort)
+        page = keyset_paginate(query, sort, cursor=request.args.get('cursor'), per_page=get_per_page())
 
-    # Additional filters
-    if featured:
-        query = query.filter_by(is_featured=True)
-    if new_arrivals:
-        query = query.order_by(Product.created_at.desc())
-    if on_sale:
-        query = query.filter_by(is_on_sale=True)
-    if best_sellers:
-        query = query.order_by(Product.total_sold.desc())
+    facets = get_facets(filters)
 
-    products = query.all()
+    if wants_json():
+        return jsonify({
+            'success': True,
+            'products': Product.to_dict_many(page.items),
+            'pagination': page.to_dict(),
+            'facets': facets
+        })
 
     return render_template('shop/products.html',
-                           products=products,
-                           category_slug=category_slug,
-                           search_query=search_query)
+                           products=page.items,
+                           pagination=page,
+                           sort=sort,
+                           facets=facets,
+                           filters=filters,
+                           category_slug=filters.category,
+                           search_query=filters.search)
 
 
 @shop_bp.route('/search')
@@ -97,16 +112,27 @@ def product_detail(slug):
     """Product detail page"""
     product = Product.query.filter_by(slug=slug, status='active').first_or_404()
 
-    # Increment view count
-    product.view_count += 1
-    db.session.commit()
+    # Count the view; buffered and flushed in batches, no write here
+    record_product_view(product.id)
+
+    # Option picker data, one cached query instead of a lazy load per variation attribute
+    variation_matrix = get_variation_matrix(product)
 
-    # Get related products
-    related_products = Product.query.filter(
-        Product.category_id == product.category_id,
-        Product.id != product.id,
-        Product.status == 'active'
-    ).limit(4).all()
+    # Revalidations end here, before recommendations, reviews and the template load
+    validators = product_page_validators(product, variation_matrix.json if variation_matrix else None)
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    # Related products and frequently bought together, precomputed by flask build-recommendations
+    related_products = get_recommended_products(product, RELATED, limit=4)
+    if not related_products:
+        related_products = Product.query.filter(
+            Product.category_id == product.category_id,
+            Product.id != product.id,
+            Product.status == 'active'
+        ).limit(4).all()
+    bought_together = get_recommended_products(product, BOUGHT_TOGETHER, limit=4)
 
     # Get approved reviews
     reviews = Review.query.filter_by(
@@ -114,10 +140,12 @@ def product_detail(slug):
         status='approved'
     ).order_by(Review.created_at.desc()).all()
 
-    return render_template('shop/product_detail.html',
-                           product=product,
-                           related_products=related_products,
-                           reviews=reviews)
+    return validators.apply(make_response(render_template('shop/product_detail.html',
+                                                          product=product,
+                                                          related_products=related_products,
+                                                          bought_together=bought_together,
+                                                          variation_matrix=variation_matrix,
+                                                          reviews=reviews)))
 
 
 @shop_bp.route('/categories')
@@ -131,28 +159,63 @@ def categories():
 def category(slug):
     """Category detail page"""
     category = Category.query.filter_by(slug=slug, is_active=True).first_or_404()
-    products = Product.query.filter_by(
-        category_id=category.id,
-        status='active'
-    ).all()
+    # Products of the category and all of its active subcategories
+    in_subtree = get_category_tree().subtree_filter(Product.category_id, category.id)
 
-    return render_template('shop/category_detail.html',
-                           category=category,
-                           products=products)
+    validators = listing_validators(category, in_subtree)
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    query = Product.query.filter(in_subtree, Product.status == 'active')
+    sort = get_sort()
+    page = keyset_paginate(query, sort, cursor=request.args.get('cursor'), per_page=get_per_page())
+
+    if wants_json():
+        return validators.apply(jsonify({
+            'success': True,
+            'category': category.to_dict(),
+            'products': Product.to_dict_many(page.items),
+            'pagination': page.to_dict()
+        }))
+
+    return validators.apply(make_response(render_template('shop/category_detail.html',
+                                                          category=category,
+                                                          products=page.items,
+                                                          pagination=page,
+                                                          sort=sort)))
 
 
 @shop_bp.route('/brand/<slug>')
 def brand(slug):
     """Brand products page"""
     brand = Brand.query.filter_by(slug=slug, is_active=True).first_or_404()
-    products = Product.query.filter_by(
+
+    validators = listing_validators(brand, Product.brand_id == brand.id)
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    query = Product.query.filter_by(
         brand_id=brand.id,
         status='active'
-    ).all()
+    )
+    sort = get_sort()
+    page = keyset_paginate(query, sort, cursor=request.args.get('cursor'), per_page=get_per_page())
+
+    if wants_json():
+        return validators.apply(jsonify({
+            'success': True,
+            'brand': brand.to_dict(),
+            'products': Product.to_dict_many(page.items),
+            'pagination': page.to_dict()
+        }))
 
-    return render_template('shop/brand.html',
-                           brand=brand,
-                           products=products)
+    return validators.apply(make_response(render_template('shop/brand.html',
+                                                          brand=brand,
+                                                          products=page.items,
+                                                          pagination=page,
+                                                          sort=sort)))
 
 
 # Cart Routes
@@ -171,6 +234,12 @@ def add_to_cart():
             return jsonify({'success': False, 'message': 'Product ID is required'})
 
         product = Product.query.get_or_404(product_id)
+        variation = ProductVariation.query.filter_by(id=variation_id, product_id=product.id).first() \
+            if variation_id else None
+        # max_cart_quantity, and the stock unless backorders are allowed
+        limit = cart_quantity_limit(product, variation)
+        if limit is not None and limit < 1:
+            return jsonify({'success': False, 'message': 'This product is out of stock'})
 
         if current_user.is_authenticated:
             # For logged-in users - save to database
@@ -185,49 +254,24 @@ def add_to_cart():
                 print(
                     f"DEBUG: Found existing cart item, increasing quantity from {cart_item.quantity} to {cart_item.quantity + quantity}")
                 cart_item.quantity += quantity
+                if limit is not None:
+                    cart_item.quantity = min(cart_item.quantity, limit)
             else:
                 print(f"DEBUG: No existing cart item, creating new one")
                 cart_item = ShoppingCart(
                     user_id=current_user.id,
                     product_id=product_id,
                     variation_id=variation_id,
-                    quantity=quantity
+                    quantity=quantity if limit is None else min(quantity, limit)
                 )
                 db.session.add(cart_item)
 
             db.session.commit()
             print(f"DEBUG: Cart updated in database")
         else:
-            # For guests - save to session
-            print(f"DEBUG: Guest user - using session cart")
-            if 'cart' not in session:
-                session['cart'] = []
-                print(f"DEBUG: Created new session cart")
-
-            # Check if item already exists in cart
-            cart_item_exists = False
-            print(f"DEBUG: Current session cart: {session['cart']}")
-
-            for index, item in enumerate(session['cart']):
-                print(f"DEBUG: Checking item {index}: {item}")
-                if (str(item['product_id']) == str(product_id) and
-                        str(item.get('variation_id', '')) == str(variation_id if variation_id else '')):
-                    print(
-                        f"DEBUG: Found existing item at index {index}, increasing quantity from {item['quantity']} to {item['quantity'] + quantity}")
-                    item['quantity'] += quantity
-                    cart_item_exists = True
-                    break
-
-            if not cart_item_exists:
-                print(f"DEBUG: No existing item found, adding new item")
-                session['cart'].append({
-                    'product_id': int(product_id),
-                    'variation_id': int(variation_id) if variation_id else None,
-                    'quantity': quantity
-                })
-
-            session.modified = True
-            print(f"DEBUG: Updated session cart: {session['cart']}")
+            # For guests - save to the server-side cart behind the cart id cookie
+            get_cart_store().add(guest_cart_id(create=True), int(product_id),
+                                 int(variation_id) if variation_id else None, quantity, limit=limit)
 
         # Get updated cart count
         updated_cart_count = get_cart_count()
@@ -247,33 +291,49 @@ def add_to_cart():
 @shop_bp.route('/cart')
 def cart():
     """Shopping cart page"""
-    cart_items = []
-    total_amount = 0
+    pricing = get_cart_pricing()
+    return render_template('shop/cart.html',
+                           pricing=pricing,
+                           coupon_code=session.get('coupon_code'))
 
-    if current_user.is_authenticated:
-        # Get cart items from database
-        cart_items = ShoppingCart.query.filter_by(user_id=current_user.id).all()
-        for item in cart_items:
-            if item.product:
-                item_total = float(item.product.base_price) * item.quantity
-                total_amount += item_total
-    else:
-        # Get cart items from session
-        if 'cart' in session:
-            for item_data in session['cart']:
-                product = Product.query.get(item_data['product_id'])
-                if product:
-                    item_total = float(product.base_price) * item_data['quantity']
-                    total_amount += item_total
-                    cart_items.append({
-                        'product': product,
-                        'quantity': item_data['quantity'],
-                        'variation_id': item_data.get('variation_id')
-                    })
 
-    return render_template('shop/cart.html',
-                           cart_items=cart_items,
-                           total_amount=total_amount)
+@shop_bp.route('/apply-coupon', methods=['POST'])
+def apply_coupon():
+    """Apply a coupon code to the cart (an empty code removes it)"""
+    try:
+        data = request.get_json(silent=True) or request.form
+        code = (data.get('code') or '').strip().upper()
+
+        if not code:
+            session.pop('coupon_code', None)
+            return jsonify({'success': True, 'message': 'Coupon removed',
+                            'cart': pricing_to_dict(get_cart_pricing())})
+
+        coupon = Coupon.query.filter_by(code=code).first()
+        if not coupon:
+            return jsonify({'success': False, 'message': 'Invalid coupon code'})
+
+        pricing = price_cart(cart_entries(), get_shipping_state())
+        valid, message = coupon.is_valid(current_user.id if current_user.is_authenticated else None,
+                                         pricing.subtotal)
+        if not valid:
+            return jsonify({'success': False, 'message': message})
+
+        session['coupon_code'] = coupon.code
+        return jsonify({'success': True, 'message': 'Coupon applied', 'cart': pricing_to_dict(get_cart_pricing())})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+
+@shop_bp.route('/api/cart/summary')
+def api_cart_summary():
+    """Priced cart for the mini-cart and checkout; ?state= previews GST for a shipping state"""
+    try:
+        pricing = get_cart_pricing(request.args.get('state'))
+        return jsonify({'success': True, 'coupon_code': session.get('coupon_code'), 'cart': pricing_to_dict(pricing)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
 
 
 @shop_bp.route('/update-cart', methods=['POST'])
@@ -295,13 +355,10 @@ def update_cart():
             else:
                 cart_item.quantity = quantity
         else:
-            # Update session cart
-            if 'cart' in session and 0 <= item_id < len(session['cart']):
-                if quantity <= 0:
-                    session['cart'].pop(item_id)
-                else:
-                    session['cart'][item_id]['quantity'] = quantity
-                session.modified = True
+            # Update the guest's stored cart
+            cart_id = guest_cart_id()
+            if not cart_id or not get_cart_store().set_quantity(cart_id, int(item_id), quantity):
+                return jsonify({'success': False, 'message': 'Cart item not found'})
 
         db.session.commit()
         return jsonify({'success': True, 'message': 'Cart updated'})
@@ -324,10 +381,10 @@ def remove_from_cart():
                 return jsonify({'success': False, 'message': 'Unauthorized'})
             db.session.delete(cart_item)
         else:
-            # Remove from session cart
-            if 'cart' in session and 0 <= item_id < len(session['cart']):
-                session['cart'].pop(item_id)
-                session.modified = True
+            # Remove from the guest's stored cart
+            cart_id = guest_cart_id()
+            if not cart_id or not get_cart_store().remove(cart_id, int(item_id)):
+                return jsonify({'success': False, 'message': 'Cart item not found'})
 
         db.session.commit()
         return jsonify({'success': True, 'message': 'Item removed from cart'})
@@ -537,6 +594,29 @@ def delete_address(address_id):
     return redirect(url_for('shop.addresses'))
 
 
+# Sitemaps and product feeds, written by flask build-sitemap / flask build-product-feed
+@shop_bp.route('/sitemap.xml')
+def sitemap_index():
+    """Sitemap index listing the gzipped shards"""
+    return send_from_directory(feed_dir(current_app), 'sitemap.xml', mimetype='application/xml', max_age=3600)
+
+
+@shop_bp.route('/sitemaps/<filename>')
+def sitemap_file(filename):
+    """One gzipped sitemap shard"""
+    if not filename.startswith('sitemap-') or not filename.endswith('.xml.gz'):
+        abort(404)
+    return send_from_directory(feed_dir(current_app), filename, mimetype='application/gzip', max_age=3600)
+
+
+@shop_bp.route('/feeds/<filename>')
+def product_feed_file(filename):
+    """Gzipped merchant product feed (full or delta, XML or TSV)"""
+    if not filename.startswith('products') or not filename.endswith(('.xml.gz', '.tsv.gz')):
+        abort(404)
+    return send_from_directory(feed_dir(current_app), filename, mimetype='application/gzip', max_age=3600)
+
+
 # Static pages - UPDATED PATHS
 @shop_bp.route('/about')
 def about():
@@ -598,57 +678,119 @@ def api_wishlist_count():
 def api_product_stock(product_id):
     """Get product stock information"""
     try:
+        # The payload is a function of these columns, so they are the validator
+        version = db.session.query(Product.updated_at, Product.stock_quantity, Product.stock_status,
+                                   Product.track_inventory).filter(Product.id == product_id).first()
+        validators = None
+        if version is not None:
+            validators = CacheValidators(product_id, tuple(version), last_modified=(version.updated_at,),
+                                         shared_header=False)
+            not_modified = validators.not_modified()
+            if not_modified:
+                return not_modified
+
         product = Product.query.get_or_404(product_id)
-        return jsonify({
+        response = jsonify({
             'success': True,
             'stock_quantity': product.stock_quantity,
             'stock_status': product.stock_status,
             'is_in_stock': product.is_in_stock(),
             'available_quantity': product.get_available_quantity()
         })
+        return validators.apply(response) if validators else response
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 
+@shop_bp.route('/api/search/suggest')
+def api_search_suggest():
+    """Typeahead suggestions for the search box"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 8, type=int) or 8, current_app.config.get('SUGGEST_MAX_RESULTS', 20))
+        endpoints = {'product': 'shop.product_detail', 'brand': 'shop.brand', 'category': 'shop.category'}
+        suggestions = []
+        for suggestion in get_suggest_index().suggest(query, limit=limit):
+            suggestions.append({
+                'type': suggestion['type'],
+                'text': suggestion['text'],
+                'slug': suggestion['slug'],
+                'url': url_for(endpoints[suggestion['type']], slug=suggestion['slug'])
+            })
+        return jsonify({'success': True, 'query': query, 'suggestions': suggestions})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e), 'suggestions': []})
+
+
 # Helper functions
 def get_cart_count():
     """Get total cart count (sum of all quantities)"""
     if current_user.is_authenticated:
-        # Sum all quantities for logged-in users
-        total_quantity = db.session.query(db.func.sum(ShoppingCart.quantity)).filter_by(user_id=current_user.id).scalar()
-        count = total_quantity or 0
+        # Sum of all quantities, kept on the user row
+        count = current_user.get_cart_quantity()
         print(f"DEBUG: Database cart total quantity for user {current_user.id}: {count}")
         return count
     else:
-        # Sum all quantities for guest users
-        cart = session.get('cart', [])
-        total_quantity = sum(item.get('quantity', 0) for item in cart)
-        print(f"DEBUG: Session cart total quantity: {total_quantity}")
-        return total_quantity
+        # Sum all quantities in the guest's stored cart
+        return guest_cart_quantity()
+
+
+def get_sort(default=DEFAULT_PRODUCT_SORT):
+    """Get a valid product sort order from ?sort="""
+    sort = request.args.get('sort', default)
+    return sort if sort in PRODUCT_SORTS else default
+
+
+def wants_json():
+    """Check whether the client asked for JSON instead of HTML"""
+    if request.args.get('format') == 'json':
+        return True
+    return request.accept_mimetypes.best == 'application/json'
 
 
 def get_wishlist_count():
     """Get wishlist count"""
     if current_user.is_authenticated:
-        return Wishlist.query.filter_by(user_id=current_user.id).count()
+        return current_user.get_wishlist_count()
     return 0
 
 
+def get_shipping_state():
+    """State of the customer's default shipping address, if known"""
+    if current_user.is_authenticated:
+        address = UserAddress.query.filter_by(user_id=current_user.id, address_type='shipping') \
+            .order_by(UserAddress.is_default.desc(), UserAddress.id).first()
+        if address:
+            return address.state
+    return None
+
+
+def get_cart_coupon(subtotal):
+    """The applied coupon, if it is still valid for this cart"""
+    code = session.get('coupon_code')
+    if not code:
+        return None
+    coupon = Coupon.query.filter_by(code=code).first()
+    if not coupon:
+        return None
+    valid, _ = coupon.is_valid(current_user.id if current_user.is_authenticated else None, subtotal)
+    return coupon if valid else None
+
+
+def get_cart_pricing(shipping_state=None):
+    """CartPricing for the current cart, shipping state and applied coupon"""
+    entries = cart_entries()
+    shipping_state = shipping_state or get_shipping_state()
+    pricing = price_cart(entries, shipping_state)
+    coupon = get_cart_coupon(pricing.subtotal) if pricing.lines else None
+    if coupon:
+        pricing = price_cart(entries, shipping_state, coupon)
+    return pricing
+
+
 def get_cart_total():
     """Get cart total amount"""
-    total = 0
-    if current_user.is_authenticated:
-        cart_items = ShoppingCart.query.filter_by(user_id=current_user.id).all()
-        for item in cart_items:
-            if item.product:
-                total += float(item.product.base_price) * item.quantity
-    else:
-        if 'cart' in session:
-            for item_data in session['cart']:
-                product = Product.query.get(item_data['product_id'])
-                if product:
-                    total += float(product.base_price) * item_data['quantity']
-    return total
+    return get_cart_pricing().total
 
 # logout
 @shop_bp.route('/auth/logout', methods=['POST'])
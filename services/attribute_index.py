@@ -0,0 +1,234 @@
+# services/attribute_index.py
+"""In-memory bitmap index for storefront listing filters.
+
+Every filterable property of a product - each attribute value, its category,
+brand, stock status, price bucket and the featured / on-sale flags - gets a
+bitmap whose bit ``n`` is set when product ``n`` has it.  Bitmaps are plain
+Python ints, so a filter combination resolves with C-speed ``|`` (values of
+one attribute, brands, buckets) and ``&`` (across filters) instead of one
+``product_attribute_association`` subselect per attribute.
+
+The index is built with two column selects on first use and then kept in
+step with catalog commits: changed products are re-read on the next lookup
+and moved between bitmaps, and other workers' edits are picked up by polling
+``Product.updated_at`` like the search index does.
+
+Results are fed to the listing query as ``Product.id IN (...)``; when more
+than ATTRIBUTE_INDEX_MAX_IDS products match, the filters are so broad that
+the plain SQL predicates are used instead.
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from extension import db
+from models.brand import Brand
+from models.product import Product, ProductAttributeValue, product_attribute_association
+from services import catalog_events
+from services.category_tree import get_category_tree
+from services.product_filters import get_price_buckets
+
+
+def to_bitmap(ids):
+    """Bitmap with the bit of every id in ``ids`` set"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for product_id in ids:
+        bits[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitmap_ids(bitmap):
+    """Ids of the set bits in ``bitmap``, ascending"""
+    digits = bin(bitmap)[:1:-1]  # least significant bit first
+    ids = []
+    position = digits.find('1')
+    while position >= 0:
+        ids.append(position)
+        position = digits.find('1', position + 1)
+    return ids
+
+
+class AttributeIndex:
+    """Bitmaps of product ids per filterable value"""
+
+    def __init__(self, sync_interval=30, max_ids=5000):
+        self.sync_interval = sync_interval
+        self.max_ids = max_ids
+        self._lock = threading.RLock()
+        self._bitmaps = {}
+        self._keys = {}  # product id -> keys whose bitmaps have its bit set
+        self._value_attributes = {}  # attribute value id -> attribute id
+        self._brand_ids = {}  # brand slug -> id
+        self._ready = False
+        self._pending_products = set()
+        self._pending_lookups = False
+        self._synced_at = None
+        self._checked_at = 0.0
+
+    def on_commit(self, changes):
+        """catalog_events subscriber: remember which products to re-read"""
+        with self._lock:
+            self._pending_products |= changes.touched('Product')
+            if changes.touched('ProductAttributeValue') or changes.touched('Brand'):
+                self._pending_lookups = True
+
+    def _product_keys(self, product_ids=None):
+        """{product id: [keys]} read from the database"""
+        buckets = [(key, upper) for key, lower, upper in get_price_buckets()]
+        statement = select(Product.id, Product.category_id, Product.brand_id, Product.stock_status,
+                           Product.base_price, Product.is_featured, Product.is_on_sale)
+        links = select(product_attribute_association.c.product_id,
+                       product_attribute_association.c.attribute_value_id)
+        if product_ids is not None:
+            statement = statement.where(Product.id.in_(product_ids))
+            links = links.where(product_attribute_association.c.product_id.in_(product_ids))
+
+        keys = {}
+        for row in db.session.execute(statement):
+            price = row.base_price or 0
+            bucket = next(key for key, upper in buckets if upper is None or price < upper)
+            product_keys = keys[row.id] = [('category', row.category_id), ('stock', row.stock_status),
+                                           ('price', bucket)]
+            if row.brand_id:
+                product_keys.append(('brand', row.brand_id))
+            if row.is_featured:
+                product_keys.append(('featured', True))
+            if row.is_on_sale:
+                product_keys.append(('on_sale', True))
+        for product_id, value_id in db.session.execute(links):
+            if product_id in keys:
+                keys[product_id].append(('attr', value_id))
+        return keys
+
+    def _load_lookups(self):
+        self._value_attributes = dict(db.session.execute(
+            select(ProductAttributeValue.id, ProductAttributeValue.attribute_id)).all())
+        self._brand_ids = dict(db.session.execute(select(Brand.slug, Brand.id)).all())
+        # Deleted values take their product links with them
+        for key in [key for key in self._bitmaps if key[0] == 'attr' and key[1] not in self._value_attributes]:
+            del self._bitmaps[key]
+        self._pending_lookups = False
+
+    def rebuild(self):
+        """Index every product from scratch; returns the number indexed"""
+        with self._lock:
+            started = datetime.utcnow()
+            self._keys = self._product_keys()
+            members = {}
+            for product_id, keys in self._keys.items():
+                for key in keys:
+                    members.setdefault(key, []).append(product_id)
+            self._bitmaps = {key: to_bitmap(ids) for key, ids in members.items()}
+            self._load_lookups()
+            self._pending_products.clear()
+            self._synced_at = started
+            self._checked_at = time.monotonic()
+            self._ready = True
+            return len(self._keys)
+
+    def _reindex(self, product_ids):
+        fresh = self._product_keys(product_ids)
+        for product_id in product_ids:
+            bit = 1 << product_id
+            for key in self._keys.pop(product_id, ()):
+                if key in self._bitmaps:
+                    self._bitmaps[key] &= ~bit
+            for key in fresh.get(product_id, ()):
+                self._bitmaps[key] = self._bitmaps.get(key, 0) | bit
+            if product_id in fresh:
+                self._keys[product_id] = fresh[product_id]
+
+    def refresh(self):
+        """Apply pending changes and poll for edits made by other workers"""
+        with self._lock:
+            if not self._ready:
+                self.rebuild()
+                return
+
+            pending = set(self._pending_products)
+            now = time.monotonic()
+            if now - self._checked_at >= self.sync_interval:
+                started = datetime.utcnow()
+                pending.update(row[0] for row in db.session.query(Product.id)
+                               .filter(Product.updated_at >= self._synced_at))
+                self._synced_at = started
+                self._checked_at = now
+                self._pending_lookups = True
+
+            if self._pending_lookups:
+                self._load_lookups()
+            if pending:
+                self._reindex(pending)
+            self._pending_products.clear()
+
+    def _union(self, kind, values):
+        bitmap = 0
+        for value in values:
+            bitmap |= self._bitmaps.get((kind, value), 0)
+        return bitmap
+
+    def match(self, filters):
+        """Bitmap of the products matching ``filters``, or None when no indexed filter is active"""
+        self.refresh()
+        with self._lock:
+            groups = []
+            if filters.category:
+                tree = get_category_tree()
+                category = tree.by_slug(filters.category)
+                if category and category.is_active:
+                    groups.append(self._union('category', tree.descendants(category.id)))
+            if filters.brands:
+                groups.append(self._union('brand', (self._brand_ids.get(slug) for slug in filters.brands)))
+            if filters.prices:
+                groups.append(self._union('price', filters.prices))
+            if filters.stock_statuses:
+                groups.append(self._union('stock', filters.stock_statuses))
+            if filters.attribute_values:
+                # Values of the same attribute are alternatives; different attributes must all match
+                by_attribute = {}
+                for value_id in filters.attribute_values:
+                    attribute_id = self._value_attributes.get(value_id)
+                    if attribute_id is not None:
+                        by_attribute.setdefault(attribute_id, []).append(value_id)
+                groups.extend(self._union('attr', value_ids) for value_ids in by_attribute.values())
+            if filters.featured:
+                groups.append(self._bitmaps.get(('featured', True), 0))
+            if filters.on_sale:
+                groups.append(self._bitmaps.get(('on_sale', True), 0))
+
+        if filters.search:
+            groups.append(to_bitmap(filters.search_ids))
+        if not groups:
+            return None
+        result = groups[0]
+        for bitmap in groups[1:]:
+            result &= bitmap
+        return result
+
+    def product_ids(self, filters):
+        """Ids matching ``filters``, or None when SQL should filter (nothing indexed, or too many matches)"""
+        result = self.match(filters)
+        if result is None or result.bit_count() > self.max_ids:
+            return None
+        return bitmap_ids(result)
+
+
+def get_attribute_index():
+    return current_app.extensions.get('attribute_index')
+
+
+def init_attribute_index(app):
+    """Attach an AttributeIndex to ``app`` and subscribe it to catalog commits"""
+    index = AttributeIndex(
+        sync_interval=app.config.get('ATTRIBUTE_INDEX_SYNC_INTERVAL', 30),
+        max_ids=app.config.get('ATTRIBUTE_INDEX_MAX_IDS', 5000)
+    )
+    app.extensions['attribute_index'] = index
+    catalog_events.subscribe(index.on_commit)
+    return index
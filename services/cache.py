@@ -0,0 +1,62 @@
+# services/cache.py
+"""Small in-process caches for catalog data."""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class VersionedCache:
+    """LRU cache whose entries expire after ``ttl`` seconds or on invalidate()"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, version=None):
+        """Store ``value``; dropped if the cache was invalidated since ``version`` was read"""
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            version = self.version
+            value = factory()
+            self.set(key, value, version=version)
+        return value
+
+    def discard(self, key):
+        """Drop one entry; values computed before the call are not stored afterwards"""
+        with self._lock:
+            self.version += 1
+            self._data.pop(key, None)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
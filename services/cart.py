@@ -0,0 +1,103 @@
+# services/cart.py
+"""Cart hydration: the current cart's rows with their products and variations.
+
+A cart is a list of CartEntry rows (ids and quantities only), read from
+ShoppingCart for customers and from the guest cart store
+(services/cart_store.py) for guests.
+``hydrate_cart(entries)`` turns them into CartLine objects with one IN
+query for the products and one for the variations, however many lines the
+cart has, and keeps the result on ``flask.g`` so every helper in the
+request (cart page, totals, pricing) shares the same objects.
+"""
+from collections import namedtuple
+
+from flask import g, has_request_context
+from flask_login import current_user
+
+from extension import db
+from models.cart import ShoppingCart
+from models.product import Product, ProductVariation
+from services.cart_store import get_cart_store, guest_cart_id
+
+# One cart row; item_id is the ShoppingCart id (or the guest cart store's line id)
+CartEntry = namedtuple('CartEntry', 'item_id product_id variation_id quantity')
+
+
+class CartLine(namedtuple('CartLine', 'item_id product variation quantity')):
+    """A cart row with its Product and (optional) ProductVariation loaded"""
+    __slots__ = ()
+
+    @property
+    def product_id(self):
+        return self.product.id
+
+    @property
+    def variation_id(self):
+        return self.variation.id if self.variation is not None else None
+
+    @property
+    def unit_price(self):
+        """Variation price when it has its own, else the product's base price"""
+        if self.variation is not None and self.variation.price is not None:
+            return self.variation.price
+        return self.product.base_price
+
+    @property
+    def sku(self):
+        return self.variation.sku if self.variation is not None else self.product.sku
+
+    @property
+    def image(self):
+        return (self.variation.image_url if self.variation is not None else None) or self.product.main_image_url
+
+    @property
+    def in_stock(self):
+        item = self.variation if self.variation is not None else self.product
+        return item.is_in_stock()
+
+
+def cart_entries():
+    """The current customer's or guest's cart as CartEntry rows"""
+    if current_user.is_authenticated:
+        rows = db.session.query(ShoppingCart.id, ShoppingCart.product_id, ShoppingCart.variation_id,
+                                ShoppingCart.quantity) \
+            .filter(ShoppingCart.user_id == current_user.id).order_by(ShoppingCart.id)
+        return [CartEntry(*row) for row in rows]
+    cart_id = guest_cart_id()
+    return [CartEntry(*item) for item in get_cart_store().items(cart_id)] if cart_id else []
+
+
+def _load_lines(entries):
+    product_ids = {entry.product_id for entry in entries}
+    variation_ids = {entry.variation_id for entry in entries if entry.variation_id}
+    products = {product.id: product for product in
+                Product.query.filter(Product.id.in_(product_ids))} if product_ids else {}
+    variations = {variation.id: variation for variation in
+                  ProductVariation.query.filter(ProductVariation.id.in_(variation_ids))} if variation_ids else {}
+
+    lines = []
+    for entry in entries:
+        product = products.get(entry.product_id)
+        if product is None or entry.quantity <= 0:
+            continue
+        variation = variations.get(entry.variation_id)
+        if variation is not None and variation.product_id != product.id:
+            variation = None
+        lines.append(CartLine(entry.item_id, product, variation, entry.quantity))
+    return lines
+
+
+def hydrate_cart(entries):
+    """CartLines for ``entries`` (lines whose product is gone are dropped), loaded once per request"""
+    entries = tuple(CartEntry(*entry) for entry in entries)
+    if not has_request_context():
+        return _load_lines(entries)
+    cached = g.get('cart_hydration')
+    if cached is None or cached[0] != entries:
+        cached = g.cart_hydration = (entries, _load_lines(entries))
+    return cached[1]
+
+
+def get_cart_lines():
+    """Hydrated lines of the current cart"""
+    return hydrate_cart(cart_entries())
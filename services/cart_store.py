@@ -0,0 +1,381 @@
+# services/cart_store.py
+"""Server-side guest carts behind an opaque cart id cookie.
+
+Guest carts used to live in the signed session cookie, which grew with
+every line and was re-sent and re-verified on each request.  Now the
+browser only holds CART_COOKIE_NAME, a random token, and the lines live in
+a CartStore chosen by CART_STORE_BACKEND:
+
+* database - guest_carts / guest_cart_items (migration 014), shared by all
+             workers and kept for CART_TTL_DAYS since the last change
+* memory   - a per-process dict, for development and single-worker setups
+
+Other backends (a shared cache, say) subclass CartStore and register in
+BACKENDS.  Each store returns cart lines as (item id, product id,
+variation id, quantity) tuples; services/cart.py turns them into entries.
+
+When a guest logs in, merge_guest_cart() folds their cart into
+ShoppingCart with one atomic add per line, then drops the guest cart and
+its cookie.  Every add is capped by cart_quantity_limit(), the product's
+max_cart_quantity and, unless backorders are allowed, its stock.
+"""
+import itertools
+import secrets
+from abc import ABC, abstractmethod
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app, g, request, session
+from sqlalchemy import case, delete, func, insert, select, update
+
+from extension import db
+from models.cart import GuestCart, GuestCartItem, ShoppingCart
+from models.product import Product, ProductVariation
+from models.user import User
+
+
+def cart_quantity_limit(product, variation=None):
+    """Most units one cart line of ``product`` (or ``variation``) may hold, or None for no limit"""
+    limit = product.max_cart_quantity or None
+    if product.track_inventory:
+        item = variation if variation is not None else product
+        if not item.allow_backorders:
+            stock = max(item.stock_quantity or 0, 0)
+            limit = stock if limit is None else min(limit, stock)
+    return limit
+
+
+def _capped(total, limit):
+    return total if limit is None else case((total > limit, limit), else_=total)
+
+
+def _upsert_line(connection, table, row, key_columns, limit=None):
+    """Insert ``row``, or add its quantity to the line with the same ``key_columns`` (capped at ``limit``)"""
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as upsert
+        statement = upsert(table).values(**row)
+        statement = statement.on_duplicate_key_update(
+            quantity=_capped(table.c.quantity + statement.inserted.quantity, limit))
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(table).values(**row)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[column] for column in key_columns],
+            set_={'quantity': _capped(table.c.quantity + statement.excluded.quantity, limit)}
+        )
+    else:
+        result = connection.execute(
+            update(table)
+            .where(*[table.c[column] == row[column] for column in key_columns])
+            .values(quantity=_capped(table.c.quantity + row['quantity'], limit))
+        )
+        if result.rowcount:
+            return
+        statement = insert(table).values(**row)
+    connection.execute(statement)
+
+
+class CartStore(ABC):
+    """Guest carts keyed by an opaque id"""
+    name = None
+
+    def new_id(self):
+        return secrets.token_urlsafe(32)
+
+    @abstractmethod
+    def exists(self, cart_id):
+        """Whether ``cart_id`` names a live cart"""
+
+    @abstractmethod
+    def create(self):
+        """Start an empty cart and return its id"""
+
+    @abstractmethod
+    def items(self, cart_id):
+        """[(item id, product id, variation id, quantity)] in the order they were added"""
+
+    @abstractmethod
+    def add(self, cart_id, product_id, variation_id, quantity, limit=None):
+        """Add ``quantity`` of a product (and variation) to the cart, merging with an existing line;
+        the line never goes above ``limit``"""
+
+    @abstractmethod
+    def set_quantity(self, cart_id, item_id, quantity):
+        """Change a line's quantity; zero or less removes it.  Returns False for unknown lines"""
+
+    def remove(self, cart_id, item_id):
+        return self.set_quantity(cart_id, item_id, 0)
+
+    @abstractmethod
+    def clear(self, cart_id):
+        """Delete the cart"""
+
+    @abstractmethod
+    def purge(self, before):
+        """Delete carts untouched since ``before``; returns how many were removed"""
+
+    def quantity(self, cart_id):
+        return sum(item[3] for item in self.items(cart_id))
+
+
+class DatabaseCartStore(CartStore):
+    """Carts in guest_carts / guest_cart_items; every call commits"""
+    name = 'database'
+
+    def exists(self, cart_id):
+        return db.session.get(GuestCart, cart_id) is not None
+
+    def create(self):
+        cart = GuestCart(id=self.new_id())
+        db.session.add(cart)
+        db.session.commit()
+        return cart.id
+
+    def items(self, cart_id):
+        rows = db.session.query(GuestCartItem.id, GuestCartItem.product_id, GuestCartItem.variation_id,
+                                GuestCartItem.quantity) \
+            .filter(GuestCartItem.cart_id == cart_id).order_by(GuestCartItem.id)
+        return [tuple(row) for row in rows]
+
+    def quantity(self, cart_id):
+        return db.session.query(func.coalesce(func.sum(GuestCartItem.quantity), 0)) \
+            .filter(GuestCartItem.cart_id == cart_id).scalar()
+
+    def _touch(self, cart_id):
+        db.session.execute(update(GuestCart).where(GuestCart.id == cart_id).values(updated_at=datetime.utcnow()))
+
+    def add(self, cart_id, product_id, variation_id, quantity, limit=None):
+        # One atomic upsert, so concurrent adds of the same line both count
+        if limit is not None:
+            quantity = min(quantity, limit)
+        if quantity <= 0:
+            return
+        row = {'cart_id': cart_id, 'product_id': product_id, 'variation_id': variation_id,
+               'variation_key': variation_id or 0, 'quantity': quantity, 'created_at': datetime.utcnow()}
+        _upsert_line(db.session.connection(), GuestCartItem.__table__, row,
+                     ('cart_id', 'product_id', 'variation_key'), limit)
+        self._touch(cart_id)
+        db.session.commit()
+
+    def set_quantity(self, cart_id, item_id, quantity):
+        item = GuestCartItem.query.filter_by(id=item_id, cart_id=cart_id).first()
+        if not item:
+            return False
+        if quantity <= 0:
+            db.session.delete(item)
+        else:
+            item.quantity = quantity
+        self._touch(cart_id)
+        db.session.commit()
+        return True
+
+    def clear(self, cart_id):
+        db.session.execute(delete(GuestCartItem).where(GuestCartItem.cart_id == cart_id))
+        db.session.execute(delete(GuestCart).where(GuestCart.id == cart_id))
+        db.session.commit()
+
+    def purge(self, before):
+        stale = db.session.query(GuestCart.id).filter(GuestCart.updated_at < before).subquery()
+        db.session.execute(delete(GuestCartItem).where(GuestCartItem.cart_id.in_(stale.select())))
+        count = db.session.execute(delete(GuestCart).where(GuestCart.updated_at < before)).rowcount
+        db.session.commit()
+        return count
+
+
+class MemoryCartStore(CartStore):
+    """Carts in this process's memory; lost on restart and not shared between workers"""
+    name = 'memory'
+
+    def __init__(self):
+        self._carts = {}  # cart id -> {'updated_at': datetime, 'items': OrderedDict(item id -> [product, variation, qty])}
+        self._item_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def exists(self, cart_id):
+        return cart_id in self._carts
+
+    def create(self):
+        cart_id = self.new_id()
+        with self._lock:
+            self._carts[cart_id] = {'updated_at': datetime.utcnow(), 'items': OrderedDict()}
+        return cart_id
+
+    def items(self, cart_id):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None:
+                return []
+            return [(item_id, *line) for item_id, line in cart['items'].items()]
+
+    def add(self, cart_id, product_id, variation_id, quantity, limit=None):
+        with self._lock:
+            cart = self._carts.setdefault(cart_id, {'updated_at': None, 'items': OrderedDict()})
+            cart['updated_at'] = datetime.utcnow()
+            for line in cart['items'].values():
+                if line[0] == product_id and line[1] == variation_id:
+                    line[2] = line[2] + quantity if limit is None else min(line[2] + quantity, limit)
+                    return
+            quantity = quantity if limit is None else min(quantity, limit)
+            if quantity > 0:
+                cart['items'][next(self._item_ids)] = [product_id, variation_id, quantity]
+
+    def set_quantity(self, cart_id, item_id, quantity):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None or item_id not in cart['items']:
+                return False
+            if quantity <= 0:
+                del cart['items'][item_id]
+            else:
+                cart['items'][item_id][2] = quantity
+            cart['updated_at'] = datetime.utcnow()
+            return True
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def purge(self, before):
+        with self._lock:
+            stale = [cart_id for cart_id, cart in self._carts.items() if cart['updated_at'] < before]
+            for cart_id in stale:
+                del self._carts[cart_id]
+            return len(stale)
+
+
+BACKENDS = {
+    DatabaseCartStore.name: DatabaseCartStore,
+    MemoryCartStore.name: MemoryCartStore,
+}
+
+
+def get_cart_store():
+    return current_app.extensions['cart_store']
+
+
+def guest_cart_id(create=False):
+    """The guest's cart id from the cookie; with ``create``, start a cart when there is none"""
+    if 'guest_cart_id' not in g:
+        cart_id = request.cookies.get(current_app.config.get('CART_COOKIE_NAME', 'cart_id'))
+        g.guest_cart_id = cart_id if cart_id and get_cart_store().exists(cart_id) else None
+    if g.guest_cart_id is None and create:
+        g.guest_cart_id = g.cart_cookie = get_cart_store().create()
+    return g.guest_cart_id
+
+
+def has_guest_cart():
+    """Whether this visitor has a guest cart (the cookie is not checked against the store)"""
+    return bool(g.get('guest_cart_id')
+                or request.cookies.get(current_app.config.get('CART_COOKIE_NAME', 'cart_id')))
+
+
+def guest_cart_quantity():
+    """Total quantity in the guest's cart; no query without a cart cookie"""
+    cart_id = guest_cart_id()
+    return get_cart_store().quantity(cart_id) if cart_id else 0
+
+
+def forget_guest_cart():
+    """Drop the cart id cookie with this response"""
+    g.guest_cart_id = None
+    g.cart_cookie = ''
+
+
+def merge_guest_cart(user):
+    """Move the guest cart into ``user``'s ShoppingCart rows; returns the number of lines merged"""
+    cart_id = guest_cart_id()
+    if not cart_id:
+        return 0
+    store = get_cart_store()
+    items = store.items(cart_id)
+    if items:
+        wanted = {}
+        for _, product_id, variation_id, quantity in items:
+            key = (product_id, variation_id)
+            wanted[key] = wanted.get(key, 0) + quantity
+        products = {product.id: product for product in
+                    Product.query.filter(Product.id.in_({product_id for product_id, _ in wanted}))}
+        variation_ids = {variation_id for _, variation_id in wanted if variation_id}
+        variations = {variation.id: variation for variation in
+                      ProductVariation.query.filter(ProductVariation.id.in_(variation_ids))} if variation_ids else {}
+
+        connection = db.session.connection()
+        table = ShoppingCart.__table__
+        now = datetime.utcnow()
+        for (product_id, variation_id), quantity in wanted.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            limit = cart_quantity_limit(product, variations.get(variation_id))
+            quantity = quantity if limit is None else min(quantity, limit)
+            if quantity <= 0:
+                continue
+            if variation_id is None:
+                # NULLs never collide in unique_user_product_variation, so find the line by hand
+                result = connection.execute(
+                    update(table)
+                    .where(table.c.user_id == user.id, table.c.product_id == product_id,
+                           table.c.variation_id.is_(None))
+                    .values(quantity=_capped(table.c.quantity + quantity, limit), updated_at=now)
+                )
+                if result.rowcount:
+                    continue
+            _upsert_line(connection, table,
+                         {'user_id': user.id, 'product_id': product_id, 'variation_id': variation_id,
+                          'quantity': quantity, 'created_at': now, 'updated_at': now},
+                         ('user_id', 'product_id', 'variation_id'), limit)
+
+        # Core statements skip the ShoppingCart counter listeners; capped adds make the delta unknown, so recount
+        connection.execute(
+            update(User.__table__).where(User.id == user.id)
+            .values(cart_quantity=select(func.coalesce(func.sum(ShoppingCart.quantity), 0))
+                    .where(ShoppingCart.user_id == user.id).scalar_subquery(),
+                    updated_at=User.updated_at)
+        )
+        db.session.commit()
+        db.session.expire(user, ['cart_quantity'])
+    store.clear(cart_id)
+    forget_guest_cart()
+    return len(items)
+
+
+def _set_cart_cookie(response):
+    cart_cookie = g.get('cart_cookie')
+    if cart_cookie is None:
+        return response
+    config = current_app.config
+    name = config.get('CART_COOKIE_NAME', 'cart_id')
+    if cart_cookie:
+        response.set_cookie(name, cart_cookie, max_age=int(timedelta(days=config.get('CART_TTL_DAYS', 30))
+                                                           .total_seconds()),
+                            secure=config.get('SESSION_COOKIE_SECURE', False), httponly=True, samesite='Lax')
+    else:
+        response.delete_cookie(name)
+    return response
+
+
+def _adopt_session_cart():
+    """Move a cart left in the session cookie by earlier releases into the store"""
+    if 'cart' not in session:
+        return
+    legacy = session.pop('cart') or []
+    if legacy:
+        store = get_cart_store()
+        cart_id = guest_cart_id(create=True)
+        for item in legacy:
+            store.add(cart_id, item['product_id'], item.get('variation_id'), item.get('quantity', 1))
+
+
+def init_cart_store(app):
+    """Attach the configured CartStore to ``app`` and manage its cookie"""
+    backend = app.config.get('CART_STORE_BACKEND', 'database')
+    store = BACKENDS[backend]()
+    app.extensions['cart_store'] = store
+    app.before_request(_adopt_session_cart)
+    app.after_request(_set_cart_cookie)
+    return store
@@ -0,0 +1,143 @@
+# services/catalog_api.py
+"""Field registry for the read-only catalog API (routes/api_routes.py).
+
+Each public field names the columns it needs and how to read it from a
+result row, so ``?fields=name,price`` selects exactly those columns (plus
+the id and sort key pagination needs) instead of whole ORM objects.  Tags
+and attributes come from one IN query per page when asked for.
+
+Rows are serialized as-is: prices stay Decimal and go out as exact decimal
+strings through Flask's JSON provider, never through float().
+"""
+from collections import namedtuple
+from operator import attrgetter
+
+from flask import current_app, url_for
+
+from extension import db
+from models.category import Category
+from models.product import Product
+from services.product_counts import get_product_counts
+
+ApiField = namedtuple('ApiField', 'columns getter')
+
+IN_STOCK_STATUSES = ('in_stock', 'low_stock', 'on_backorder')
+
+
+class InvalidFields(ValueError):
+    """Raised for ?fields= names that don't exist"""
+
+
+def _column(column):
+    return ApiField((column,), attrgetter(column.key))
+
+
+def _timestamp(column):
+    return ApiField((column,), lambda row: getattr(row, column.key).isoformat() if getattr(row, column.key) else None)
+
+
+PRODUCT_FIELDS = {
+    'id': _column(Product.id),
+    'sku': _column(Product.sku),
+    'name': _column(Product.name),
+    'slug': _column(Product.slug),
+    'short_description': _column(Product.short_description),
+    'description': _column(Product.description),
+    'price': ApiField((Product.base_price,), attrgetter('base_price')),
+    'compare_price': _column(Product.compare_price),
+    'currency': ApiField((), lambda row: current_app.config.get('CURRENCY', 'INR')),
+    'gst_rate': _column(Product.gst_rate),
+    'is_gst_inclusive': _column(Product.is_gst_inclusive),
+    'stock_status': _column(Product.stock_status),
+    'stock_quantity': _column(Product.stock_quantity),
+    'is_in_stock': ApiField((Product.track_inventory, Product.stock_status),
+                            lambda row: not row.track_inventory or row.stock_status in IN_STOCK_STATUSES),
+    'main_image_url': _column(Product.main_image_url),
+    'image_gallery': ApiField((Product.image_gallery,), lambda row: row.image_gallery or []),
+    'is_featured': _column(Product.is_featured),
+    'is_on_sale': _column(Product.is_on_sale),
+    'average_rating': ApiField((Product.rating_sum, Product.rating_count),
+                               lambda row: round(row.rating_sum / row.rating_count, 1) if row.rating_count else 0),
+    'review_count': ApiField((Product.rating_count,), lambda row: row.rating_count or 0),
+    'category_id': _column(Product.category_id),
+    'brand_id': _column(Product.brand_id),
+    'created_at': _timestamp(Product.created_at),
+    'updated_at': _timestamp(Product.updated_at),
+    'url': ApiField((Product.slug,), lambda row: url_for('shop.product_detail', slug=row.slug, _external=True)),
+}
+
+# Loaded per page with one IN query each, not selected as columns
+PRODUCT_RELATIONS = {
+    'tags': Product.load_tags,
+    'attributes': Product.load_attributes,
+}
+
+DEFAULT_PRODUCT_LIST_FIELDS = ['id', 'name', 'slug', 'price', 'compare_price', 'currency', 'main_image_url',
+                               'stock_status', 'is_in_stock', 'average_rating', 'review_count', 'url']
+
+CATEGORY_FIELDS = {
+    'id': _column(Category.id),
+    'name': _column(Category.name),
+    'name_hindi': _column(Category.name_hindi),
+    'slug': _column(Category.slug),
+    'description': _column(Category.description),
+    'image_url': _column(Category.image_url),
+    'parent_id': _column(Category.parent_id),
+    'path': _column(Category.path),
+    'depth': _column(Category.depth),
+    'sort_order': _column(Category.sort_order),
+    'product_count': ApiField((Category.id,),
+                              lambda row: get_product_counts().category(row.id, include_subcategories=True)),
+    'url': ApiField((Category.slug,), lambda row: url_for('shop.category', slug=row.slug, _external=True)),
+}
+
+DEFAULT_CATEGORY_FIELDS = ['id', 'name', 'slug', 'parent_id', 'depth', 'image_url', 'product_count', 'url']
+
+
+def parse_fields(value, registry, defaults, relations=()):
+    """Requested field names from a ``fields=a,b`` string, in order"""
+    if not value:
+        return list(defaults)
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in registry and name not in relations]
+    if unknown:
+        raise InvalidFields(f"Unknown field(s): {', '.join(unknown)}")
+    return names
+
+
+def select_columns(names, registry, required=()):
+    """Distinct columns backing ``names`` plus ``required`` (id, sort key), for query(*columns)"""
+    columns = {}
+    for column in required:
+        columns.setdefault(column.key, column)
+    for name in names:
+        for column in registry[name].columns if name in registry else ():
+            columns.setdefault(column.key, column)
+    return list(columns.values())
+
+
+def serialize_rows(rows, names, registry, relations=None):
+    """[{field: value}] for result rows; relation fields cost one query each for the whole page"""
+    relations = relations or {}
+    loaded = {name: loader([row.id for row in rows]) for name, loader in relations.items() if name in names}
+    empty = {'tags': [], 'attributes': {}}
+    items = []
+    for row in rows:
+        item = {}
+        for name in names:
+            if name in loaded:
+                item[name] = loaded[name].get(row.id, empty.get(name))
+            else:
+                item[name] = registry[name].getter(row)
+        items.append(item)
+    return items
+
+
+def product_query(names, sort_column=None):
+    """Column query over Product for the requested fields"""
+    required = [Product.id] + ([sort_column] if sort_column is not None else [])
+    return db.session.query(*select_columns(names, PRODUCT_FIELDS, required))
+
+
+def category_query(names):
+    return db.session.query(*select_columns(names, CATEGORY_FIELDS, [Category.id]))
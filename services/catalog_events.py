@@ -0,0 +1,141 @@
+# services/catalog_events.py
+"""Commit hooks for catalog caches and indexes.
+
+Every flush records which catalog rows were created, changed or deleted.
+Once the transaction commits, subscribers get one CatalogChanges object
+describing the whole transaction; after a rollback nothing is published.
+
+Subscribers run after the commit, when the session can no longer emit SQL,
+so they should only mark their caches stale and reload on the next read.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Models whose changes are published, by class name
+TRACKED_MODELS = {'Product', 'ProductTag', 'ProductAttribute', 'ProductAttributeValue', 'Category', 'Brand',
+                  'Review', 'ProductVariation', 'VariationAttribute'}
+
+# Parent id recorded for child rows, by class name: changes.owner_ids('ProductVariation') are product ids
+OWNER_ATTRIBUTES = {'ProductVariation': 'product_id', 'VariationAttribute': 'variation_id'}
+
+_subscribers = []
+
+
+class CatalogChanges:
+    """Ids and changed column names per model for one committed transaction"""
+
+    def __init__(self):
+        self.ids = {}
+        self.fields = {}
+        self.created = {}
+        self.deleted = {}
+        self.owners = {}
+
+    def record(self, name, obj_id, fields=(), created=False, deleted=False, owner_id=None):
+        self.ids.setdefault(name, set()).add(obj_id)
+        self.fields.setdefault(name, set()).update(fields)
+        if owner_id is not None:
+            self.owners.setdefault(name, set()).add(owner_id)
+        if created:
+            self.created.setdefault(name, set()).add(obj_id)
+        if deleted:
+            self.deleted.setdefault(name, set()).add(obj_id)
+
+    def touched(self, name):
+        """Ids of ``name`` rows created, updated or deleted"""
+        return self.ids.get(name, set())
+
+    def created_ids(self, name):
+        return self.created.get(name, set())
+
+    def deleted_ids(self, name):
+        return self.deleted.get(name, set())
+
+    def owner_ids(self, name):
+        """Parent ids (see OWNER_ATTRIBUTES) of the ``name`` rows that changed"""
+        return self.owners.get(name, set())
+
+    def changed_fields(self, name):
+        """Attribute names changed on any ``name`` row (new/deleted rows count as all fields)"""
+        return self.fields.get(name, set())
+
+    def __bool__(self):
+        return bool(self.ids)
+
+
+def subscribe(callback):
+    """Register ``callback(changes)`` to run after each catalog commit"""
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+    return callback
+
+
+def record_bulk(session, name, ids, fields=(), created=False):
+    """Record rows written by bulk INSERT/UPDATE statements, which never pass through a flush"""
+    if not ids:
+        return
+    changes = session.info.setdefault('catalog_changes', CatalogChanges())
+    for obj_id in ids:
+        changes.record(name, obj_id, fields, created=created)
+
+
+def _changed_attributes(obj):
+    state = inspect(obj)
+    changed = set()
+    for attr in state.mapper.column_attrs:
+        if state.attrs[attr.key].history.has_changes():
+            changed.add(attr.key)
+    for rel in state.mapper.relationships:
+        try:
+            if state.attrs[rel.key].history.has_changes():
+                changed.add(rel.key)
+        except Exception:
+            # Dynamic relationships can't always report history
+            continue
+    return changed
+
+
+def _all_attributes(obj):
+    return {attr.key for attr in inspect(obj).mapper.column_attrs}
+
+
+def _owner_id(name, obj):
+    attribute = OWNER_ATTRIBUTES.get(name)
+    return getattr(obj, attribute, None) if attribute else None
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    changes = session.info.get('catalog_changes')
+    for obj in session.new:
+        name = type(obj).__name__
+        if name in TRACKED_MODELS:
+            changes = changes or session.info.setdefault('catalog_changes', CatalogChanges())
+            changes.record(name, obj.id, _all_attributes(obj), created=True, owner_id=_owner_id(name, obj))
+    for obj in session.dirty:
+        name = type(obj).__name__
+        if name in TRACKED_MODELS and session.is_modified(obj):
+            changes = changes or session.info.setdefault('catalog_changes', CatalogChanges())
+            changes.record(name, obj.id, _changed_attributes(obj), owner_id=_owner_id(name, obj))
+    for obj in session.deleted:
+        name = type(obj).__name__
+        if name in TRACKED_MODELS:
+            changes = changes or session.info.setdefault('catalog_changes', CatalogChanges())
+            changes.record(name, obj.id, _all_attributes(obj), deleted=True, owner_id=_owner_id(name, obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_commit(session):
+    changes = session.info.pop('catalog_changes', None)
+    if not changes:
+        return
+    for callback in list(_subscribers):
+        try:
+            callback(changes)
+        except Exception as e:
+            print(f"Error in catalog change subscriber {callback.__name__}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rollback(session):
+    session.info.pop('catalog_changes', None)
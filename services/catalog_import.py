@@ -0,0 +1,525 @@
+# services/catalog_import.py
+"""Bulk product import from CSV or JSON Lines files (optionally gzipped).
+
+The admin upload is saved under IMPORT_FOLDER and an ImportJob row is
+queued on a per-process worker thread, so the request returns at once and
+the page polls the job for progress.  The worker streams the file from disk
+and handles IMPORT_CHUNK_SIZE rows per transaction:
+
+- every row is parsed and validated; rejected rows go to a CSV error report
+  (row number, sku, reason) and never stop the import
+- category and brand slugs resolve against maps loaded once per file
+- one IN query per chunk finds the SKUs that already exist, one more checks
+  slugs, then new products go in with a single bulk INSERT and existing
+  ones get one bulk UPDATE by primary key
+- opening stock (and stock changed by the file) is written to
+  stock_movements in bulk, referencing the job
+
+Blank cells leave an existing product's column unchanged, and the ' that
+CSV exports put in front of formula-like text (= + - @) is removed again.
+Bulk statements bypass the ORM flush, so each chunk records its product ids
+with catalog_events itself and search, suggestions and listing caches
+refresh as usual after the commit.
+
+From the shell: flask import-catalog products.csv
+"""
+import csv
+import gzip
+import json
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from extension import db
+from models.brand import Brand
+from models.category import Category
+from models.import_job import ImportJob
+from models.product import Product
+from models.stock import StockMovement
+from services import catalog_events
+
+# Accepted file extensions and the format they are read as
+IMPORT_FORMATS = {
+    'csv': 'csv', 'csv.gz': 'csv',
+    'jsonl': 'jsonl', 'jsonl.gz': 'jsonl', 'ndjson': 'jsonl', 'ndjson.gz': 'jsonl',
+}
+
+PRODUCT_STATUSES = ('active', 'draft', 'inactive')
+
+INVENTORY_FIELDS = ('stock_quantity', 'low_stock_threshold', 'track_inventory', 'allow_backorders')
+
+
+class RowError(ValueError):
+    """A row that can't be imported; the message goes into the error report"""
+
+
+def slugify(value):
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-')[:255]
+
+
+def _text(max_length=None):
+    def parse(value):
+        value = str(value).strip()
+        if max_length and len(value) > max_length:
+            raise RowError(f'longer than {max_length} characters')
+        return value
+    return parse
+
+
+def _decimal(maximum):
+    def parse(value):
+        try:
+            number = Decimal(str(value).strip().replace(',', ''))
+        except InvalidOperation:
+            raise RowError('not a number')
+        if not number.is_finite() or number < 0 or number > maximum:
+            raise RowError(f'must be between 0 and {maximum}')
+        return number.quantize(Decimal('0.01'))
+    return parse
+
+
+def _integer(value):
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise RowError('not a whole number')
+    if number < 0:
+        raise RowError('must be zero or more')
+    return number
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'y'):
+        return True
+    if text in ('0', 'false', 'no', 'n'):
+        return False
+    raise RowError('expected yes/no')
+
+
+def _slug(value):
+    slug = slugify(value)
+    if not slug:
+        raise RowError('not a valid slug')
+    return slug
+
+
+def _status(value):
+    status = str(value).strip().lower()
+    if status not in PRODUCT_STATUSES:
+        raise RowError(f"must be one of {', '.join(PRODUCT_STATUSES)}")
+    return status
+
+
+# Importable columns and their parsers; category and brand are given as slugs
+FIELDS = {
+    'name': _text(255),
+    'slug': _slug,
+    'short_description': _text(),
+    'description': _text(),
+    'base_price': _decimal(Decimal('9999999999.99')),
+    'compare_price': _decimal(Decimal('9999999999.99')),
+    'cost_price': _decimal(Decimal('9999999999.99')),
+    'gst_rate': _decimal(Decimal('100')),
+    'hsn_code': _text(10),
+    'is_gst_inclusive': _boolean,
+    'track_inventory': _boolean,
+    'stock_quantity': _integer,
+    'low_stock_threshold': _integer,
+    'allow_backorders': _boolean,
+    'weight_grams': _decimal(Decimal('999999.99')),
+    'main_image_url': _text(500),
+    'status': _status,
+    'is_featured': _boolean,
+    'is_on_sale': _boolean,
+    'meta_title': _text(255),
+    'meta_description': _text(),
+    'category': _text(100),
+    'brand': _text(100),
+}
+
+REQUIRED_FOR_NEW = ('name', 'base_price', 'category_id')
+
+# Product columns an import can set, in the order new rows list them
+PRODUCT_COLUMNS = [name for name in FIELDS if name not in ('category', 'brand')] + ['category_id', 'brand_id']
+
+
+def _column_default(name):
+    default = Product.__table__.c[name].default
+    return default.arg if default is not None and default.is_scalar else None
+
+
+def detect_format(filename):
+    """'csv' or 'jsonl' for an accepted file name, else None"""
+    name = (filename or '').lower()
+    for extension in sorted(IMPORT_FORMATS, key=len, reverse=True):
+        if name.endswith('.' + extension):
+            return IMPORT_FORMATS[extension]
+    return None
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def _unguard(value):
+    """Undo the CSV export's formula guard, so '-10% pack reads back as -10% pack"""
+    if isinstance(value, str) and value[:1] == "'" and value[1:2] in ('=', '+', '-', '@', '\t', '\r'):
+        return value[1:]
+    return value
+
+
+def read_rows(path, file_format):
+    """Yield (row number, data dict or None, error) for every data row, streaming from disk"""
+    with _open(path) as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None:
+                return
+            reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames]
+            if 'sku' not in reader.fieldnames:
+                raise ValueError('The CSV header has no sku column')
+            for row in reader:
+                yield reader.line_num, {key: _unguard(value) for key, value in row.items()}, None
+        else:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError as e:
+                    yield number, None, f'invalid JSON: {e}'
+                    continue
+                if not isinstance(data, dict):
+                    yield number, None, 'expected a JSON object'
+                    continue
+                yield number, {str(key).lower(): value for key, value in data.items()}, None
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_folder(app=None):
+    app = app or current_app
+    return app.config.get('IMPORT_FOLDER') or os.path.join(app.instance_path, 'imports')
+
+
+class CatalogImport:
+    """Validates and upserts one job's file chunk by chunk"""
+
+    def __init__(self, job, chunk_size=1000):
+        self.job = job
+        self.chunk_size = chunk_size
+        # One lookup each for the whole file
+        self.categories = dict(db.session.query(Category.slug, Category.id))
+        self.brands = dict(db.session.query(Brand.slug, Brand.id))
+        self.seen_skus = {}
+        self.rejected = []
+        self._report = None
+        self._report_writer = None
+
+    def run(self):
+        try:
+            for chunk in _chunks(read_rows(self.job.file_path, self.job.file_format), self.chunk_size):
+                self.import_chunk(chunk)
+        finally:
+            if self._report is not None:
+                self._report.close()
+
+    def reject(self, number, sku, message):
+        self.rejected.append((number, sku, message))
+
+    def _write_report(self):
+        """Append this chunk's rejected rows to the job's error report"""
+        if not self.rejected:
+            return
+        if self._report is None:
+            folder = import_folder()
+            os.makedirs(folder, exist_ok=True)
+            self.job.report_path = os.path.join(folder, f'{self.job.id}-errors.csv')
+            self._report = open(self.job.report_path, 'w', newline='', encoding='utf-8')
+            self._report_writer = csv.writer(self._report)
+            self._report_writer.writerow(['row', 'sku', 'error'])
+        self._report_writer.writerows(self.rejected)
+        self._report.flush()
+        self.job.error_count += len(self.rejected)
+        self.rejected = []
+
+    def validate(self, data):
+        """(sku, {column: value}) for one row, or RowError listing every problem"""
+        sku = str(data.get('sku') or '').strip()
+        if not sku:
+            raise RowError('sku is required')
+        if len(sku) > 100:
+            raise RowError('sku is longer than 100 characters')
+
+        values = {}
+        problems = []
+        for name, parse in FIELDS.items():
+            raw = data.get(name)
+            if raw is None or (isinstance(raw, str) and not raw.strip()):
+                continue
+            try:
+                values[name] = parse(raw)
+            except RowError as e:
+                problems.append(f'{name} {e}')
+
+        if 'category' in values:
+            slug = values.pop('category')
+            values['category_id'] = self.categories.get(slug)
+            if values['category_id'] is None:
+                problems.append(f'unknown category {slug}')
+        if 'brand' in values:
+            slug = values.pop('brand')
+            values['brand_id'] = self.brands.get(slug)
+            if values['brand_id'] is None:
+                problems.append(f'unknown brand {slug}')
+        if problems:
+            raise RowError('; '.join(problems))
+        return sku, values
+
+    def import_chunk(self, rows):
+        job = self.job
+        candidates = {}
+        for number, data, error in rows:
+            sku = str((data or {}).get('sku') or '').strip()
+            try:
+                if error:
+                    raise RowError(error)
+                sku, values = self.validate(data)
+                if sku in self.seen_skus:
+                    raise RowError(f'duplicate sku, first seen on row {self.seen_skus[sku]}')
+            except RowError as e:
+                self.reject(number, sku, str(e))
+                continue
+            self.seen_skus[sku] = number
+            candidates[sku] = (number, values)
+
+        existing = {}
+        if candidates:
+            existing = {row.sku: row for row in db.session.query(
+                Product.id, Product.sku, Product.stock_quantity, Product.low_stock_threshold,
+                Product.track_inventory, Product.allow_backorders
+            ).filter(Product.sku.in_(list(candidates)))}
+        slugs = self._assign_slugs(candidates, existing)
+
+        now = datetime.utcnow()
+        inserts, updates, stock_changes, written = [], [], [], []
+        for sku, (number, values) in candidates.items():
+            current = existing.get(sku)
+            if current is None:
+                missing = [name.replace('_id', '') for name in REQUIRED_FOR_NEW if name not in values]
+                if missing:
+                    self.reject(number, sku, f"new products need {', '.join(missing)}")
+                    continue
+                row = {name: _column_default(name) for name in PRODUCT_COLUMNS}
+                row.update(values, sku=sku, slug=slugs[sku], created_at=now, updated_at=now)
+                row['stock_status'] = Product.stock_status_for(
+                    row['stock_quantity'], row['low_stock_threshold'], row['track_inventory'], row['allow_backorders'])
+                inserts.append(row)
+                written.append((number, sku))
+                if row['stock_quantity']:
+                    stock_changes.append((sku, 'purchase', 0, row['stock_quantity']))
+            else:
+                row = dict(values, id=current.id, updated_at=now)
+                if sku in slugs:
+                    row['slug'] = slugs[sku]
+                if any(name in values for name in INVENTORY_FIELDS):
+                    merged = {name: values.get(name, getattr(current, name)) for name in INVENTORY_FIELDS}
+                    row['stock_status'] = Product.stock_status_for(
+                        merged['stock_quantity'] or 0, merged['low_stock_threshold'] or 0,
+                        merged['track_inventory'], merged['allow_backorders'])
+                    if merged['stock_quantity'] != current.stock_quantity:
+                        stock_changes.append((sku, 'adjustment', current.stock_quantity or 0,
+                                              merged['stock_quantity']))
+                updates.append(row)
+                written.append((number, sku))
+
+        try:
+            self._write_chunk(inserts, updates, stock_changes, now)
+            job.created_count += len(inserts)
+            job.updated_count += len(updates)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Error importing rows {rows[0][0]}-{rows[-1][0]} of {job.filename}: {e}")
+            reason = f'not saved: {getattr(e, "orig", None) or e}'[:500]
+            for number, sku in written:
+                self.reject(number, sku, reason)
+
+        job.processed_rows += len(rows)
+        self._write_report()
+        db.session.commit()
+
+    def _assign_slugs(self, candidates, existing):
+        """Slug per SKU for new products and explicit slug changes, avoiding every slug already taken"""
+        wanted = {}
+        for sku, (number, values) in candidates.items():
+            if 'slug' in values:
+                wanted[sku] = (values['slug'], True)
+            elif sku not in existing and 'name' in values:
+                wanted[sku] = (slugify(values['name']) or slugify(sku), False)
+        if not wanted:
+            return {}
+
+        options = {sku: [slug] if explicit else [slug, f'{slug}-{slugify(sku)}'[:255]]
+                   for sku, (slug, explicit) in wanted.items()}
+        lookups = {slug for choices in options.values() for slug in choices}
+        taken = dict(db.session.query(Product.slug, Product.sku).filter(Product.slug.in_(lookups)))
+
+        slugs = {}
+        for sku, choices in options.items():
+            for slug in choices:
+                owner = taken.get(slug)
+                if owner is None or owner == sku:
+                    taken[slug] = sku
+                    slugs[sku] = slug
+                    break
+            else:
+                number = candidates.pop(sku)[0]
+                self.reject(number, sku, f'slug {choices[0]} is already used by {taken[choices[0]]}')
+        return slugs
+
+    def _write_chunk(self, inserts, updates, stock_changes, now):
+        job = self.job
+        if inserts:
+            db.session.execute(insert(Product), inserts)
+        if updates:
+            db.session.execute(update(Product), updates)
+
+        # Bulk INSERT doesn't return ids on every backend; one lookup covers new and updated rows
+        skus = [row['sku'] for row in inserts] + [sku for sku, *_ in stock_changes]
+        ids = dict(db.session.query(Product.sku, Product.id).filter(Product.sku.in_(skus))) if skus else {}
+
+        if stock_changes:
+            db.session.execute(insert(StockMovement), [{
+                'product_id': ids[sku],
+                'movement_type': movement_type,
+                'quantity': after - before,
+                'stock_before': before,
+                'stock_after': after,
+                'reference_type': 'import',
+                'reference_id': job.id,
+                'reason': f'Opening stock (import #{job.id})' if movement_type == 'purchase'
+                else f'Stock set by import #{job.id}',
+                'performed_by': job.created_by,
+                'performed_at': now
+            } for sku, movement_type, before, after in stock_changes])
+
+        catalog_events.record_bulk(db.session, 'Product', [ids[row['sku']] for row in inserts],
+                                   [column.key for column in Product.__table__.columns], created=True)
+        for row in updates:
+            catalog_events.record_bulk(db.session, 'Product', [row['id']], set(row) - {'id'})
+
+
+def create_import_job(filename, path, created_by=None):
+    """Queue ``path`` (already on disk) as an import job; raises ValueError for unsupported files"""
+    file_format = detect_format(filename)
+    if file_format is None:
+        raise ValueError('Upload a .csv or .jsonl file (optionally .gz compressed)')
+    job = ImportJob(filename=filename[:255], file_path=path, file_format=file_format, status='queued',
+                    created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def save_import_upload(file_storage, created_by=None):
+    """Store an uploaded import file under IMPORT_FOLDER and queue a job for it"""
+    filename = file_storage.filename or ''
+    file_format = detect_format(filename)
+    if file_format is None:
+        raise ValueError('Upload a .csv or .jsonl file (optionally .gz compressed)')
+    folder = import_folder()
+    os.makedirs(folder, exist_ok=True)
+    suffix = '.gz' if filename.lower().endswith('.gz') else ''
+    path = os.path.join(folder, f'{uuid.uuid4().hex}.{file_format}{suffix}')
+    file_storage.save(path)
+    return create_import_job(filename, path, created_by)
+
+
+def run_import(job_id):
+    """Run a queued job now, in this thread; returns the finished job"""
+    job = db.session.get(ImportJob, job_id)
+    if job is None or job.status != 'queued':
+        return job
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    try:
+        # A quick counting pass so progress has a denominator
+        job.total_rows = sum(1 for _ in read_rows(job.file_path, job.file_format))
+        db.session.commit()
+        CatalogImport(job, chunk_size=current_app.config.get('IMPORT_CHUNK_SIZE', 1000)).run()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error running catalog import {job_id}: {e}")
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'failed'
+        job.message = str(e)[:1000]
+    else:
+        job.status = 'completed'
+        job.message = (f'{job.created_count} created, {job.updated_count} updated, '
+                       f'{job.error_count} rejected')
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+class ImportRunner:
+    """Per-process worker that runs import jobs one at a time, outside the request"""
+
+    def __init__(self, app):
+        self.app = app
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Pools don't survive fork; each worker process starts its own
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-import')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, job_id):
+        return self._get_executor().submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            return run_import(job_id)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+
+
+def get_import_runner():
+    return current_app.extensions['catalog_import']
+
+
+def init_catalog_import(app):
+    """Attach the background import worker to ``app``"""
+    runner = ImportRunner(app)
+    app.extensions['catalog_import'] = runner
+    return runner
@@ -0,0 +1,91 @@
+# services/category_tree.py
+"""In-memory category tree for subtree listings.
+
+The whole tree is one small query, cached until a commit touches a category.
+Listings turn a category into the ids of its active subtree here and filter
+products with a single ``category_id IN (...)`` predicate on the indexed
+column, instead of walking ``children`` level by level.
+"""
+from collections import namedtuple
+
+from flask import current_app
+
+from extension import db
+from models.category import Category
+from services import catalog_events
+from services.cache import VersionedCache
+
+CategoryNode = namedtuple('CategoryNode', 'id parent_id name slug path depth sort_order is_active')
+
+
+class CategoryTree:
+    """Parent/child lookups over every category"""
+
+    def __init__(self, nodes):
+        self.nodes = {node.id: node for node in nodes}
+        self.slugs = {node.slug: node.id for node in nodes}
+        self._children = {}
+        for node in sorted(nodes, key=lambda n: (n.sort_order or 0, n.name, n.id)):
+            self._children.setdefault(node.parent_id, []).append(node.id)
+
+    @classmethod
+    def load(cls):
+        rows = db.session.query(Category.id, Category.parent_id, Category.name, Category.slug, Category.path,
+                                Category.depth, Category.sort_order, Category.is_active)
+        return cls([CategoryNode(*row) for row in rows])
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def by_slug(self, slug):
+        return self.nodes.get(self.slugs.get(slug))
+
+    def roots(self, active_only=True):
+        return self.children(None, active_only)
+
+    def children(self, category_id, active_only=True):
+        nodes = (self.nodes[child_id] for child_id in self._children.get(category_id, ()))
+        return [node for node in nodes if node.is_active or not active_only]
+
+    def descendants(self, category_id, include_self=True, active_only=True):
+        """Ids of the subtree under ``category_id``; inactive categories hide their whole branch"""
+        ids = [category_id] if include_self else []
+        stack = list(reversed(self._children.get(category_id, ())))
+        while stack:
+            node = self.nodes[stack.pop()]
+            if active_only and not node.is_active:
+                continue
+            ids.append(node.id)
+            stack.extend(reversed(self._children.get(node.id, ())))
+        return ids
+
+    def ancestors(self, category_id):
+        """Nodes from the root down to the parent of ``category_id``"""
+        chain = []
+        node = self.nodes.get(category_id)
+        while node is not None and node.parent_id is not None and len(chain) < len(self.nodes):
+            node = self.nodes.get(node.parent_id)
+            if node is not None:
+                chain.append(node)
+        return list(reversed(chain))
+
+    def subtree_filter(self, column, category_id):
+        """SQL predicate matching ``column`` against the subtree of ``category_id``"""
+        return column.in_(self.descendants(category_id))
+
+
+def get_category_tree():
+    return current_app.extensions['category_tree_cache'].get_or_set('tree', CategoryTree.load)
+
+
+def init_category_tree(app):
+    """Attach the tree cache to ``app`` and drop it when categories change"""
+    cache = VersionedCache(maxsize=1, ttl=app.config.get('CATEGORY_TREE_TTL', 300))
+    app.extensions['category_tree_cache'] = cache
+
+    def invalidate_category_tree(changes):
+        if changes.touched('Category'):
+            cache.invalidate()
+
+    catalog_events.subscribe(invalidate_category_tree)
+    return cache
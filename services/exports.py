@@ -0,0 +1,209 @@
+# services/exports.py
+"""Streamed CSV / JSON Lines exports for the admin product, order and stock pages.
+
+Each export is a column select (never ORM objects, so the identity map stays
+empty) executed with ``yield_per``: MySQL and PostgreSQL read it through a
+server-side cursor EXPORT_BATCH_SIZE rows at a time, and the rows are
+encoded into the response body as they arrive.  Memory stays flat however
+many rows match, and the download starts before the query has finished.
+
+Product exports use the column names flask import-catalog reads, so an
+edited export can be imported back.  CSV cells starting with = + - @ are
+written with a leading ' so spreadsheets don't run them as formulas; the
+importer removes it, so SKUs and names like "-10% pack" survive the trip.
+"""
+import csv
+import io
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from extension import db
+from models.brand import Brand
+from models.category import Category
+from models.order import Order, OrderItem
+from models.product import Product
+from models.stock import StockMovement
+from models.user import User
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# ``group`` lets a request leave out a set of columns (?exclude=customer)
+ExportColumn = namedtuple('ExportColumn', 'name expression format group', defaults=(None, None))
+
+
+def _address_field(key):
+    return lambda address: (address or {}).get(key)
+
+
+PRODUCT_COLUMNS = [
+    ExportColumn('sku', Product.sku),
+    ExportColumn('name', Product.name),
+    ExportColumn('slug', Product.slug),
+    ExportColumn('status', Product.status),
+    ExportColumn('category', Category.slug.label('category')),
+    ExportColumn('brand', Brand.slug.label('brand')),
+    ExportColumn('base_price', Product.base_price),
+    ExportColumn('compare_price', Product.compare_price),
+    ExportColumn('cost_price', Product.cost_price),
+    ExportColumn('gst_rate', Product.gst_rate),
+    ExportColumn('hsn_code', Product.hsn_code),
+    ExportColumn('is_gst_inclusive', Product.is_gst_inclusive),
+    ExportColumn('track_inventory', Product.track_inventory),
+    ExportColumn('stock_quantity', Product.stock_quantity),
+    ExportColumn('low_stock_threshold', Product.low_stock_threshold),
+    ExportColumn('allow_backorders', Product.allow_backorders),
+    ExportColumn('stock_status', Product.stock_status),
+    ExportColumn('weight_grams', Product.weight_grams),
+    ExportColumn('is_featured', Product.is_featured),
+    ExportColumn('is_on_sale', Product.is_on_sale),
+    ExportColumn('main_image_url', Product.main_image_url),
+    ExportColumn('total_sold', Product.total_sold),
+    ExportColumn('created_at', Product.created_at),
+    ExportColumn('updated_at', Product.updated_at),
+]
+
+_order_items = select(func.count(OrderItem.id)).where(OrderItem.order_id == Order.id).scalar_subquery()
+_order_quantity = select(func.coalesce(func.sum(OrderItem.quantity), 0)) \
+    .where(OrderItem.order_id == Order.id).scalar_subquery()
+
+ORDER_COLUMNS = [
+    ExportColumn('order_number', Order.order_number),
+    ExportColumn('created_at', Order.created_at),
+    ExportColumn('status', Order.status),
+    ExportColumn('customer_email', User.email, group='customer'),
+    ExportColumn('customer_name', (User.first_name + ' ' + User.last_name).label('customer_name'), group='customer'),
+    ExportColumn('shipping_city', Order.shipping_address.label('shipping_city'), _address_field('city'), 'customer'),
+    ExportColumn('shipping_state', Order.shipping_address.label('shipping_state'), _address_field('state'),
+                 'customer'),
+    ExportColumn('shipping_postal_code', Order.shipping_address.label('shipping_postal_code'),
+                 _address_field('postal_code'), 'customer'),
+    ExportColumn('items', _order_items.label('items'), group='products'),
+    ExportColumn('quantity', _order_quantity.label('quantity'), group='products'),
+    ExportColumn('subtotal', Order.subtotal),
+    ExportColumn('shipping_amount', Order.shipping_amount),
+    ExportColumn('tax_amount', Order.tax_amount),
+    ExportColumn('discount_amount', Order.discount_amount),
+    ExportColumn('total_amount', Order.total_amount),
+    ExportColumn('payment_status', Order.payment_status, group='payment'),
+    ExportColumn('payment_method', Order.payment_method, group='payment'),
+    ExportColumn('transaction_id', Order.transaction_id, group='payment'),
+    ExportColumn('paid_at', Order.paid_at, group='payment'),
+    ExportColumn('shipped_at', Order.shipped_at),
+    ExportColumn('delivered_at', Order.delivered_at),
+    ExportColumn('tracking_number', Order.tracking_number),
+]
+
+_performer = aliased(User)
+
+STOCK_MOVEMENT_COLUMNS = [
+    ExportColumn('performed_at', StockMovement.performed_at),
+    ExportColumn('sku', Product.sku),
+    ExportColumn('product', Product.name.label('product')),
+    ExportColumn('movement_type', StockMovement.movement_type),
+    ExportColumn('quantity', StockMovement.quantity),
+    ExportColumn('stock_before', StockMovement.stock_before),
+    ExportColumn('stock_after', StockMovement.stock_after),
+    ExportColumn('reference_type', StockMovement.reference_type),
+    ExportColumn('reference_id', StockMovement.reference_id),
+    ExportColumn('reason', StockMovement.reason),
+    ExportColumn('performed_by', _performer.email.label('performed_by')),
+]
+
+
+def product_export(*criteria):
+    """Select for the product export, joined to category and brand slugs"""
+    return select(*[column.expression for column in PRODUCT_COLUMNS]) \
+        .outerjoin(Category, Category.id == Product.category_id) \
+        .outerjoin(Brand, Brand.id == Product.brand_id) \
+        .where(*criteria)
+
+
+def order_export(columns):
+    return select(*[column.expression for column in columns]).join(User, User.id == Order.user_id)
+
+
+def stock_movement_export(*criteria):
+    return select(*[column.expression for column in STOCK_MOVEMENT_COLUMNS]) \
+        .join(Product, Product.id == StockMovement.product_id) \
+        .outerjoin(_performer, _performer.id == StockMovement.performed_by) \
+        .where(*criteria)
+
+
+def export_columns(columns, exclude=()):
+    """Columns minus the excluded groups"""
+    return [column for column in columns if column.group is None or column.group not in exclude]
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _csv_cell(value):
+    """CSV text for one value; formula-like text gets a leading ' that import-catalog strips again"""
+    value = _plain(value)
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        # Keep spreadsheets from evaluating text as a formula
+        return "'" + value
+    return value
+
+
+def _rows(statement, columns, batch_size):
+    formatters = [column.format for column in columns]
+    for row in db.session.execute(statement.execution_options(yield_per=batch_size)):
+        yield [fmt(value) if fmt else value for fmt, value in zip(formatters, row)]
+
+
+def _csv_body(rows, columns, flush_every):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in columns])
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_cell(value) for value in row])
+        if count % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _jsonl_body(rows, columns, flush_every):
+    names = [column.name for column in columns]
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, (_plain(value) for value in row))), ensure_ascii=False))
+        if len(lines) >= flush_every:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_response(statement, columns, filename, file_format='csv'):
+    """Streamed download of ``statement``'s rows; ``filename`` gets the format's extension"""
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    rows = _rows(statement, columns, batch_size)
+    if file_format == 'jsonl':
+        body, mimetype = _jsonl_body(rows, columns, batch_size), 'application/x-ndjson'
+    else:
+        body, mimetype = _csv_body(rows, columns, batch_size), 'text/csv'
+
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M')
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}-{stamp}.{file_format}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass chunks straight through
+    response.cache_control.no_store = True
+    return response
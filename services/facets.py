@@ -0,0 +1,192 @@
+# services/facets.py
+"""Facet counts for storefront product listings.
+
+Each facet group - category, brand, price bucket, stock status and each
+attribute - is counted with every active filter applied except its own, so
+picking a brand still shows the other brands' counts to switch or widen to.
+Values of attributes without a selection are counted over the fully
+filtered products.
+
+Every distinct filter set gets its own CTE of active products and all
+groups are counted in a single UNION ALL statement over them.  Counts are
+cached per group, keyed on the filters that group is counted under, so
+e.g. the brand counts are shared by every brand selection, and the cache
+is dropped whenever a product or attribute commits.
+"""
+from flask import current_app
+from sqlalchemy import String, cast, func, literal, select, union_all
+
+from extension import db
+from models.brand import Brand
+from models.category import Category
+from models.product import Product, ProductAttribute, ProductAttributeValue, product_attribute_association
+from services import catalog_events
+from services.cache import VersionedCache
+from services.product_filters import STOCK_STATUSES, get_price_buckets, price_bucket_expression
+
+STOCK_STATUS_LABELS = {
+    'in_stock': 'In Stock',
+    'low_stock': 'Low Stock',
+    'out_of_stock': 'Out of Stock',
+    'on_backorder': 'On Backorder'
+}
+
+# Single-valued facet groups and the CTE column each one counts
+FACET_COLUMNS = {
+    'category': 'category_id',
+    'brand': 'brand_id',
+    'price': 'price_bucket',
+    'stock_status': 'stock_status'
+}
+
+
+def _filtered_cte(filters, name):
+    return filters.apply(Product.query.filter_by(status='active')).with_entities(
+        Product.id.label('id'),
+        Product.category_id.label('category_id'),
+        Product.brand_id.label('brand_id'),
+        price_bucket_expression().label('price_bucket'),
+        Product.stock_status.label('stock_status')
+    ).order_by(None).cte(name)
+
+
+def facet_plan(filters):
+    """[(cache key, facet, filters it is counted under, attribute id)] for ``filters``
+
+    The attribute entry with no attribute id counts every value over the full
+    filters; each selected attribute then gets its own entry without its values.
+    """
+    plan = []
+    for facet in FACET_COLUMNS:
+        narrowed = filters.without(facet)
+        plan.append(((facet, narrowed.signature()), facet, narrowed, None))
+    plan.append((('attribute', None, filters.signature()), 'attribute', filters, None))
+    for attribute_id in sorted(filters.attribute_groups()):
+        narrowed = filters.without('attribute', attribute_id)
+        plan.append((('attribute', attribute_id, narrowed.signature()), 'attribute', narrowed, attribute_id))
+    return plan
+
+
+def count_facet_plan(plan):
+    """[{value: count}] for each ``facet_plan`` entry, in one statement"""
+    ctes = {}
+    branches = []
+    assoc = product_attribute_association.c
+    for position, (key, facet, filters, attribute_id) in enumerate(plan):
+        signature = filters.signature()
+        if signature not in ctes:
+            ctes[signature] = _filtered_cte(filters, f'filtered_products_{len(ctes)}')
+        filtered = ctes[signature]
+        if facet == 'attribute':
+            column = assoc.attribute_value_id
+            from_ = filtered.join(product_attribute_association, assoc.product_id == filtered.c.id)
+            if attribute_id is not None:
+                from_ = from_.join(ProductAttributeValue, ProductAttributeValue.id == column)
+        else:
+            column = filtered.c[FACET_COLUMNS[facet]]
+            from_ = filtered
+        branch = select(
+            literal(position).label('position'),
+            cast(column, String).label('value'),
+            func.count().label('total')
+        ).select_from(from_)
+        if attribute_id is not None:
+            branch = branch.where(ProductAttributeValue.attribute_id == attribute_id)
+        branches.append(branch.group_by(column))
+
+    results = [{} for _ in plan]
+    if branches:
+        for position, value, total in db.session.execute(union_all(*branches)):
+            if value is not None:
+                results[position][value] = total
+    return results
+
+
+def count_facets(filters, cache=None):
+    """Return {facet: {value: count}} for ``filters``, each group counted without its own filter"""
+    plan = facet_plan(filters)
+    version = cache.version if cache is not None else None
+    counted = [cache.get(key) if cache is not None else None for key, *_ in plan]
+    missing = [position for position, value in enumerate(counted) if value is None]
+    if missing:
+        fresh = count_facet_plan([plan[position] for position in missing])
+        for position, value in zip(missing, fresh):
+            counted[position] = value
+            if cache is not None:
+                cache.set(plan[position][0], value, version=version)
+
+    counts = {'category': {}, 'brand': {}, 'price': {}, 'stock_status': {}, 'attribute': {}}
+    # Selected attributes' own counts come after, and override, the fully filtered ones
+    for entry, value in zip(plan, counted):
+        counts[entry[1]].update(value)
+    return counts
+
+
+def _label_facets(counts):
+    """Attach names, slugs and ordering to raw facet counts"""
+    category_ids = [int(v) for v in counts['category']]
+    brand_ids = [int(v) for v in counts['brand']]
+    value_ids = [int(v) for v in counts['attribute']]
+
+    categories = Category.query.filter(Category.id.in_(category_ids)).all() if category_ids else []
+    brands = Brand.query.filter(Brand.id.in_(brand_ids)).all() if brand_ids else []
+
+    facets = {
+        'category': sorted(({
+            'id': c.id, 'slug': c.slug, 'name': c.name, 'count': counts['category'][str(c.id)]
+        } for c in categories), key=lambda item: (-item['count'], item['name'])),
+        'brand': sorted(({
+            'id': b.id, 'slug': b.slug, 'name': b.name, 'count': counts['brand'][str(b.id)]
+        } for b in brands), key=lambda item: (-item['count'], item['name'])),
+        'price': [{
+            'key': key, 'min': lower, 'max': upper, 'count': counts['price'][key]
+        } for key, lower, upper in get_price_buckets() if key in counts['price']],
+        'stock_status': [{
+            'value': status, 'label': STOCK_STATUS_LABELS[status], 'count': counts['stock_status'][status]
+        } for status in STOCK_STATUSES if status in counts['stock_status']],
+        'attributes': []
+    }
+
+    if value_ids:
+        rows = db.session.query(ProductAttributeValue, ProductAttribute) \
+            .join(ProductAttribute, ProductAttribute.id == ProductAttributeValue.attribute_id) \
+            .filter(ProductAttributeValue.id.in_(value_ids), ProductAttribute.is_visible == True) \
+            .order_by(ProductAttribute.sort_order, ProductAttribute.id, ProductAttributeValue.sort_order)
+        attributes = {}
+        for value, attribute in rows:
+            entry = attributes.get(attribute.id)
+            if entry is None:
+                entry = attributes[attribute.id] = {
+                    'id': attribute.id, 'name': attribute.name, 'slug': attribute.slug,
+                    'type': attribute.type, 'values': []
+                }
+                facets['attributes'].append(entry)
+            entry['values'].append({
+                'id': value.id, 'value': value.value, 'color_code': value.color_code,
+                'count': counts['attribute'][str(value.id)]
+            })
+
+    return facets
+
+
+def get_facets(filters):
+    """Facets for ``filters`` applied to active products; counts are cached per facet group"""
+    return _label_facets(count_facets(filters, current_app.extensions['facet_cache']))
+
+
+def init_facets(app):
+    """Attach the facet cache to ``app`` and drop it on catalog commits"""
+    cache = VersionedCache(
+        maxsize=app.config.get('FACET_CACHE_SIZE', 512),
+        ttl=app.config.get('FACET_CACHE_TTL', 300)
+    )
+    app.extensions['facet_cache'] = cache
+
+    def invalidate_facets(changes):
+        if changes.touched('Product') or changes.touched('ProductAttributeValue') \
+                or changes.touched('ProductAttribute') or changes.touched('Category') \
+                or changes.touched('Brand'):
+            cache.invalidate()
+
+    catalog_events.subscribe(invalidate_facets)
+    return cache
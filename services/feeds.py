@@ -0,0 +1,330 @@
+# services/feeds.py
+"""Sitemaps and the marketplace product feed, streamed to gzip files.
+
+Products are read with a server-side cursor (``yield_per``) as plain column
+tuples and written out as they arrive, so memory stays flat however large
+the catalog gets.  Every file is written to a temporary name and renamed
+into place, so readers never see a partial file.
+
+Sitemaps: product URLs are sharded by fixed id ranges of
+SITEMAP_SHARD_SIZE ids (sitemap-products-<n>.xml.gz, at most 50,000 URLs
+each), plus one shard for the home, listing, category and brand pages, and
+a sitemap.xml index.  ``--delta`` rewrites only the shards holding products
+changed since the last run; the index is always rewritten.
+
+Merchant feed: products.xml.gz (RSS 2.0 with the g: namespace) and
+products.tsv.gz.  ``--delta`` writes products-delta.* with only the
+products changed since the last run, including ones that have since been
+deactivated, which are sent as out of stock.
+
+Run times are kept in feed_state.json next to the files.
+"""
+import gzip
+import json
+import os
+import re
+from datetime import datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from flask import current_app, url_for
+from sqlalchemy import func, select
+
+from extension import db
+from models.brand import Brand
+from models.category import Category
+from models.product import Product
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+GOOGLE_NS = 'http://base.google.com/ns/1.0'
+
+# Sitemap protocol limit per file
+MAX_SITEMAP_URLS = 50000
+
+FEED_COLUMNS = ['id', 'title', 'description', 'link', 'image_link', 'availability', 'price_excl_gst',
+                'price', 'sale_price', 'gst_rate', 'brand', 'product_type', 'condition']
+
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def feed_dir(app):
+    return app.config.get('FEED_OUTPUT_DIR') or os.path.join(app.instance_path, 'feeds')
+
+
+def _text(value):
+    return _INVALID_XML_CHARS.sub('', str(value or ''))
+
+
+def _xml(value):
+    return escape(_text(value))
+
+
+def _tsv(value):
+    return re.sub(r'[\t\r\n]+', ' ', _text(value)).strip()
+
+
+def _w3c(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S+00:00') if value else None
+
+
+class AtomicGzipWriter:
+    """Text writer that gzips into ``path`` and only replaces it on a clean close"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f'{path}.{os.getpid()}.tmp'
+        self.file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = gzip.open(self.tmp_path, 'wt', encoding='utf-8', compresslevel=6) \
+            if self.path.endswith('.gz') else open(self.tmp_path, 'w', encoding='utf-8')
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+        return False
+
+
+def load_state(directory):
+    try:
+        with open(os.path.join(directory, 'feed_state.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(directory, **values):
+    state = load_state(directory)
+    state.update(values)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'feed_state.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def _last_run(directory, key):
+    value = load_state(directory).get(key)
+    return datetime.fromisoformat(value) if value else None
+
+
+def stream_products(*criteria, batch_size=1000):
+    """Yield product rows (with brand and category names) in id order over a server-side cursor"""
+    statement = select(
+        Product.id, Product.sku, Product.slug, Product.name, Product.short_description, Product.description,
+        Product.base_price, Product.compare_price, Product.gst_rate, Product.is_gst_inclusive,
+        Product.stock_status, Product.track_inventory, Product.main_image_url, Product.status,
+        Product.updated_at, Brand.name.label('brand_name'), Category.name.label('category_name')
+    ).outerjoin(Brand, Brand.id == Product.brand_id) \
+        .outerjoin(Category, Category.id == Product.category_id) \
+        .where(*criteria) \
+        .order_by(Product.id) \
+        .execution_options(yield_per=batch_size)
+    yield from db.session.execute(statement)
+
+
+def _product_url(slug):
+    return url_for('shop.product_detail', slug=slug, _external=True)
+
+
+def _absolute(site_url, url):
+    if not url or url.startswith(('http://', 'https://')):
+        return url or ''
+    return site_url.rstrip('/') + '/' + url.lstrip('/')
+
+
+# ---------------------------------------------------------------- sitemaps
+
+def _write_urlset(path, entries):
+    """Write (loc, lastmod) pairs as one gzip urlset; returns the number written"""
+    count = 0
+    with AtomicGzipWriter(path) as out:
+        out.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n')
+        for loc, lastmod in entries:
+            out.write(f'<url><loc>{_xml(loc)}</loc>')
+            if lastmod:
+                out.write(f'<lastmod>{_w3c(lastmod)}</lastmod>')
+            out.write('</url>\n')
+            count += 1
+        out.write('</urlset>\n')
+    return count
+
+
+def _catalog_entries():
+    yield url_for('shop.index', _external=True), None
+    yield url_for('shop.products', _external=True), None
+    yield url_for('shop.categories', _external=True), None
+    for slug, updated_at in db.session.query(Category.slug, Category.updated_at) \
+            .filter(Category.is_active == True).order_by(Category.id):
+        yield url_for('shop.category', slug=slug, _external=True), updated_at
+    for slug, updated_at in db.session.query(Brand.slug, Brand.updated_at) \
+            .filter(Brand.is_active == True).order_by(Brand.id):
+        yield url_for('shop.brand', slug=slug, _external=True), updated_at
+
+
+def build_sitemaps(delta=False):
+    """Write the sitemap shards and index; returns {'shards': written, 'urls': written URLs}"""
+    app = current_app._get_current_object()
+    directory = feed_dir(app)
+    shard_size = min(app.config.get('SITEMAP_SHARD_SIZE', MAX_SITEMAP_URLS), MAX_SITEMAP_URLS)
+    batch_size = app.config.get('FEED_BATCH_SIZE', 1000)
+    started_at = datetime.utcnow()
+    since = _last_run(directory, 'sitemap') if delta else None
+
+    shard = (Product.id - 1) // shard_size
+    # One row per non-empty shard: its number and newest product
+    shards = {int(number): lastmod for number, lastmod in db.session.query(
+        shard, func.max(Product.updated_at)).filter(Product.status == 'active').group_by(shard)}
+
+    if since is not None:
+        # Shards with a changed product, whatever its status now (deactivations drop out of the shard)
+        dirty = {int(number) for (number,) in db.session.query(shard).filter(
+            Product.updated_at > since).distinct()}
+    else:
+        dirty = set(shards)
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            # Shards that no longer have active products
+            match = re.match(r'sitemap-products-(\d+)\.xml\.gz$', name)
+            if match and int(match.group(1)) not in shards:
+                os.remove(os.path.join(directory, name))
+
+    written = urls = 0
+    urls += _write_urlset(os.path.join(directory, 'sitemap-catalog.xml.gz'), _catalog_entries())
+    written += 1
+    for number in sorted(dirty):
+        path = os.path.join(directory, f'sitemap-products-{number}.xml.gz')
+        if number not in shards:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        low, high = number * shard_size + 1, (number + 1) * shard_size
+        rows = stream_products(Product.status == 'active', Product.id.between(low, high), batch_size=batch_size)
+        urls += _write_urlset(path, ((_product_url(row.slug), row.updated_at) for row in rows))
+        written += 1
+
+    with AtomicGzipWriter(os.path.join(directory, 'sitemap.xml')) as out:
+        out.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n')
+        names = [('sitemap-catalog.xml.gz', started_at)] + \
+                [(f'sitemap-products-{number}.xml.gz', lastmod) for number, lastmod in sorted(shards.items())]
+        for name, lastmod in names:
+            loc = url_for('shop.sitemap_file', filename=name, _external=True)
+            out.write(f'<sitemap><loc>{_xml(loc)}</loc><lastmod>{_w3c(lastmod)}</lastmod></sitemap>\n')
+        out.write('</sitemapindex>\n')
+
+    save_state(directory, sitemap=started_at.isoformat())
+    return {'shards': written, 'urls': urls}
+
+
+# ---------------------------------------------------------------- merchant feed
+
+def _availability(row):
+    if row.status != 'active':
+        return 'out_of_stock'
+    if not row.track_inventory or row.stock_status in ('in_stock', 'low_stock'):
+        return 'in_stock'
+    if row.stock_status == 'on_backorder':
+        return 'backorder'
+    return 'out_of_stock'
+
+
+def _with_gst(amount, rate, inclusive):
+    if amount is None:
+        return None
+    amount = Decimal(amount)
+    if inclusive:
+        return amount.quantize(Decimal('0.01'))
+    return (amount * (1 + Decimal(rate or 0) / 100)).quantize(Decimal('0.01'))
+
+
+def _without_gst(amount, rate, inclusive):
+    amount = Decimal(amount)
+    if not inclusive:
+        return amount.quantize(Decimal('0.01'))
+    return (amount / (1 + Decimal(rate or 0) / 100)).quantize(Decimal('0.01'))
+
+
+def feed_item(row, site_url, currency):
+    """Merchant feed fields for one product row; prices include GST as Google requires for India"""
+    price = _with_gst(row.base_price, row.gst_rate, row.is_gst_inclusive)
+    compare = _with_gst(row.compare_price, row.gst_rate, row.is_gst_inclusive)
+    on_sale = compare is not None and compare > price
+    return {
+        'id': row.sku or str(row.id),
+        'title': row.name,
+        'description': row.short_description or row.description or row.name,
+        'link': _product_url(row.slug),
+        'image_link': _absolute(site_url, row.main_image_url),
+        'availability': _availability(row),
+        'price_excl_gst': f'{_without_gst(row.base_price, row.gst_rate, row.is_gst_inclusive)} {currency}',
+        'price': f'{compare if on_sale else price} {currency}',
+        'sale_price': f'{price} {currency}' if on_sale else '',
+        'gst_rate': f'{Decimal(row.gst_rate or 0):.2f}',
+        'brand': row.brand_name or '',
+        'product_type': row.category_name or '',
+        'condition': 'new'
+    }
+
+
+def _xml_item(item):
+    fields = ''.join(f'<g:{key}>{_xml(item[key])}</g:{key}>' for key in
+                     ('id', 'image_link', 'availability', 'price', 'sale_price', 'brand', 'product_type',
+                      'condition') if item[key])
+    return (f'<item><title>{_xml(item["title"])}</title><link>{_xml(item["link"])}</link>'
+            f'<description>{_xml(item["description"])}</description>{fields}</item>\n')
+
+
+def build_product_feed(delta=False, formats=('xml', 'tsv')):
+    """Write the merchant feed in ``formats``; returns the number of products written"""
+    app = current_app._get_current_object()
+    directory = feed_dir(app)
+    site_url = app.config.get('SITE_URL', '')
+    currency = app.config.get('CURRENCY', 'INR')
+    started_at = datetime.utcnow()
+
+    if delta:
+        since = _last_run(directory, 'product_feed')
+        if since is None:
+            print("No previous product feed run; writing a full feed")
+            delta = False
+    criteria = [Product.updated_at > since] if delta else [Product.status == 'active']
+    suffix = '-delta' if delta else ''
+
+    with AtomicGzipWriter(os.path.join(directory, f'products{suffix}.xml.gz')) if 'xml' in formats \
+            else _NullWriter() as xml_out, \
+            AtomicGzipWriter(os.path.join(directory, f'products{suffix}.tsv.gz')) if 'tsv' in formats \
+            else _NullWriter() as tsv_out:
+        xml_out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                      f'<rss version="2.0" xmlns:g="{GOOGLE_NS}"><channel>\n'
+                      '<title>Pavitra Enterprises</title>'
+                      f'<link>{_xml(site_url)}</link>'
+                      '<description>Pavitra Enterprises product feed</description>\n')
+        tsv_out.write('\t'.join(FEED_COLUMNS) + '\n')
+
+        count = 0
+        for row in stream_products(*criteria, batch_size=app.config.get('FEED_BATCH_SIZE', 1000)):
+            item = feed_item(row, site_url, currency)
+            xml_out.write(_xml_item(item))
+            tsv_out.write('\t'.join(_tsv(item[column]) for column in FEED_COLUMNS) + '\n')
+            count += 1
+        xml_out.write('</channel></rss>\n')
+
+    save_state(directory, product_feed=started_at.isoformat())
+    return count
+
+
+class _NullWriter:
+    """Stands in for a format that wasn't requested"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def write(self, text):
+        pass
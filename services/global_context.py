@@ -0,0 +1,118 @@
+# services/global_context.py
+"""Catalog data injected into every rendered template.
+
+Active categories (with a short product preview for the navigation menu
+and their subtree product count), featured products, active brands and the
+site settings are loaded once into a snapshot and reused until a commit
+touches them or GLOBAL_CONTEXT_TTL expires.  The snapshot is loaded in its own session and detached, so its
+objects are safe to share between requests as long as templates only read
+the attributes loaded here.
+"""
+import hashlib
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extension import db
+from models.brand import Brand
+from models.category import Category
+from models.product import Product
+from services import catalog_events
+from services.cache import VersionedCache
+from services.images import preload_image_assets
+from services.product_counts import get_product_counts
+
+FEATURED_LIMIT = 8
+
+# Products listed under each category in the navigation menu
+CATEGORY_PREVIEW_SIZE = 5
+
+# Product columns shown from the snapshot; other product edits leave it alone
+SNAPSHOT_PRODUCT_FIELDS = {
+    'name', 'slug', 'status', 'is_featured', 'category_id', 'base_price', 'compare_price',
+    'main_image_url'
+}
+
+
+def build_site_settings(config):
+    return {
+        'free_shipping_threshold': str(config.get('FREE_SHIPPING_THRESHOLD', 999)),
+        'return_period_days': str(config.get('RETURN_PERIOD_DAYS', 10)),
+        'gst_number': '',
+        'store_name': 'Pavitra Enterprises',
+        'store_email': 'support@pavitraenterprises.com',
+        'store_phone': '+91-9711317009',
+        'currency': config.get('CURRENCY', 'INR'),
+        'currency_symbol': config.get('CURRENCY_SYMBOL', '₹')
+    }
+
+
+def snapshot_version(categories, featured_products, brands):
+    """Digest of everything the snapshot shows; part of page ETags (services/http_cache.py)"""
+    parts = [(c.id, c.updated_at, c.product_count, [(p.id, p.updated_at) for p in c.products]) for c in categories]
+    parts.append([(p.id, p.updated_at, p.rating_sum, p.rating_count) for p in featured_products])
+    parts.append([(b.id, b.updated_at) for b in brands])
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def build_catalog_context():
+    """Load the snapshot with a fixed number of queries"""
+    with Session(db.engine) as session:
+        categories = session.query(Category).filter_by(is_active=True).all()
+        featured_products = session.query(Product).filter_by(
+            is_featured=True,
+            status='active'
+        ).limit(FEATURED_LIMIT).all()
+        brands = session.query(Brand).filter_by(is_active=True).all()
+
+        category_ids = [category.id for category in categories]
+        counts = get_product_counts()
+
+        ranked = session.query(
+            Product.id.label('id'),
+            func.row_number().over(partition_by=Product.category_id, order_by=Product.id).label('position')
+        ).filter(Product.status == 'active', Product.category_id.in_(category_ids)).subquery()
+        previews = {}
+        for product in session.query(Product).join(ranked, ranked.c.id == Product.id) \
+                .filter(ranked.c.position <= CATEGORY_PREVIEW_SIZE) \
+                .order_by(Product.category_id, Product.id):
+            previews.setdefault(product.category_id, []).append(product)
+
+        for category in categories:
+            # Preload the menu's category.products so it never lazy-loads on a detached object
+            set_committed_value(category, 'products', previews.get(category.id, []))
+            category.product_count = counts.category(category.id, include_subcategories=True)
+
+    # Image derivatives for the featured and category cards in one query instead of one per card
+    preload_image_assets([product.main_image_url for product in featured_products] +
+                         [category.image_url for category in categories] +
+                         [category.banner_url for category in categories])
+
+    return {
+        'categories': categories,
+        'featured_products': featured_products,
+        'brands': brands,
+        'site_settings': build_site_settings(current_app.config),
+        'version': snapshot_version(categories, featured_products, brands)
+    }
+
+
+def get_catalog_context():
+    """Cached snapshot for the template context processor"""
+    return current_app.extensions['global_context_cache'].get_or_set('catalog', build_catalog_context)
+
+
+def init_global_context(app):
+    """Attach the snapshot cache to ``app`` and drop it on relevant catalog commits"""
+    cache = VersionedCache(maxsize=1, ttl=app.config.get('GLOBAL_CONTEXT_TTL', 60))
+    app.extensions['global_context_cache'] = cache
+
+    def invalidate_global_context(changes):
+        if changes.touched('Category') or changes.touched('Brand') or changes.touched('Review') \
+                or changes.changed_fields('Product') & SNAPSHOT_PRODUCT_FIELDS:
+            cache.invalidate()
+
+    catalog_events.subscribe(invalidate_global_context)
+    return cache
@@ -0,0 +1,137 @@
+# services/http_cache.py
+"""Conditional GET (ETag / Last-Modified) for catalog pages and APIs.
+
+Routes build ``CacheValidators`` from the versions of what they display
+(``updated_at`` columns, counts, aggregate maxima) before loading anything
+expensive, return ``validators.not_modified()`` when the client's copy is
+still current, and otherwise pass the rendered response through
+``validators.apply()``.
+
+Pages also carry the shared header (navigation snapshot, cart and wishlist
+badges, admin links), so the ETag mixes in the catalog snapshot version and
+the visitor's own counters, plus the query string and ETAG_SALT (bump it on
+a deploy that changes templates; the static asset manifest is included
+automatically).  ETags are weak: two responses with the same tag show the
+same data, not necessarily the same bytes.  Responses that flash a message
+are never made conditional.
+
+Last-Modified / If-Modified-Since only cover responses without the shared
+header whose ``last_modified`` moves with every version: a date can't
+reflect a changed snapshot or badge, or a product that left a listing.
+"""
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request, session
+from flask_login import current_user
+from sqlalchemy import func
+
+from extension import db
+from models.product import Product, ProductVariation
+from models.product_recommendation import ProductRecommendation
+from models.review import Review
+from services.cart_store import guest_cart_quantity, has_guest_cart
+from services.global_context import get_catalog_context
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def viewer_key():
+    """What the shared page header shows for the current visitor"""
+    if current_user.is_authenticated:
+        return ('user', current_user.id, current_user.is_admin,
+                current_user.get_cart_quantity(), current_user.get_wishlist_count())
+    return ('guest', guest_cart_quantity())
+
+
+class CacheValidators:
+    """ETag and Last-Modified for one response, computed before it is rendered.
+
+    ``versions`` are any reprs that change with the content; ``last_modified`` is a
+    sequence of naive-UTC datetimes whose maximum becomes the Last-Modified header.
+    It must change whenever ``versions`` do, and is ignored for shared-header pages.
+    """
+
+    def __init__(self, *versions, last_modified=(), shared_header=True):
+        # A pending flash message is shown once; that page must not be revalidated later
+        self.enabled = request.method in ('GET', 'HEAD') and not (shared_header and '_flashes' in session)
+        self.private = current_user.is_authenticated or has_guest_cart()
+        # The shared header changes with no date to show for it, so those pages only use the ETag
+        self.last_modified = None if shared_header else _as_utc(max(filter(None, last_modified), default=None))
+
+        parts = [request.endpoint, request.query_string.decode('latin-1'),
+                 current_app.config.get('ETAG_SALT', '')]
+        assets = current_app.extensions.get('static_assets')
+        if assets is not None:
+            parts.append(assets.version)
+        if shared_header:
+            try:
+                parts.append(get_catalog_context().get('version'))
+            except Exception as e:
+                print(f"Error loading catalog version for ETag: {e}")
+                self.enabled = False
+            parts.append(viewer_key())
+        parts.extend(versions)
+        self.etag = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+    def is_fresh(self):
+        """True when the client's cached copy matches (If-None-Match wins over If-Modified-Since)"""
+        if not self.enabled:
+            return False
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(self.etag)
+        since = request.if_modified_since
+        return bool(self.last_modified and since and self.last_modified <= since)
+
+    def not_modified(self):
+        """Bodyless 304 response when the client is current, else None"""
+        if not self.is_fresh():
+            return None
+        response = current_app.response_class(status=304)
+        return self.apply(response)
+
+    def apply(self, response):
+        if not self.enabled or response.status_code not in (200, 304):
+            return response
+        response.set_etag(self.etag, weak=True)
+        if self.last_modified:
+            response.last_modified = self.last_modified
+        # Always revalidate; a match costs the validator queries and no rendering
+        response.cache_control.no_cache = True
+        if self.private:
+            response.cache_control.private = True
+        else:
+            response.cache_control.public = True
+        response.vary.add('Cookie')
+        return response
+
+
+def product_page_validators(product, *versions):
+    """Validators for a product page: the product, its approved reviews, variations and recommendations,
+    plus any ``versions`` the route already has (the variation matrix)"""
+    reviews = db.session.query(func.count(Review.id), func.max(Review.updated_at)) \
+        .filter(Review.product_id == product.id, Review.status == 'approved').one()
+    variations = db.session.query(func.count(ProductVariation.id), func.max(ProductVariation.updated_at)) \
+        .filter(ProductVariation.product_id == product.id).one()
+    recommended_at = db.session.query(func.max(ProductRecommendation.computed_at)) \
+        .filter(ProductRecommendation.product_id == product.id).scalar()
+    return CacheValidators(
+        product.id, product.updated_at, product.rating_count, product.rating_sum, tuple(reviews),
+        tuple(variations), recommended_at, *versions
+    )
+
+
+def listing_validators(entity, *criteria):
+    """Validators for a category/brand listing: the entity plus one aggregate over its active products"""
+    count, newest, ratings, rating_total = db.session.query(
+        func.count(Product.id), func.max(Product.updated_at), func.sum(Product.rating_count),
+        func.sum(Product.rating_sum)
+    ).filter(Product.status == 'active', *criteria).one()
+    # Rating counters don't touch updated_at, hence the sums; the count catches products leaving the listing
+    return CacheValidators(entity.id, entity.updated_at, count, newest, ratings, rating_total)
@@ -0,0 +1,358 @@
+# services/images.py
+"""Responsive derivatives for product, category and review images.
+
+Uploads are stored once under UPLOAD_FOLDER with a content-hashed name and
+queued on a per-process thread pool, so the admin request returns as soon
+as the original is on disk.  A worker renders a square thumbnail and one
+copy per IMAGE_DERIVATIVE_WIDTHS entry (never upscaled), each as WebP and
+as a JPEG/PNG fallback, into UPLOAD_FOLDER/derived.  Derivative names carry
+the source's content hash, so they never change once written and can be
+served with far-future cache headers.  The result is one ImageAsset row per
+source URL; templates turn it into ``srcset`` attributes through
+``image_sources()`` and fall back to the original until it exists.
+
+Pillow releases the GIL while decoding and resampling, so threads resize in
+parallel without forking extra processes next to gunicorn/gevent workers.
+
+Existing images are processed with: flask process-images [--force]
+"""
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+
+from extension import db
+from models.image_asset import ImageAsset
+from services.cache import VersionedCache
+
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif'}
+
+DERIVED_FOLDER = 'derived'
+
+# Cached "no derivatives yet" marker, so unprocessed images don't query on every render
+_NOT_PROCESSED = False
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _save_atomic(image, path, **options):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    image.save(tmp_path, **options)
+    os.replace(tmp_path, path)
+
+
+def render_derivatives(source_path, output_dir, widths, thumbnail_size=160, webp_quality=80, jpeg_quality=82):
+    """Write thumbnail and resized WebP + fallback copies of ``source_path`` to ``output_dir``.
+
+    Returns {'hash', 'width', 'height', 'files': {'webp': [(width, name)], 'fallback': [...],
+    'thumbnail': {'webp': name, 'fallback': name}}}.  Files that already exist are kept.
+    """
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    digest = content_hash(data)
+    stem = secure_filename(os.path.splitext(os.path.basename(source_path))[0])[:60] or 'image'
+    if stem.endswith(digest):
+        # Uploads are already named <name>-<hash>
+        stem = stem[:-len(digest)].rstrip('-_') or 'image'
+
+    with Image.open(io.BytesIO(data)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    fallback_ext, fallback_options = ('png', {'format': 'PNG', 'optimize': True}) if has_alpha else \
+        ('jpg', {'format': 'JPEG', 'quality': jpeg_quality, 'optimize': True, 'progressive': True})
+    webp_options = {'format': 'WEBP', 'quality': webp_quality, 'method': 4}
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = {'webp': [], 'fallback': [], 'thumbnail': {}}
+
+    def write(variant, suffix):
+        for key, ext, options in (('webp', 'webp', webp_options), ('fallback', fallback_ext, fallback_options)):
+            name = f'{stem}-{digest}-{suffix}.{ext}'
+            path = os.path.join(output_dir, name)
+            if not os.path.exists(path):
+                _save_atomic(variant, path, **options)
+            yield key, name
+
+    # Every width up to the original, plus the original width itself when it is smaller than the largest
+    targets = sorted({w for w in widths if w <= image.width} | ({image.width} if image.width < max(widths) else set()))
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        variant = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for key, name in write(variant, f'{width}w'):
+            files[key].append((width, name))
+
+    thumbnail = ImageOps.fit(image, (thumbnail_size, thumbnail_size), Image.LANCZOS)
+    for key, name in write(thumbnail, 'thumb'):
+        files['thumbnail'][key] = name
+
+    return {'hash': digest, 'width': image.width, 'height': image.height, 'files': files}
+
+
+def static_url(app, path):
+    """URL of a file under the app's static folder"""
+    relative = os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+    return f'{app.static_url_path}/{relative}'
+
+
+def source_path(app, url):
+    """Filesystem path of a local static image URL, or None for remote/unsafe URLs"""
+    prefix = app.static_url_path.rstrip('/') + '/'
+    if not url or not url.startswith(prefix):
+        return None
+    relative = url[len(prefix):].split('?', 1)[0]
+    root = os.path.realpath(app.static_folder)
+    path = os.path.realpath(os.path.join(root, relative))
+    if not path.startswith(root + os.sep):
+        return None
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    if ext not in IMAGE_EXTENSIONS or not os.path.isfile(path):
+        return None
+    return path
+
+
+class ImagePipeline:
+    """Per-process worker pool that renders derivatives and records them as ImageAsset rows"""
+
+    def __init__(self, app, max_workers=2):
+        self.app = app
+        self.max_workers = max_workers
+        self.cache = VersionedCache(maxsize=app.config.get('IMAGE_CACHE_SIZE', 4096),
+                                    ttl=app.config.get('IMAGE_CACHE_TTL', 300))
+        self._executor = None
+        self._pid = None
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    @property
+    def output_dir(self):
+        return os.path.join(self.app.config['UPLOAD_FOLDER'], DERIVED_FOLDER)
+
+    def _get_executor(self):
+        # Pools don't survive fork; each worker process starts its own
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-derivatives')
+                self._pid = os.getpid()
+                self._inflight = set()
+            return self._executor
+
+    def submit(self, url):
+        """Queue derivatives for ``url``; returns a Future, or None when there is nothing to do"""
+        if source_path(self.app, url) is None:
+            return None
+        executor = self._get_executor()
+        with self._lock:
+            if url in self._inflight:
+                return None
+            self._inflight.add(url)
+        return executor.submit(self._run, url)
+
+    def _run(self, url):
+        try:
+            return self.process(url)
+        finally:
+            with self._lock:
+                self._inflight.discard(url)
+
+    def process(self, url):
+        """Render and record derivatives for ``url`` now; returns the ImageAsset dict or None"""
+        path = source_path(self.app, url)
+        if path is None:
+            return None
+        config = self.app.config
+        try:
+            result = render_derivatives(
+                path, self.output_dir,
+                widths=config.get('IMAGE_DERIVATIVE_WIDTHS', [320, 640, 1024, 1600]),
+                thumbnail_size=config.get('IMAGE_THUMBNAIL_SIZE', 160),
+                webp_quality=config.get('IMAGE_WEBP_QUALITY', 80),
+                jpeg_quality=config.get('IMAGE_JPEG_QUALITY', 82)
+            )
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            print(f"Error processing image {url}: {e}")
+            self._record(url, {'status': 'failed', 'error': str(e)[:500], 'variants': None,
+                               'content_hash': None, 'width': None, 'height': None})
+            return None
+
+        to_url = lambda name: static_url(self.app, os.path.join(self.output_dir, name))
+        files = result['files']
+        variants = {
+            'webp': [[width, to_url(name)] for width, name in files['webp']],
+            'fallback': [[width, to_url(name)] for width, name in files['fallback']],
+            'thumbnail': {key: to_url(name) for key, name in files['thumbnail'].items()}
+        }
+        values = {'status': 'ready', 'error': None, 'variants': variants, 'content_hash': result['hash'],
+                  'width': result['width'], 'height': result['height']}
+        self._record(url, values)
+        asset = dict(values, source_url=url)
+        self.cache.set(url, asset)
+        return asset
+
+    def _record(self, url, values):
+        with self.app.app_context():
+            for attempt in range(2):
+                with Session(db.engine) as session:
+                    asset = session.query(ImageAsset).filter_by(source_url=url).first()
+                    if asset is None:
+                        asset = ImageAsset(source_url=url)
+                        session.add(asset)
+                    for key, value in values.items():
+                        setattr(asset, key, value)
+                    asset.processed_at = datetime.utcnow()
+                    try:
+                        session.commit()
+                        return
+                    except IntegrityError:
+                        # Another worker inserted the same source first; update its row instead
+                        session.rollback()
+        print(f"Error recording image derivatives for {url}")
+
+    def shutdown(self, wait=True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+
+
+def get_image_pipeline():
+    return current_app.extensions['image_pipeline']
+
+
+def save_upload(file_storage, folder):
+    """Store an uploaded image under UPLOAD_FOLDER/<folder>, queue its derivatives and return its URL.
+
+    Raises ValueError when the file is not an image we accept.
+    """
+    filename = secure_filename(file_storage.filename or '')
+    name, ext = os.path.splitext(filename)
+    ext = ext.lstrip('.').lower()
+    if ext not in IMAGE_EXTENSIONS:
+        raise ValueError(f'Unsupported image type: {filename or "unnamed file"}')
+
+    data = file_storage.read()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except Exception:
+        raise ValueError(f'{filename} is not a valid image')
+
+    directory = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(folder))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{(name or "image")[:60]}-{content_hash(data)}.{ext}')
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    url = static_url(current_app, path)
+    get_image_pipeline().submit(url)
+    return url
+
+
+def preload_image_assets(urls):
+    """Load derivatives for many image URLs with one query"""
+    cache = get_image_pipeline().cache
+    missing = {url for url in urls if url and cache.get(url) is None}
+    if not missing:
+        return
+    version = cache.version
+    found = {}
+    for asset in ImageAsset.query.filter(ImageAsset.source_url.in_(missing), ImageAsset.status == 'ready'):
+        found[asset.source_url] = asset.to_dict()
+    for url in missing:
+        cache.set(url, found.get(url, _NOT_PROCESSED), version=version)
+
+
+def get_image_asset(url):
+    """Derivatives dict for ``url``, or None until it has been processed"""
+    if not url:
+        return None
+    preload_image_assets([url])
+    return get_image_pipeline().cache.get(url) or None
+
+
+def image_sources(url, sizes='100vw'):
+    """<picture> attributes for ``url``: src, webp_srcset, srcset, sizes, width, height, thumbnail"""
+    asset = get_image_asset(url)
+    if asset is None:
+        return {'src': url, 'webp_srcset': '', 'srcset': '', 'sizes': sizes, 'width': None, 'height': None,
+                'thumbnail': url}
+    variants = asset['variants']
+    to_srcset = lambda entries: ', '.join(f'{variant_url} {width}w' for width, variant_url in entries)
+    return {
+        'src': url,
+        'webp_srcset': to_srcset(variants.get('webp', [])),
+        'srcset': to_srcset(variants.get('fallback', [])),
+        'sizes': sizes,
+        'width': asset['width'],
+        'height': asset['height'],
+        'thumbnail': variants.get('thumbnail', {}).get('webp') or url
+    }
+
+
+def iter_image_urls():
+    """Every local image URL referenced by products, categories and reviews"""
+    from models.category import Category
+    from models.product import Product
+    from models.review import Review
+
+    for main_image_url, gallery in db.session.query(Product.main_image_url, Product.image_gallery).yield_per(1000):
+        if main_image_url:
+            yield main_image_url
+        for url in gallery or []:
+            if isinstance(url, str):
+                yield url
+    for image_url, banner_url in db.session.query(Category.image_url, Category.banner_url) \
+            .filter((Category.image_url.isnot(None)) | (Category.banner_url.isnot(None))):
+        if image_url:
+            yield image_url
+        if banner_url:
+            yield banner_url
+    for (images,) in db.session.query(Review.review_images).filter(Review.review_images.isnot(None)).yield_per(1000):
+        for url in images or []:
+            if isinstance(url, str):
+                yield url
+
+
+def backfill_images(force=False):
+    """Process every referenced image that has no ready derivatives; returns (processed, failed, skipped)"""
+    pipeline = get_image_pipeline()
+    done = set()
+    if not force:
+        done = {url for (url,) in db.session.query(ImageAsset.source_url).filter_by(status='ready')}
+
+    urls = []
+    skipped = 0
+    for url in dict.fromkeys(iter_image_urls()):
+        if url in done or source_path(pipeline.app, url) is None:
+            skipped += 1
+        else:
+            urls.append(url)
+
+    processed = failed = 0
+    # Same pool size as uploads; the command waits for every image
+    for result in pipeline._get_executor().map(pipeline.process, urls):
+        if result is None:
+            failed += 1
+        else:
+            processed += 1
+    return processed, failed, skipped
+
+
+def init_images(app):
+    """Attach the derivative pipeline to ``app`` and expose image_sources() to templates"""
+    pipeline = ImagePipeline(app, max_workers=app.config.get('IMAGE_WORKERS', 2))
+    app.extensions['image_pipeline'] = pipeline
+    app.jinja_env.globals['image_sources'] = image_sources
+    return pipeline
@@ -0,0 +1,197 @@
+# services/pagination.py
+"""Keyset (cursor) pagination for storefront listings.
+
+Instead of OFFSET, every page remembers the sort value and id of its first
+and last row.  The next page asks for rows strictly after that key, which an
+index on (sort column, id) answers directly, so page 500 costs the same as
+page 1.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_
+
+from models.product import Product
+
+# Stable sort orders for product listings: name -> (column, descending)
+PRODUCT_SORTS = {
+    'newest': (Product.created_at, True),
+    'best_selling': (Product.total_sold, True),
+    'price_low': (Product.base_price, False),
+    'price_high': (Product.base_price, True),
+}
+DEFAULT_PRODUCT_SORT = 'newest'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor string cannot be decoded"""
+
+
+def encode_cursor(sort, value, row_id, direction='next'):
+    """Encode a row's sort key into an opaque, URL-safe cursor"""
+    if isinstance(value, datetime):
+        kind, value = 'dt', value.isoformat()
+    elif isinstance(value, Decimal):
+        kind, value = 'dec', str(value)
+    else:
+        kind = 'raw'
+    payload = json.dumps([sort, kind, value, row_id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into (sort, value, row_id, direction)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort, kind, value, row_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if kind == 'dt':
+            value = datetime.fromisoformat(value)
+        elif kind == 'dec':
+            value = Decimal(value)
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return sort, value, int(row_id), direction
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def get_per_page(default_key='PRODUCTS_PER_PAGE', max_key='MAX_PRODUCTS_PER_PAGE'):
+    """Read ?per_page= from the request, capped by the configured maximum"""
+    default = current_app.config.get(default_key, 24)
+    maximum = current_app.config.get(max_key, 96)
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, maximum))
+
+
+class CursorPage:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, items, sort, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.sort = sort
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def _url(self, cursor):
+        args = request.args.to_dict()
+        args['cursor'] = cursor
+        return url_for(request.endpoint, **dict(request.view_args or {}, **args))
+
+    def next_url(self):
+        """URL of the next page for the current endpoint and filters"""
+        return self._url(self.next_cursor) if self.has_next else None
+
+    def prev_url(self):
+        """URL of the previous page for the current endpoint and filters"""
+        return self._url(self.prev_cursor) if self.has_prev else None
+
+    def to_dict(self):
+        return {
+            'sort': self.sort,
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'has_next': self.has_next,
+            'has_prev': self.has_prev
+        }
+
+
+def keyset_paginate(query, sort, sorts=PRODUCT_SORTS, cursor=None, per_page=24, id_column=Product.id):
+    """Return a CursorPage of ``query`` ordered by ``sorts[sort]`` then id.
+
+    An undecodable cursor, or one issued for a different sort, restarts from
+    the first page rather than erroring.
+    """
+    column, descending = sorts[sort]
+
+    key = None
+    direction = 'next'
+    if cursor:
+        try:
+            cursor_sort, value, last_id, direction = decode_cursor(cursor)
+            if cursor_sort == sort:
+                key = (value, last_id)
+            else:
+                direction = 'next'
+        except InvalidCursor:
+            direction = 'next'
+
+    # Walking backwards flips the ordering; the rows are reversed afterwards
+    backwards = key is not None and direction == 'prev'
+    desc = descending != backwards
+
+    if key is not None:
+        value, last_id = key
+        if desc:
+            query = query.filter(or_(column < value, and_(column == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, id_column > last_id)))
+
+    ordering = (column.desc(), id_column.desc()) if desc else (column.asc(), id_column.asc())
+    rows = query.order_by(None).order_by(*ordering).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, key is not None
+
+    next_cursor = prev_cursor = None
+    if rows:
+        attr = column.key
+        if has_next:
+            last = rows[-1]
+            next_cursor = encode_cursor(sort, getattr(last, attr), last.id, 'next')
+        if has_prev:
+            first = rows[0]
+            prev_cursor = encode_cursor(sort, getattr(first, attr), first.id, 'prev')
+
+    return CursorPage(rows, sort, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+def ranked_paginate(query, ranked_ids, cursor=None, per_page=24, sort='relevance'):
+    """Paginate ``query`` in the order of ``ranked_ids`` (e.g. search relevance).
+
+    The ranked list is already bounded by the search backend, so the cursor
+    is simply the last id shown; the page costs one id query to apply the
+    listing filters and one query to load the page's rows.
+    """
+    matching = {row[0] for row in query.with_entities(Product.id).filter(Product.id.in_(ranked_ids))}
+    ordered = [product_id for product_id in ranked_ids if product_id in matching]
+    position = {product_id: i for i, product_id in enumerate(ordered)}
+
+    start, direction = 0, 'next'
+    if cursor:
+        try:
+            cursor_sort, value, last_id, direction = decode_cursor(cursor)
+            if cursor_sort == sort:
+                anchor = position.get(last_id, value)
+                start = anchor + 1 if direction == 'next' else max(0, anchor - per_page)
+        except (InvalidCursor, TypeError):
+            start, direction = 0, 'next'
+
+    page_ids = ordered[start:start + per_page]
+    rows = {product.id: product for product in query.filter(Product.id.in_(page_ids))} if page_ids else {}
+    items = [rows[product_id] for product_id in page_ids if product_id in rows]
+
+    next_cursor = prev_cursor = None
+    if page_ids and start + per_page < len(ordered):
+        next_cursor = encode_cursor(sort, start + len(page_ids) - 1, page_ids[-1], 'next')
+    if page_ids and start > 0:
+        prev_cursor = encode_cursor(sort, start, page_ids[0], 'prev')
+
+    return CursorPage(items, sort, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
@@ -0,0 +1,208 @@
+# services/pricing.py
+"""Cart pricing: line totals, coupon discount, shipping and GST in one pass.
+
+``price_cart(entries)`` takes the whole cart as (item id, product id,
+variation id, quantity) entries, prices the lines services/cart.py hydrates
+for them and returns a CartPricing of exact Decimals:
+
+* each line's listed amount, its share of the coupon discount, taxable
+  value and GST - prices marked ``is_gst_inclusive`` already contain the
+  tax, others have it added on top;
+* GST per rate, split into CGST + SGST when the order ships within
+  GST_HOME_STATE and charged as IGST when it ships to another state;
+* shipping (SHIPPING_FLAT_RATE, free from FREE_SHIPPING_THRESHOLD or with a
+  free-shipping coupon) and the payable total.
+
+Results are memoized on the cart's contents, shipping state and coupon, so
+the cart page, the summary API and checkout share one computation until the
+cart changes or a product or variation is edited.
+"""
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from flask import current_app
+
+from services import catalog_events
+from services.cache import VersionedCache
+from services.cart import CartEntry, hydrate_cart
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+PricedLine = namedtuple('PricedLine', 'item_id product_id variation_id name slug sku image quantity unit_price '
+                                      'amount discount taxable_value gst_rate gst_amount gst_inclusive total')
+
+# Tax on one GST rate; either cgst + sgst or igst is non-zero
+GstBucket = namedtuple('GstBucket', 'rate taxable_value cgst sgst igst')
+
+CartPricing = namedtuple('CartPricing', 'lines subtotal discount shipping taxable_value gst gst_included total '
+                                        'interstate item_count')
+
+
+def money(value):
+    """``value`` as a Decimal rounded to paise"""
+    return Decimal(value or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def split_gst(amount, rate, inclusive):
+    """(taxable value, GST) for ``amount`` charged at ``rate`` percent"""
+    rate = Decimal(rate or 0)
+    if inclusive:
+        taxable = money(amount * 100 / (100 + rate))
+        return taxable, money(amount) - taxable
+    return money(amount), money(amount * rate / 100)
+
+
+def is_interstate(shipping_state, home_state=None):
+    """True when GST is charged as IGST; unknown states are treated as intra-state supplies"""
+    home_state = home_state if home_state is not None else current_app.config.get('GST_HOME_STATE')
+    if not shipping_state or not home_state:
+        return False
+    return shipping_state.strip().casefold() != home_state.strip().casefold()
+
+
+def _coupon_applies(coupon, product):
+    if coupon.apply_to == 'specific_categories':
+        return product.category_id in (coupon.applicable_categories or [])
+    if coupon.apply_to == 'specific_products':
+        return product.id in (coupon.applicable_products or [])
+    return True
+
+
+def coupon_discount(coupon, eligible_amount):
+    """Discount ``coupon`` gives on ``eligible_amount`` (never more than the amount itself)"""
+    if coupon is None or eligible_amount <= 0:
+        return ZERO
+    if coupon.discount_type == 'percentage':
+        discount = money(eligible_amount * Decimal(coupon.discount_value) / 100)
+        if coupon.maximum_discount_amount:
+            discount = min(discount, money(coupon.maximum_discount_amount))
+    elif coupon.discount_type == 'fixed_amount':
+        discount = money(coupon.discount_value)
+    else:  # free_shipping
+        return ZERO
+    return min(discount, eligible_amount)
+
+
+def _allocate(discount, amounts):
+    """Split ``discount`` over ``amounts`` pro rata; the last share takes the rounding remainder"""
+    total = sum(amounts)
+    shares = []
+    remaining = discount
+    for index, amount in enumerate(amounts):
+        share = remaining if index == len(amounts) - 1 else money(discount * amount / total)
+        shares.append(share)
+        remaining -= share
+    return shares
+
+
+def compute_cart_pricing(entries, shipping_state=None, coupon=None):
+    """CartPricing for ``entries``; lines whose product no longer exists are left out"""
+    config = current_app.config
+    rows = [(line, money(line.unit_price) * line.quantity) for line in hydrate_cart(entries)]
+
+    eligible = [index for index, (line, _) in enumerate(rows)
+                if coupon is not None and _coupon_applies(coupon, line.product)]
+    discount = coupon_discount(coupon, sum((rows[index][1] for index in eligible), ZERO))
+    discounts = dict(zip(eligible, _allocate(discount, [rows[index][1] for index in eligible]))) if discount else {}
+
+    lines = []
+    for index, (line, amount) in enumerate(rows):
+        product = line.product
+        line_discount = discounts.get(index, ZERO)
+        rate = Decimal(product.gst_rate if product.gst_rate is not None else config.get('DEFAULT_GST_RATE', 18))
+        inclusive = bool(product.is_gst_inclusive)
+        taxable, gst = split_gst(amount - line_discount, rate, inclusive)
+        lines.append(PricedLine(
+            item_id=line.item_id, product_id=line.product_id, variation_id=line.variation_id,
+            name=product.name, slug=product.slug, sku=line.sku, image=line.image,
+            quantity=line.quantity, unit_price=money(line.unit_price), amount=amount, discount=line_discount,
+            taxable_value=taxable, gst_rate=rate, gst_amount=gst, gst_inclusive=inclusive, total=taxable + gst
+        ))
+
+    subtotal = sum((line.amount for line in lines), ZERO)
+    merchandise = sum((line.total for line in lines), ZERO)
+    if not lines or (coupon is not None and coupon.discount_type == 'free_shipping') \
+            or subtotal - discount >= money(config.get('FREE_SHIPPING_THRESHOLD', 999)):
+        shipping = ZERO
+    else:
+        shipping = money(config.get('SHIPPING_FLAT_RATE', 49))
+
+    interstate = is_interstate(shipping_state)
+    by_rate = {}
+    for line in lines:
+        taxable, tax = by_rate.get(line.gst_rate, (ZERO, ZERO))
+        by_rate[line.gst_rate] = (taxable + line.taxable_value, tax + line.gst_amount)
+    gst = []
+    for rate, (taxable, tax) in sorted(by_rate.items()):
+        if interstate:
+            gst.append(GstBucket(rate, taxable, ZERO, ZERO, tax))
+        else:
+            central = money(tax / 2)
+            gst.append(GstBucket(rate, taxable, central, tax - central, ZERO))
+
+    return CartPricing(
+        lines=lines,
+        subtotal=subtotal,
+        discount=discount,
+        shipping=shipping,
+        taxable_value=sum((line.taxable_value for line in lines), ZERO),
+        gst=gst,
+        gst_included=sum((line.gst_amount for line in lines if line.gst_inclusive), ZERO),
+        total=merchandise + shipping,
+        interstate=interstate,
+        item_count=sum(line.quantity for line in lines)
+    )
+
+
+def price_cart(entries, shipping_state=None, coupon=None):
+    """Memoized compute_cart_pricing, keyed on the cart's contents, shipping state and coupon"""
+    entries = tuple(CartEntry(*entry) for entry in entries)
+    key = (entries, (shipping_state or '').strip().casefold(),
+           (coupon.id, coupon.updated_at) if coupon is not None else None)
+    cache = current_app.extensions.get('pricing_cache')
+    if cache is None:
+        return compute_cart_pricing(entries, shipping_state, coupon)
+    return cache.get_or_set(key, lambda: compute_cart_pricing(entries, shipping_state, coupon))
+
+
+def pricing_to_dict(pricing):
+    """JSON-ready CartPricing; amounts are exact decimal strings"""
+    return {
+        'lines': [{
+            'item_id': line.item_id, 'product_id': line.product_id, 'variation_id': line.variation_id,
+            'name': line.name, 'slug': line.slug, 'sku': line.sku, 'image': line.image,
+            'quantity': line.quantity, 'unit_price': str(line.unit_price), 'amount': str(line.amount),
+            'discount': str(line.discount), 'taxable_value': str(line.taxable_value),
+            'gst_rate': str(line.gst_rate), 'gst_amount': str(line.gst_amount),
+            'gst_inclusive': line.gst_inclusive, 'total': str(line.total)
+        } for line in pricing.lines],
+        'subtotal': str(pricing.subtotal),
+        'discount': str(pricing.discount),
+        'shipping': str(pricing.shipping),
+        'taxable_value': str(pricing.taxable_value),
+        'gst': [{
+            'rate': str(bucket.rate), 'taxable_value': str(bucket.taxable_value),
+            'cgst': str(bucket.cgst), 'sgst': str(bucket.sgst), 'igst': str(bucket.igst)
+        } for bucket in pricing.gst],
+        'gst_included': str(pricing.gst_included),
+        'total': str(pricing.total),
+        'interstate': pricing.interstate,
+        'item_count': pricing.item_count
+    }
+
+
+def init_pricing(app):
+    """Attach the cart pricing memo to ``app`` and drop it when prices may have changed"""
+    cache = VersionedCache(
+        maxsize=app.config.get('PRICING_CACHE_SIZE', 4096),
+        ttl=app.config.get('PRICING_CACHE_TTL', 60)
+    )
+    app.extensions['pricing_cache'] = cache
+
+    def invalidate_pricing(changes):
+        if changes.touched('Product') or changes.touched('ProductVariation'):
+            cache.invalidate()
+
+    catalog_events.subscribe(invalidate_pricing)
+    return cache
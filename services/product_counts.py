@@ -0,0 +1,73 @@
+# services/product_counts.py
+"""Active product counts for every category and brand.
+
+One GROUP BY (category_id, brand_id) over active products yields both the
+per-category and per-brand counts; category totals are then rolled up the
+cached category tree.  The result is cached until a commit changes which
+products are active or where they belong.
+"""
+from flask import current_app
+from sqlalchemy import func
+
+from extension import db
+from models.product import Product
+from services import catalog_events
+from services.cache import VersionedCache
+from services.category_tree import get_category_tree
+
+# Product columns that move a product between counts
+COUNTED_PRODUCT_FIELDS = {'status', 'category_id', 'brand_id'}
+
+
+class ProductCounts:
+    """Counts of active products by category (own and subtree) and by brand"""
+
+    def __init__(self, by_category, by_brand, subtree):
+        self.by_category = by_category
+        self.by_brand = by_brand
+        self.subtree = subtree
+
+    @classmethod
+    def load(cls):
+        by_category = {}
+        by_brand = {}
+        rows = db.session.query(Product.category_id, Product.brand_id, func.count(Product.id)) \
+            .filter(Product.status == 'active') \
+            .group_by(Product.category_id, Product.brand_id)
+        for category_id, brand_id, total in rows:
+            by_category[category_id] = by_category.get(category_id, 0) + total
+            if brand_id is not None:
+                by_brand[brand_id] = by_brand.get(brand_id, 0) + total
+
+        # Roll counts up the tree, deepest categories first; inactive branches don't count
+        tree = get_category_tree()
+        subtree = {}
+        for node in sorted(tree.nodes.values(), key=lambda n: -(n.depth or 0)):
+            subtree[node.id] = by_category.get(node.id, 0) + sum(
+                subtree.get(child.id, 0) for child in tree.children(node.id, active_only=True))
+        return cls(by_category, by_brand, subtree)
+
+    def category(self, category_id, include_subcategories=False):
+        if include_subcategories:
+            return self.subtree.get(category_id, self.by_category.get(category_id, 0))
+        return self.by_category.get(category_id, 0)
+
+    def brand(self, brand_id):
+        return self.by_brand.get(brand_id, 0)
+
+
+def get_product_counts():
+    return current_app.extensions['product_count_cache'].get_or_set('counts', ProductCounts.load)
+
+
+def init_product_counts(app):
+    """Attach the count cache to ``app`` and drop it when counted fields change"""
+    cache = VersionedCache(maxsize=1, ttl=app.config.get('PRODUCT_COUNT_CACHE_TTL', 300))
+    app.extensions['product_count_cache'] = cache
+
+    def invalidate_product_counts(changes):
+        if changes.touched('Category') or changes.changed_fields('Product') & COUNTED_PRODUCT_FIELDS:
+            cache.invalidate()
+
+    catalog_events.subscribe(invalidate_product_counts)
+    return cache
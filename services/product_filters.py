@@ -0,0 +1,167 @@
+# services/product_filters.py
+"""Storefront product filters shared by listings and facet counts."""
+from flask import current_app
+from sqlalchemy import and_, case, or_, select
+
+from extension import db
+from models.brand import Brand
+from models.product import Product, ProductAttributeValue, product_attribute_association
+from services.category_tree import get_category_tree
+
+STOCK_STATUSES = ['in_stock', 'low_stock', 'out_of_stock', 'on_backorder']
+
+
+def get_price_buckets():
+    """[(key, lower, upper)] built from PRICE_BUCKET_BOUNDARIES; the last bucket has no upper bound"""
+    boundaries = current_app.config.get('PRICE_BUCKET_BOUNDARIES', [500, 1000, 2500, 5000, 10000, 25000])
+    buckets = []
+    lower = 0
+    for upper in boundaries:
+        buckets.append((f'{lower}-{upper}', lower, upper))
+        lower = upper
+    buckets.append((f'{lower}+', lower, None))
+    return buckets
+
+
+def price_bucket_expression():
+    """SQL CASE expression mapping Product.base_price to its bucket key"""
+    buckets = get_price_buckets()
+    whens = [(Product.base_price < upper, key) for key, lower, upper in buckets if upper is not None]
+    return case(*whens, else_=buckets[-1][0])
+
+
+class ProductFilters:
+    """Parsed ?category=&brand=&price=&stock_status=&attr=&q= filters"""
+
+    def __init__(self, category=None, brands=(), prices=(), stock_statuses=(), attribute_values=(),
+                 search=None, featured=False, on_sale=False):
+        self.category = category or None
+        self.brands = sorted(set(filter(None, brands)))
+        self.prices = sorted(set(filter(None, prices)))
+        self.stock_statuses = sorted(set(s for s in stock_statuses if s in STOCK_STATUSES))
+        self.attribute_values = sorted(set(attribute_values))
+        self.search = (search or '').strip() or None
+        self.featured = bool(featured)
+        self.on_sale = bool(on_sale)
+        self._search_ids = None
+        self._indexed_ids = False
+        self._attribute_groups = None
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            category=args.get('category'),
+            brands=args.getlist('brand'),
+            prices=args.getlist('price'),
+            stock_statuses=args.getlist('stock_status'),
+            attribute_values=args.getlist('attr', type=int),
+            search=args.get('q'),
+            featured=args.get('featured'),
+            on_sale=args.get('on_sale')
+        )
+
+    def signature(self):
+        """Hashable key identifying this filter combination"""
+        return (self.category, tuple(self.brands), tuple(self.prices), tuple(self.stock_statuses),
+                tuple(self.attribute_values), self.search, self.featured, self.on_sale)
+
+    def without(self, facet, attribute_id=None):
+        """Copy of these filters with one facet's selection dropped (one attribute's values for 'attribute')"""
+        attribute_values = self.attribute_values
+        if facet == 'attribute':
+            dropped = self.attribute_groups().get(attribute_id, [])
+            attribute_values = [value_id for value_id in attribute_values if value_id not in dropped]
+        narrowed = ProductFilters(
+            category=None if facet == 'category' else self.category,
+            brands=() if facet == 'brand' else self.brands,
+            prices=() if facet == 'price' else self.prices,
+            stock_statuses=() if facet == 'stock_status' else self.stock_statuses,
+            attribute_values=attribute_values,
+            search=self.search,
+            featured=self.featured,
+            on_sale=self.on_sale
+        )
+        narrowed._search_ids = self._search_ids
+        return narrowed
+
+    def attribute_groups(self):
+        """{attribute id: [selected value ids]} for the attr filter"""
+        if self._attribute_groups is None:
+            groups = {}
+            if self.attribute_values:
+                rows = db.session.query(ProductAttributeValue.id, ProductAttributeValue.attribute_id) \
+                    .filter(ProductAttributeValue.id.in_(self.attribute_values))
+                for value_id, attribute_id in rows:
+                    groups.setdefault(attribute_id, []).append(value_id)
+            self._attribute_groups = groups
+        return self._attribute_groups
+
+    @property
+    def search_ids(self):
+        """Ranked product ids for the search query, or None without one"""
+        if self.search and self._search_ids is None:
+            from services.search import search_product_ids
+            self._search_ids = search_product_ids(self.search)
+        return self._search_ids
+
+    @property
+    def indexed_ids(self):
+        """Matching product ids resolved from the attribute index, or None to filter in SQL"""
+        if self._indexed_ids is False:
+            from services.attribute_index import get_attribute_index
+            index = get_attribute_index()
+            self._indexed_ids = None
+            if index is not None:
+                try:
+                    self._indexed_ids = index.product_ids(self)
+                except Exception as e:
+                    print(f"Error resolving filters from the attribute index: {e}")
+        return self._indexed_ids
+
+    def apply(self, query):
+        """Narrow a Product query by every active filter"""
+        ids = self.indexed_ids
+        if ids is not None:
+            return query.filter(Product.id.in_(ids))
+
+        if self.category:
+            # The category and all of its active subcategories
+            tree = get_category_tree()
+            category = tree.by_slug(self.category)
+            if category and category.is_active:
+                query = query.filter(tree.subtree_filter(Product.category_id, category.id))
+
+        if self.search:
+            query = query.filter(Product.id.in_(self.search_ids))
+
+        if self.brands:
+            query = query.filter(Product.brand_id.in_(select(Brand.id).where(Brand.slug.in_(self.brands))))
+
+        if self.prices:
+            ranges = []
+            for key, lower, upper in get_price_buckets():
+                if key in self.prices:
+                    if upper is None:
+                        ranges.append(Product.base_price >= lower)
+                    else:
+                        ranges.append(and_(Product.base_price >= lower, Product.base_price < upper))
+            if ranges:
+                query = query.filter(or_(*ranges))
+
+        if self.stock_statuses:
+            query = query.filter(Product.stock_status.in_(self.stock_statuses))
+
+        if self.attribute_values:
+            # Values of the same attribute are alternatives; different attributes must all match
+            for value_ids in self.attribute_groups().values():
+                query = query.filter(Product.id.in_(
+                    select(product_attribute_association.c.product_id)
+                    .where(product_attribute_association.c.attribute_value_id.in_(value_ids))
+                ))
+
+        if self.featured:
+            query = query.filter(Product.is_featured == True)
+        if self.on_sale:
+            query = query.filter(Product.is_on_sale == True)
+
+        return query
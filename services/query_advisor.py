@@ -0,0 +1,206 @@
+# services/query_advisor.py
+"""Query plan tooling for the storefront's hot paths.
+
+``flask advise-indexes`` requests the hot storefront pages through the test
+client, captures every SELECT they emit, runs EXPLAIN on each and reports
+full table scans and sorts that don't come from an index, with a suggested
+composite index (equality columns first, then the sort columns).
+
+``flask check-query-plans`` is the regression check: it EXPLAINs the
+HOT_QUERIES below and exits non-zero when the plan for one of them does not
+use the index it was designed for, or sorts on top of it.  On MySQL the
+optimizer may rightly scan a tiny development table, so queries on tables
+with fewer than QUERY_PLAN_MIN_ROWS rows are reported as skipped there
+rather than passed; run it against production-sized data.
+"""
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import event, func, select
+
+from extension import db
+from models.cart import ShoppingCart
+from models.order import Order
+from models.product import Product
+from models.review import Review
+
+PlanStep = namedtuple('PlanStep', 'table index possible_indexes full_scan filesort detail')
+
+# (name, acceptable index names, query factory) - the plans flask check-query-plans guards
+HOT_QUERIES = [
+    ('products_newest', ('ix_products_status_created',), lambda: Product.query.filter(
+        Product.status == 'active').order_by(Product.created_at.desc(), Product.id.desc()).limit(25)),
+    ('products_best_selling', ('ix_products_status_total_sold',), lambda: Product.query.filter(
+        Product.status == 'active').order_by(Product.total_sold.desc(), Product.id.desc()).limit(25)),
+    ('products_price_low', ('ix_products_status_price',), lambda: Product.query.filter(
+        Product.status == 'active').order_by(Product.base_price.asc(), Product.id.asc()).limit(25)),
+    ('products_featured', ('ix_products_status_featured',), lambda: Product.query.filter(
+        Product.status == 'active', Product.is_featured == True).limit(8)),
+    ('category_newest', ('ix_products_status_category_created',), lambda: Product.query.filter(
+        Product.status == 'active', Product.category_id == 1).order_by(
+        Product.created_at.desc(), Product.id.desc()).limit(25)),
+    ('brand_newest', ('ix_products_status_brand_created',), lambda: Product.query.filter(
+        Product.status == 'active', Product.brand_id == 1).order_by(
+        Product.created_at.desc(), Product.id.desc()).limit(25)),
+    ('product_reviews', ('ix_product_reviews_product_status_created',), lambda: Review.query.filter(
+        Review.product_id == 1, Review.status == 'approved').order_by(Review.created_at.desc())),
+    ('cart_line', ('unique_user_product_variation', 'sqlite_autoindex_shopping_cart_1'),
+     lambda: ShoppingCart.query.filter_by(user_id=1, product_id=1, variation_id=1).limit(1)),
+    ('admin_orders', ('ix_orders_status_created',), lambda: Order.query.filter(
+        Order.status == 'pending').order_by(Order.created_at.desc()).limit(20)),
+    ('account_orders', ('ix_orders_user_created',), lambda: Order.query.filter(
+        Order.user_id == 1).order_by(Order.created_at.desc()).limit(20)),
+]
+
+_SQLITE_STEP = re.compile(r'^(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+def explain(connection, statement, parameters=()):
+    """[PlanStep] for a raw SQL statement on SQLite or MySQL"""
+    dialect = connection.dialect.name
+    steps = []
+    if dialect == 'sqlite':
+        for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+            detail = row[-1]
+            match = _SQLITE_STEP.match(detail)
+            if match:
+                kind, table, index = match.groups()
+                full_scan = kind == 'SCAN' and index is None and 'PRIMARY KEY' not in detail \
+                    and 'VIRTUAL TABLE' not in detail
+                steps.append(PlanStep(table, index, (), full_scan, False, detail))
+            elif detail.startswith('USE TEMP B-TREE'):
+                steps.append(PlanStep(None, None, (), False, True, detail))
+    elif dialect == 'mysql':
+        for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings():
+            extra = row.get('Extra') or ''
+            possible = tuple(filter(None, (row.get('possible_keys') or '').split(',')))
+            steps.append(PlanStep(row.get('table'), row.get('key'), possible, row.get('type') == 'ALL',
+                                  'Using filesort' in extra, extra))
+    else:
+        raise ValueError(f'EXPLAIN is not supported for the {dialect} dialect')
+    return steps
+
+
+def explain_query(connection, query):
+    """EXPLAIN an ORM query or Core select on ``connection``"""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=connection.dialect)
+    if compiled.positional:
+        parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        parameters = compiled.params
+    return explain(connection, str(compiled), parameters)
+
+
+def suggest_index(statement, table):
+    """Composite index for ``table``: equality/IN columns first, then ORDER BY columns"""
+    quoted = re.escape(table)
+    equality = re.findall(rf'\b{quoted}\.(\w+) (?:=|IN\b)', statement)
+    ordering = []
+    order_by = re.search(r'ORDER BY (.+?)(?: LIMIT| OFFSET|$)', statement, re.S)
+    if order_by:
+        ordering = re.findall(rf'\b{quoted}\.(\w+)', order_by.group(1))
+    columns = []
+    for column in equality + ordering:
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+@contextmanager
+def capture_selects(engine):
+    """Collect {statement: parameters} for every SELECT run on ``engine`` inside the block"""
+    statements = {}
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and statement not in statements:
+            statements[statement] = parameters
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def hot_paths():
+    """Storefront URLs worth profiling, using real slugs from the catalog"""
+    from models.brand import Brand
+    from models.category import Category
+
+    paths = ['/', '/products', '/products?sort=best_selling', '/products?sort=price_low',
+             '/products?featured=1', '/products?on_sale=1', '/products?q=phone']
+    product = Product.query.filter_by(status='active').first()
+    category = Category.query.filter_by(is_active=True).first()
+    brand = Brand.query.filter_by(is_active=True).first()
+    if category:
+        paths += [f'/category/{category.slug}', f'/products?category={category.slug}']
+    if brand:
+        paths += [f'/brand/{brand.slug}', f'/products?brand={brand.slug}']
+    if product:
+        paths += [f'/product/{product.slug}', f'/api/product/{product.id}/stock']
+    return paths
+
+
+def advise(app, paths=None):
+    """[{statement, steps, issues, suggestions}] for the SELECTs behind ``paths``"""
+    counter = app.extensions.get('view_counter')
+    with app.app_context():
+        paths = paths or hot_paths()
+        engine = db.engine
+
+    # Profiling page loads must not count as product views
+    if counter is not None:
+        counter.enabled = False
+    try:
+        with capture_selects(engine) as statements:
+            client = app.test_client()
+            for path in paths:
+                try:
+                    client.get(path)
+                except Exception as e:
+                    # The SQL run before the failure is still worth explaining
+                    print(f"Error requesting {path}: {e}")
+    finally:
+        if counter is not None:
+            counter.enabled = True
+
+    report = []
+    with app.app_context(), engine.connect() as connection:
+        for statement, parameters in statements.items():
+            steps = explain(connection, statement, parameters)
+            issues = [step for step in steps if step.full_scan or step.filesort]
+            suggestions = {}
+            for step in issues:
+                table = step.table or next((s.table for s in steps if s.table), None)
+                # Only real tables can take an index, not derived tables or subqueries
+                if table in db.metadata.tables:
+                    columns = suggest_index(statement, table)
+                    if columns:
+                        suggestions[table] = columns
+            report.append({'statement': statement, 'steps': steps, 'issues': issues,
+                           'suggestions': suggestions})
+    return report
+
+
+def check_query_plans(min_rows=0):
+    """[(name, passed, index used, plan details)] for every HOT_QUERIES entry.
+
+    ``passed`` is None when the query was skipped: on MySQL, its table has
+    fewer than ``min_rows`` rows and the optimizer may prefer a scan.
+    """
+    results = []
+    with db.engine.connect() as connection:
+        for name, indexes, factory in HOT_QUERIES:
+            query = factory()
+            steps = explain_query(connection, query)
+            used = [step.index for step in steps if step.index]
+            # The index the plan actually uses, with no sort on top of it
+            passed = any(index in indexes for index in used) and not any(step.filesort for step in steps)
+            if not passed and connection.dialect.name != 'sqlite' and min_rows:
+                table = query.statement.get_final_froms()[0]
+                if connection.execute(select(func.count()).select_from(table)).scalar() < min_rows:
+                    passed = None
+            results.append((name, passed, ', '.join(used) or 'none', [step.detail for step in steps]))
+    return results
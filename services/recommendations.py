@@ -0,0 +1,186 @@
+# services/recommendations.py
+"""Precomputed "frequently bought together" and related products.
+
+``flask build-recommendations`` stores the top RECOMMENDATION_TOP_K
+neighbours of every product in product_recommendations, and the product
+page reads them back with one indexed query.
+
+* bought_together - products sharing orders, scored by cosine similarity of
+  their order sets: orders(a, b) / sqrt(orders(a) * orders(b)).  The
+  order_items self-join runs in the database per batch of products, so
+  memory stays bounded by the batch however many order lines there are.
+* related - products in the same category, scored by IDF-weighted cosine
+  similarity of their brand, tag and attribute value sets.  Each product is
+  compared against the RECOMMENDATION_CANDIDATES best sellers of its
+  category, which keeps large categories linear rather than quadratic.
+
+Incremental runs recompute only products ordered or edited since the last
+run.
+"""
+import heapq
+import math
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, distinct, func
+from sqlalchemy.orm import aliased
+
+from extension import db
+from models.order import Order, OrderItem
+from models.product import Product, product_attribute_association, product_tag_relations
+from models.product_recommendation import ProductRecommendation
+
+BOUGHT_TOGETHER = 'bought_together'
+RELATED = 'related'
+
+# Orders that never completed don't say anything about what goes together
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'refunded')
+
+# Shared category counts for something even without shared tags or attributes
+SAME_CATEGORY_SCORE = 0.1
+
+
+def _top_k(scores, k):
+    """[(product_id, score)] for the ``k`` best of a {product_id: score} dict"""
+    return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def _order_counts():
+    """{product_id: number of distinct orders containing it}"""
+    rows = db.session.query(OrderItem.product_id, func.count(distinct(OrderItem.order_id))) \
+        .join(Order, Order.id == OrderItem.order_id) \
+        .filter(Order.status.notin_(EXCLUDED_ORDER_STATUSES)) \
+        .group_by(OrderItem.product_id)
+    return dict(rows)
+
+
+def co_purchase_neighbours(product_ids, order_counts, top_k):
+    """{product_id: [(other_id, score)]} for products bought in the same orders"""
+    item, other = aliased(OrderItem), aliased(OrderItem)
+    rows = db.session.query(item.product_id, other.product_id, func.count(distinct(item.order_id))) \
+        .join(other, and_(other.order_id == item.order_id, other.product_id != item.product_id)) \
+        .join(Order, Order.id == item.order_id) \
+        .filter(item.product_id.in_(product_ids), Order.status.notin_(EXCLUDED_ORDER_STATUSES)) \
+        .group_by(item.product_id, other.product_id)
+
+    scores = {}
+    for product_id, other_id, together in rows:
+        norm = math.sqrt(order_counts.get(product_id, 1) * order_counts.get(other_id, 1)) or 1
+        scores.setdefault(product_id, {})[other_id] = together / norm
+    return {product_id: _top_k(candidates, top_k) for product_id, candidates in scores.items()}
+
+
+class ContentIndex:
+    """Brand, tag and attribute features of every active product, grouped by category"""
+
+    def __init__(self, candidates=200):
+        self.features = {}
+        self.category_of = {}
+        by_category = {}
+        popularity = {}
+        for product_id, category_id, brand_id, total_sold in db.session.query(
+                Product.id, Product.category_id, Product.brand_id, Product.total_sold) \
+                .filter(Product.status == 'active'):
+            self.features[product_id] = {('brand', brand_id)} if brand_id else set()
+            self.category_of[product_id] = category_id
+            by_category.setdefault(category_id, []).append(product_id)
+            popularity[product_id] = total_sold or 0
+
+        for product_id, tag_id in db.session.query(product_tag_relations.c.product_id, product_tag_relations.c.tag_id):
+            if product_id in self.features:
+                self.features[product_id].add(('tag', tag_id))
+        for product_id, value_id in db.session.query(product_attribute_association.c.product_id,
+                                                     product_attribute_association.c.attribute_value_id):
+            if product_id in self.features:
+                self.features[product_id].add(('attr', value_id))
+
+        document_frequency = {}
+        for features in self.features.values():
+            for feature in features:
+                document_frequency[feature] = document_frequency.get(feature, 0) + 1
+        total = len(self.features) or 1
+        self.idf = {feature: math.log(1 + total / df) for feature, df in document_frequency.items()}
+        self.norm = {product_id: math.sqrt(sum(self.idf[f] ** 2 for f in features)) or 1.0
+                     for product_id, features in self.features.items()}
+        self.pools = {category_id: heapq.nlargest(candidates, ids, key=lambda pid: popularity[pid])
+                      for category_id, ids in by_category.items()}
+
+    def neighbours(self, product_id, top_k):
+        features = self.features.get(product_id)
+        if features is None:
+            return []
+        scores = {}
+        for other_id in self.pools.get(self.category_of[product_id], ()):
+            if other_id == product_id:
+                continue
+            shared = features & self.features[other_id]
+            overlap = sum(self.idf[f] ** 2 for f in shared) / (self.norm[product_id] * self.norm[other_id])
+            scores[other_id] = SAME_CATEGORY_SCORE + overlap
+        return _top_k(scores, top_k)
+
+
+def _store(kind, neighbours, computed_at):
+    """Replace the stored ``kind`` rows of every product in ``neighbours``"""
+    if not neighbours:
+        return
+    ProductRecommendation.query.filter(
+        ProductRecommendation.kind == kind,
+        ProductRecommendation.product_id.in_(list(neighbours))
+    ).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(ProductRecommendation, [{
+        'product_id': product_id,
+        'kind': kind,
+        'position': position,
+        'related_product_id': other_id,
+        'score': score,
+        'computed_at': computed_at
+    } for product_id, ranked in neighbours.items() for position, (other_id, score) in enumerate(ranked, 1)])
+
+
+def build_recommendations(product_ids=None, batch_size=200):
+    """Recompute recommendations for ``product_ids`` (default: every product); returns products processed"""
+    top_k = current_app.config.get('RECOMMENDATION_TOP_K', 12)
+    computed_at = datetime.utcnow()
+    if product_ids is None:
+        product_ids = [row[0] for row in db.session.query(Product.id).order_by(Product.id)]
+    else:
+        product_ids = sorted(product_ids)
+
+    order_counts = _order_counts()
+    content = ContentIndex(candidates=current_app.config.get('RECOMMENDATION_CANDIDATES', 200))
+
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        bought_together = co_purchase_neighbours(batch, order_counts, top_k)
+        _store(BOUGHT_TOGETHER, {product_id: bought_together.get(product_id, []) for product_id in batch},
+               computed_at)
+        _store(RELATED, {product_id: content.neighbours(product_id, top_k) for product_id in batch}, computed_at)
+        # One transaction per batch keeps lock time and undo log small
+        db.session.commit()
+
+    return len(product_ids)
+
+
+def refresh_recommendations(since=None):
+    """Recompute products ordered or edited since ``since`` (default: the last run)"""
+    if since is None:
+        since = db.session.query(func.max(ProductRecommendation.computed_at)).scalar()
+        if since is None:
+            return build_recommendations()
+
+    ordered = db.session.query(distinct(OrderItem.product_id)) \
+        .join(Order, Order.id == OrderItem.order_id) \
+        .filter(Order.created_at >= since)
+    edited = db.session.query(Product.id).filter(Product.updated_at >= since)
+    product_ids = {row[0] for row in ordered} | {row[0] for row in edited}
+    return build_recommendations(product_ids)
+
+
+def get_recommended_products(product, kind=RELATED, limit=4):
+    """Active products stored as ``kind`` neighbours of ``product``, best first"""
+    return Product.query.join(ProductRecommendation, ProductRecommendation.related_product_id == Product.id) \
+        .filter(ProductRecommendation.product_id == product.id,
+                ProductRecommendation.kind == kind,
+                Product.status == 'active') \
+        .order_by(ProductRecommendation.position) \
+        .limit(limit).all()
@@ -0,0 +1,526 @@
+# services/search.py
+"""Ranked product search.
+
+Products are indexed as documents with four fields - name, sku, keywords
+(tags, brand and category names) and body (short and long description) -
+and ranked with BM25.  Three backends share that document shape:
+
+* memory          - an inverted index held in each worker process
+* sqlite_fts5     - an FTS5 virtual table (SQLite builds with FTS5)
+* mysql_fulltext  - the product_search table with a FULLTEXT index
+                    (migration_scripts/005_add_product_search.sql)
+
+SEARCH_BACKEND = 'auto' picks the database backend when it is available and
+falls back to the in-memory index otherwise.  Committed product, tag, brand
+and category changes are picked up through services.catalog_events; other
+workers' edits are caught by polling Product.updated_at every
+SEARCH_SYNC_INTERVAL seconds.
+
+Full builds never run inside a request: an empty index (or a renamed tag)
+starts a background build, and until the first one finishes searches use
+plain LIKE matching.  ``flask rebuild-search-index`` builds it up front.
+"""
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, case, inspect as sa_inspect, or_, text
+
+from extension import db
+from models.brand import Brand
+from models.category import Category
+from models.product import Product, ProductTag, product_tag_relations
+from services import catalog_events
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# BM25F field weights
+FIELD_WEIGHTS = {'name': 3.0, 'sku': 3.0, 'keywords': 2.0, 'body': 1.0}
+
+# How many index terms a trailing partial word may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+BATCH_SIZE = 1000
+
+
+def tokenize(value):
+    """Lowercase word tokens of ``value``"""
+    return TOKEN_RE.findall(value.lower()) if value else []
+
+
+def build_documents(product_ids=None, batch_size=BATCH_SIZE):
+    """Yield lists of search documents, ``batch_size`` products at a time.
+
+    Each batch costs two queries (products with brand/category names, then
+    their tags) regardless of how many products it holds.
+    """
+    base = db.session.query(
+        Product.id, Product.name, Product.sku, Product.short_description,
+        Product.description, Brand.name, Category.name
+    ).outerjoin(Brand, Product.brand_id == Brand.id) \
+        .outerjoin(Category, Product.category_id == Category.id)
+
+    def load(rows):
+        ids = [row[0] for row in rows]
+        tags = {}
+        tag_rows = db.session.query(product_tag_relations.c.product_id, ProductTag.name) \
+            .join(ProductTag, ProductTag.id == product_tag_relations.c.tag_id) \
+            .filter(product_tag_relations.c.product_id.in_(ids))
+        for product_id, tag_name in tag_rows:
+            tags.setdefault(product_id, []).append(tag_name)
+
+        return [{
+            'id': pid,
+            'name': name or '',
+            'sku': sku or '',
+            'keywords': ' '.join(tags.get(pid, []) + [brand_name or '', category_name or '']).strip(),
+            'body': ' '.join(filter(None, [short_description, description]))
+        } for pid, name, sku, short_description, description, brand_name, category_name in rows]
+
+    if product_ids is not None:
+        product_ids = sorted(product_ids)
+        for start in range(0, len(product_ids), batch_size):
+            chunk = product_ids[start:start + batch_size]
+            rows = base.filter(Product.id.in_(chunk)).all()
+            if rows:
+                yield load(rows)
+        return
+
+    last_id = 0
+    while True:
+        rows = base.filter(Product.id > last_id).order_by(Product.id).limit(batch_size).all()
+        if not rows:
+            break
+        yield load(rows)
+        last_id = rows[-1][0]
+
+
+class MemorySearchBackend:
+    """In-process inverted index with BM25F scoring"""
+
+    name = 'memory'
+    persistent = False
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.postings = {}      # term -> {product_id: weighted term frequency}
+            self.doc_terms = {}     # product_id -> {term: weighted term frequency}
+            self.doc_lengths = {}
+            self.total_length = 0.0
+            self._sorted_terms = None
+
+    def is_empty(self):
+        return not self.doc_terms
+
+    def stored_ids(self):
+        with self._lock:
+            return set(self.doc_terms)
+
+    def _analyze(self, doc):
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(doc.get(field))
+            if field == 'sku' and doc.get(field):
+                # Whole SKU as one term so "ABC-123" matches exactly
+                tokens.append(doc[field].lower())
+            for token in tokens:
+                terms[token] = terms.get(token, 0.0) + weight
+        return terms
+
+    def _remove(self, product_id):
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(product_id, None)
+                if not posting:
+                    del self.postings[term]
+                    self._sorted_terms = None
+        self.total_length -= self.doc_lengths.pop(product_id, 0.0)
+
+    def upsert(self, docs):
+        with self._lock:
+            for doc in docs:
+                self._remove(doc['id'])
+                terms = self._analyze(doc)
+                self.doc_terms[doc['id']] = terms
+                length = sum(terms.values())
+                self.doc_lengths[doc['id']] = length
+                self.total_length += length
+                for term, tf in terms.items():
+                    if term not in self.postings:
+                        self.postings[term] = {}
+                        self._sorted_terms = None
+                    self.postings[term][doc['id']] = tf
+
+    def remove(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+
+    def _expand_prefix(self, prefix):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        terms = self._sorted_terms
+        matches = []
+        i = bisect_left(terms, prefix)
+        while i < len(terms) and terms[i].startswith(prefix) and len(matches) < MAX_PREFIX_EXPANSIONS:
+            if terms[i] != prefix:
+                matches.append(terms[i])
+            i += 1
+        return matches
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            n = len(self.doc_terms)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+
+            # term -> query weight; the last word may still be being typed
+            weighted = {token: 1.0 for token in tokens}
+            if len(tokens[-1]) >= 2:
+                for term in self._expand_prefix(tokens[-1]):
+                    weighted.setdefault(term, 0.5)
+
+            scores = {}
+            for term, query_weight in weighted.items():
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for product_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[product_id] / avg_length)
+                    scores[product_id] = scores.get(product_id, 0.0) + \
+                        query_weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+class SQLiteFTSBackend:
+    """SQLite FTS5 virtual table ranked with the built-in bm25()"""
+
+    name = 'sqlite_fts5'
+    persistent = True
+    table = 'product_search_fts'
+
+    @classmethod
+    def available(cls, engine):
+        if engine.dialect.name != 'sqlite':
+            return False
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {cls.table} "
+                    f"USING fts5(name, sku, keywords, body, tokenize='unicode61 remove_diacritics 2')"
+                ))
+            return True
+        except Exception:
+            return False
+
+    def clear(self):
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table}"))
+
+    def is_empty(self):
+        with db.engine.connect() as conn:
+            return conn.execute(text(f"SELECT rowid FROM {self.table} LIMIT 1")).first() is None
+
+    def stored_ids(self):
+        with db.engine.connect() as conn:
+            return set(conn.execute(text(f"SELECT rowid FROM {self.table}")).scalars())
+
+    def upsert(self, docs):
+        if not docs:
+            return
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), [{'id': d['id']} for d in docs])
+            conn.execute(
+                text(f"INSERT INTO {self.table} (rowid, name, sku, keywords, body) "
+                     f"VALUES (:id, :name, :sku, :keywords, :body)"),
+                docs
+            )
+
+    def remove(self, product_ids):
+        if not product_ids:
+            return
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), [{'id': i} for i in product_ids])
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        weights = ', '.join(str(w) for w in FIELD_WEIGHTS.values())
+        with db.engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT rowid, bm25({self.table}, {weights}) AS score FROM {self.table} "
+                f"WHERE {self.table} MATCH :match ORDER BY score LIMIT :limit"
+            ), {'match': ' OR '.join(terms), 'limit': limit}).all()
+        # bm25() is lower-is-better
+        return [(row[0], -row[1]) for row in rows]
+
+
+class MySQLFulltextBackend:
+    """MySQL InnoDB FULLTEXT index over the product_search table"""
+
+    name = 'mysql_fulltext'
+    persistent = True
+    table = 'product_search'
+
+    @classmethod
+    def available(cls, engine):
+        if engine.dialect.name != 'mysql':
+            return False
+        try:
+            return sa_inspect(engine).has_table(cls.table)
+        except Exception:
+            return False
+
+    def clear(self):
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table}"))
+
+    def is_empty(self):
+        with db.engine.connect() as conn:
+            return conn.execute(text(f"SELECT product_id FROM {self.table} LIMIT 1")).first() is None
+
+    def stored_ids(self):
+        with db.engine.connect() as conn:
+            return set(conn.execute(text(f"SELECT product_id FROM {self.table}")).scalars())
+
+    def upsert(self, docs):
+        if not docs:
+            return
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT INTO {self.table} (product_id, name, sku, keywords, body) "
+                f"VALUES (:id, :name, :sku, :keywords, :body) "
+                f"ON DUPLICATE KEY UPDATE name = VALUES(name), sku = VALUES(sku), "
+                f"keywords = VALUES(keywords), body = VALUES(body)"
+            ), docs)
+
+    def remove(self, product_ids):
+        if not product_ids:
+            return
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table} WHERE product_id = :id"),
+                         [{'id': i} for i in product_ids])
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Boolean mode without operators ORs the words; '*' allows a partial last word
+        match = ' '.join(tokens) + '*'
+        with db.engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT product_id, MATCH(name, sku, keywords, body) AGAINST (:match IN BOOLEAN MODE) AS score "
+                f"FROM {self.table} WHERE MATCH(name, sku, keywords, body) AGAINST (:match IN BOOLEAN MODE) "
+                f"ORDER BY score DESC, product_id LIMIT :limit"
+            ), {'match': match, 'limit': limit}).all()
+        return [(row[0], float(row[1])) for row in rows]
+
+
+def sql_search(query, limit):
+    """[(product_id, score)] by LIKE matching, for while the index is being built.
+
+    Every word must appear in the name, SKU or descriptions; products whose
+    name has all of them come first.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    in_name = and_(*[Product.name.ilike(f'%{token}%') for token in tokens])
+    anywhere = and_(*[or_(Product.name.ilike(f'%{token}%'), Product.sku.ilike(f'%{token}%'),
+                          Product.short_description.ilike(f'%{token}%'),
+                          Product.description.ilike(f'%{token}%')) for token in tokens])
+    score = case((in_name, 2.0), else_=1.0)
+    rows = db.session.query(Product.id, score).filter(anywhere).order_by(score.desc(), Product.id).limit(limit)
+    return [(product_id, float(value)) for product_id, value in rows]
+
+
+BACKENDS = {
+    MemorySearchBackend.name: MemorySearchBackend,
+    SQLiteFTSBackend.name: SQLiteFTSBackend,
+    MySQLFulltextBackend.name: MySQLFulltextBackend,
+}
+
+
+class ProductSearch:
+    """Keeps a search backend in step with committed catalog changes"""
+
+    def __init__(self, backend_name='auto', sync_interval=30, max_results=1000, app=None):
+        self.backend_name = backend_name
+        self.sync_interval = sync_interval
+        self.max_results = max_results
+        self.app = app
+        self.backend = None
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._builder = None
+        self._ready = False
+        self._pending_products = set()
+        self._pending_brands = set()
+        self._pending_categories = set()
+        self._pending_full = False
+        self._synced_at = None
+        self._checked_at = 0.0
+
+    def _select_backend(self):
+        name = self.backend_name
+        if name == 'auto':
+            for candidate in (MySQLFulltextBackend, SQLiteFTSBackend):
+                if candidate.available(db.engine):
+                    return candidate()
+            return MemorySearchBackend()
+        backend_cls = BACKENDS[name]
+        if getattr(backend_cls, 'persistent', False) and not backend_cls.available(db.engine):
+            raise RuntimeError(f"Search backend '{name}' is not available for this database")
+        return backend_cls()
+
+    def on_commit(self, changes):
+        """catalog_events subscriber: remember what to reindex"""
+        with self._lock:
+            self._pending_products |= changes.touched('Product')
+            self._pending_brands |= changes.touched('Brand')
+            self._pending_categories |= changes.touched('Category')
+            if changes.touched('ProductTag') - changes.created_ids('ProductTag'):
+                # A renamed or deleted tag can appear on any number of products
+                self._pending_full = True
+
+    def rebuild(self):
+        """Reindex every product; returns the number indexed.
+
+        Documents are upserted over the live index rather than clearing it
+        first, so searches keep working while it runs.
+        """
+        with self._build_lock:
+            with self._lock:
+                if self.backend is None:
+                    self.backend = self._select_backend()
+                backend = self.backend
+                started = datetime.utcnow()
+                # Committed so far, so read by the build; later commits queue up for refresh()
+                self._pending_products.clear()
+                self._pending_brands.clear()
+                self._pending_categories.clear()
+                self._pending_full = False
+            stale = backend.stored_ids()
+            for docs in build_documents():
+                backend.upsert(docs)
+                stale.difference_update(doc['id'] for doc in docs)
+            backend.remove(stale)
+            with self._lock:
+                self._synced_at = started
+                self._checked_at = time.monotonic()
+                self._ready = True
+            return len(backend.stored_ids())
+
+    def _build_in_background(self):
+        """Start a rebuild thread unless one is running"""
+        if self.app is None or (self._builder is not None and self._builder.is_alive()):
+            return
+        self._builder = threading.Thread(target=self._run_build, name='search-rebuild', daemon=True)
+        self._builder.start()
+
+    def _run_build(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        except Exception as e:
+            print(f"Error rebuilding the search index: {e}")
+
+    def _reindex(self, product_ids):
+        found = set()
+        for docs in build_documents(product_ids):
+            self.backend.upsert(docs)
+            found.update(doc['id'] for doc in docs)
+        self.backend.remove(set(product_ids) - found)
+
+    def refresh(self):
+        """Apply pending changes and poll for edits made by other workers; full builds go to a thread"""
+        with self._lock:
+            if self.backend is None:
+                self.backend = self._select_backend()
+            if not self._ready:
+                if not self.backend.persistent or self.backend.is_empty():
+                    self._build_in_background()
+                    return
+                self._ready = True
+                self._synced_at = datetime.utcnow()
+                self._checked_at = time.monotonic()
+
+            if self._pending_full:
+                self._build_in_background()
+
+            pending = set(self._pending_products)
+            if self._pending_brands:
+                pending.update(row[0] for row in db.session.query(Product.id)
+                               .filter(Product.brand_id.in_(self._pending_brands)))
+            if self._pending_categories:
+                pending.update(row[0] for row in db.session.query(Product.id)
+                               .filter(Product.category_id.in_(self._pending_categories)))
+
+            now = time.monotonic()
+            if now - self._checked_at >= self.sync_interval:
+                started = datetime.utcnow()
+                pending.update(row[0] for row in db.session.query(Product.id)
+                               .filter(Product.updated_at >= self._synced_at))
+                self._synced_at = started
+                self._checked_at = now
+
+            if pending:
+                self._reindex(pending)
+            self._pending_products.clear()
+            self._pending_brands.clear()
+            self._pending_categories.clear()
+
+    def search(self, query, limit=None):
+        """Return [(product_id, score)] best match first"""
+        self.refresh()
+        if not self._ready:
+            return sql_search(query, limit or self.max_results)
+        return self.backend.search(query, limit or self.max_results)
+
+
+def init_search(app):
+    """Attach a ProductSearch to ``app`` and subscribe it to catalog commits"""
+    product_search = ProductSearch(
+        backend_name=app.config.get('SEARCH_BACKEND', 'auto'),
+        sync_interval=app.config.get('SEARCH_SYNC_INTERVAL', 30),
+        max_results=app.config.get('SEARCH_MAX_RESULTS', 1000),
+        app=app
+    )
+    app.extensions['product_search'] = product_search
+    catalog_events.subscribe(product_search.on_commit)
+    return product_search
+
+
+def get_product_search():
+    return current_app.extensions['product_search']
+
+
+def search_product_ids(query, limit=None):
+    """Product ids matching ``query``, most relevant first"""
+    return [product_id for product_id, _ in get_product_search().search(query, limit)]
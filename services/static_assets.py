@@ -0,0 +1,249 @@
+# services/static_assets.py
+"""Fingerprinted, precompressed static assets.
+
+``flask build-assets`` copies everything under STATIC_ASSET_DIRS (css, js,
+vendor) to static/dist with the content hash in the file name, e.g.
+``css/main.css`` -> ``dist/css/main.3f2a9c1b7e4d.css``, rewriting relative
+``url(...)`` and ``sourceMappingURL`` references to the hashed names.  Text
+assets get ``.gz`` (and ``.br`` when the brotli package is installed)
+siblings, and the mapping is written to static/dist/manifest.json.
+
+With STATIC_ASSET_MANIFEST on, ``url_for('static', filename='css/main.css')``
+resolves through the manifest, and hashed files are served with a one-year
+``Cache-Control: immutable`` header and the smallest precompressed sibling
+the client accepts.  Files missing from the manifest are served as before,
+so a tree without a build keeps working.  Rebuild on every deploy.
+
+Builds add to static/dist rather than replacing it: hashed names only ever
+hold the same bytes, so new files are written next to the old ones and the
+manifest is switched with one ``os.replace``.  Workers that loaded the
+previous manifest keep finding its files - they are kept (listed in
+manifest.previous.json) until the build after next, by which time the
+deploy has restarted them.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional; gzip siblings are always written
+    brotli = None
+
+DIST_FOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+PREVIOUS_MANIFEST_NAME = 'manifest.previous.json'
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ttf', '.eot', '.scss'}
+
+# Siblings smaller than this fraction of the original aren't worth serving
+MIN_COMPRESSION_RATIO = 0.95
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+_SOURCE_MAP = re.compile(r'''([/][/*][#@] sourceMappingURL=)([^\s*]+)''')
+
+
+def _hashed_name(relative_path, data):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    root, ext = posixpath.splitext(relative_path)
+    return f'{root}.{digest}{ext}'
+
+
+def _rewrite_references(relative_path, text, manifest):
+    """Point relative url()/sourceMappingURL references in ``text`` at their hashed names"""
+    directory = posixpath.dirname(relative_path)
+
+    def resolve(reference):
+        if reference.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return None
+        path, suffix = re.match(r'([^?#]*)(.*)$', reference).groups()
+        target = posixpath.normpath(posixpath.join(directory, path))
+        hashed = manifest.get(target)
+        if hashed is None:
+            return None
+        # Both files live under dist/ with the same layout, so the relative path keeps working
+        relative = posixpath.relpath(hashed[len(DIST_FOLDER) + 1:], directory)
+        # The hash in the name replaces cache-busting query strings such as ?v=1
+        return relative + (suffix if suffix.startswith('#') else '')
+
+    def replace_url(match):
+        resolved = resolve(match.group(2))
+        return match.group(0) if resolved is None else f'url({match.group(1)}{resolved}{match.group(1)})'
+
+    def replace_map(match):
+        resolved = resolve(match.group(2))
+        return match.group(0) if resolved is None else match.group(1) + resolved
+
+    if relative_path.endswith('.css'):
+        text = _CSS_URL.sub(replace_url, text)
+    return _SOURCE_MAP.sub(replace_map, text)
+
+
+def _write_atomic(path, data):
+    """Write ``data`` to ``path`` so readers see the old file or the whole new one"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_compressed(path, data):
+    """Write .gz/.br siblings of ``path`` when they save enough bytes"""
+    written = []
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data) * MIN_COMPRESSION_RATIO:
+        _write_atomic(path + '.gz', gz)
+        written.append('gzip')
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data) * MIN_COMPRESSION_RATIO:
+            _write_atomic(path + '.br', br)
+            written.append('br')
+    return written
+
+
+def _prune(dist, keep):
+    """Delete files under ``dist`` that no kept manifest entry (or its .gz/.br sibling) refers to"""
+    removed = 0
+    for root, _, files in os.walk(dist):
+        for name in files:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, dist).replace(os.sep, '/')
+            if relative in (MANIFEST_NAME, PREVIOUS_MANIFEST_NAME) or relative.endswith('.tmp'):
+                continue
+            for suffix in ('.gz', '.br'):
+                if relative.endswith(suffix) and relative[:-len(suffix)] in keep:
+                    break
+            else:
+                if relative not in keep:
+                    os.remove(path)
+                    removed += 1
+    return removed
+
+
+def build_assets(static_folder, directories=('css', 'js', 'vendor')):
+    """Fingerprint and precompress assets into static/dist; returns the manifest"""
+    dist = os.path.join(static_folder, DIST_FOLDER)
+
+    sources = []
+    for directory in directories:
+        for root, _, files in os.walk(os.path.join(static_folder, directory)):
+            for name in files:
+                path = os.path.join(root, name)
+                sources.append(os.path.relpath(path, static_folder).replace(os.sep, '/'))
+
+    # Referenced files (fonts, images, source maps) are hashed before the CSS/JS that point at them
+    sources.sort(key=lambda p: (posixpath.splitext(p)[1] in ('.css', '.js'), p))
+
+    manifest = {}
+    for relative_path in sources:
+        with open(os.path.join(static_folder, relative_path), 'rb') as f:
+            data = f.read()
+        if relative_path.endswith(('.css', '.js')):
+            try:
+                text = data.decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+            else:
+                data = _rewrite_references(relative_path, text, manifest).encode('utf-8')
+
+        hashed = f'{DIST_FOLDER}/{_hashed_name(relative_path, data)}'
+        target = os.path.join(dist, hashed[len(DIST_FOLDER) + 1:])
+        # An existing file with this name already has these bytes
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write_atomic(target, data)
+            if posixpath.splitext(relative_path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                _write_compressed(target, data)
+        manifest[relative_path] = hashed
+
+    # Every file is in place before the manifest pointing at it; running workers keep the previous one
+    previous = load_manifest(static_folder)
+    if previous and previous != manifest:
+        _write_atomic(os.path.join(dist, PREVIOUS_MANIFEST_NAME),
+                      json.dumps(previous, indent=1, sort_keys=True).encode('utf-8'))
+    else:
+        previous = _load_json(os.path.join(dist, PREVIOUS_MANIFEST_NAME))
+    _write_atomic(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+
+    keep = {hashed[len(DIST_FOLDER) + 1:] for hashed in list(manifest.values()) + list(previous.values())}
+    _prune(dist, keep)
+    return manifest
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Error loading static asset manifest: {e}")
+        return {}
+
+
+def load_manifest(static_folder):
+    return _load_json(os.path.join(static_folder, DIST_FOLDER, MANIFEST_NAME))
+
+
+class StaticAssets:
+    """Manifest lookups for url_for and precompressed, immutable serving of hashed files"""
+
+    def __init__(self, app):
+        self.app = app
+        self.reload()
+
+    def reload(self):
+        self.manifest = load_manifest(self.app.static_folder)
+        self.hashed = set(self.manifest.values())
+        # Changes whenever a build changes any asset; part of page ETags
+        self.version = hashlib.sha1(json.dumps(self.manifest, sort_keys=True).encode()).hexdigest()[:12]
+
+    def resolve(self, endpoint, values):
+        """url_defaults hook: swap static filenames for their fingerprinted copies"""
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.manifest.get(values['filename'], values['filename'])
+
+    def serve(self, filename):
+        """Static view: hashed files get immutable caching and a precompressed body"""
+        if filename not in self.hashed:
+            return self.app.send_static_file(filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        accepted = request.accept_encodings
+        static_folder = self.app.static_folder
+        response = None
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[encoding] and os.path.isfile(os.path.join(static_folder, filename + suffix)):
+                response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype,
+                                               max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(static_folder, filename, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def get_static_assets():
+    return current_app.extensions['static_assets']
+
+
+def init_static_assets(app):
+    """Resolve url_for('static') through the asset manifest and serve hashed files"""
+    assets = StaticAssets(app)
+    app.extensions['static_assets'] = assets
+    if app.config.get('STATIC_ASSET_MANIFEST', True) and app.has_static_folder:
+        app.url_defaults(assets.resolve)
+        app.view_functions['static'] = assets.serve
+    return assets
@@ -0,0 +1,515 @@
+# services/suggest.py
+"""Typeahead suggestions from a memory-mapped prefix index.
+
+Suggestion keys (product names, SKUs, brand names, category names and
+Hindi category names) are sorted and written to a binary snapshot file.
+Each gunicorn worker mmaps the same file, so the index is built once and
+shared through the page cache; a lookup is a bisect plus a forward scan of
+at most MAX_SCAN keys.  Prefixes matching more keys than that ("s", "sa")
+have their best TOP_K records precomputed in the snapshot, so short queries
+rank by popularity rather than stopping at the first keys alphabetically.
+
+Snapshot layout (little endian):
+
+    b'PVSUGG02'  built_at (double)  count (uint32)  prefix_count (uint32)
+    count x uint32                  file offset of each record, in key order
+    prefix_count x uint32           file offset of each top-k list, in prefix order
+    records                         weight (float) ref_id (uint32) kind (uint8)
+                                    key_len display_len slug_len (uint16 x 3)
+                                    key, display, slug (UTF-8)
+    top-k lists                     prefix_len n (uint16 x 2) prefix (UTF-8)
+                                    n x uint32 record index, best first
+
+Rows committed after the snapshot was built live in a small per-worker
+overlay until the next rebuild.  Once the overlay passes
+SUGGEST_OVERLAY_LIMIT entries (or the snapshot file is missing) the index
+is rebuilt in a background thread while requests keep using the current
+snapshot and overlay; ``flask rebuild-suggest-index`` builds it up front.
+A replaced snapshot stays mapped until the last lookup reading it returns.
+"""
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func
+
+from extension import db
+from models.brand import Brand
+from models.category import Category
+from models.product import Product
+from services import catalog_events
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+MAGIC = b'PVSUGG02'
+HEADER = struct.Struct('<8sdII')
+RECORD = struct.Struct('<fIBHHH')
+TOP_LIST = struct.Struct('<HH')
+
+KINDS = ('product', 'brand', 'category')
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Index at most this many word positions of each name ("galaxy s23 ultra" -> 3 keys)
+MAX_NAME_SUFFIXES = 4
+
+# Records examined per lookup after the bisect; bounds worst-case latency
+MAX_SCAN = 1000
+
+# Suggestions kept for each prefix matching more than MAX_SCAN keys; above
+# SUGGEST_MAX_RESULTS so rows hidden by the overlay still leave enough
+TOP_K = 50
+
+BATCH_SIZE = 1000
+
+
+def normalize(value):
+    return ' '.join(value.casefold().split()) if value else ''
+
+
+def popularity(total_sold, view_count):
+    """Ranking weight from sales and page views"""
+    return 1.0 + 3.0 * math.log1p(total_sold or 0) + math.log1p(view_count or 0)
+
+
+def name_keys(name):
+    """Keys for each word position of ``name`` so inner words match too"""
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(min(len(words), MAX_NAME_SUFFIXES)) if words[i]]
+
+
+def score(key_b, display, weight):
+    """Ranking score of a match; whole-name matches outrank matches on an inner word"""
+    return weight * (1.5 if key_b == normalize(display).encode('utf-8') else 1.0)
+
+
+def _product_entries(rows):
+    for pid, name, sku, slug, total_sold, view_count in rows:
+        weight = popularity(total_sold, view_count)
+        for key in name_keys(name):
+            yield key, name, 'product', pid, slug, weight
+        if sku:
+            yield normalize(sku), name, 'product', pid, slug, weight
+
+
+def _group_weights(column, ids=None):
+    query = db.session.query(column, func.sum(Product.total_sold), func.sum(Product.view_count)) \
+        .filter(Product.status == 'active')
+    if ids is not None:
+        query = query.filter(column.in_(ids))
+    return {group_id: popularity(sold, views) for group_id, sold, views in query.group_by(column)}
+
+
+def _brand_entries(ids=None):
+    weights = _group_weights(Product.brand_id, ids)
+    query = db.session.query(Brand.id, Brand.name, Brand.slug).filter(Brand.is_active == True)
+    if ids is not None:
+        query = query.filter(Brand.id.in_(ids))
+    for brand_id, name, slug in query:
+        for key in name_keys(name):
+            yield key, name, 'brand', brand_id, slug, weights.get(brand_id, 1.0)
+
+
+def _category_entries(ids=None):
+    weights = _group_weights(Product.category_id, ids)
+    query = db.session.query(Category.id, Category.name, Category.name_hindi, Category.slug) \
+        .filter(Category.is_active == True)
+    if ids is not None:
+        query = query.filter(Category.id.in_(ids))
+    for category_id, name, name_hindi, slug in query:
+        weight = weights.get(category_id, 1.0)
+        for key in name_keys(name):
+            yield key, name, 'category', category_id, slug, weight
+        for key in name_keys(name_hindi):
+            yield key, name_hindi, 'category', category_id, slug, weight
+
+
+def _product_rows_query():
+    return db.session.query(Product.id, Product.name, Product.sku, Product.slug,
+                            Product.total_sold, Product.view_count) \
+        .filter(Product.status == 'active')
+
+
+def build_entries():
+    """Every suggestion entry for the active catalog, products read in id batches"""
+    entries = []
+    last_id = 0
+    while True:
+        rows = _product_rows_query().filter(Product.id > last_id).order_by(Product.id).limit(BATCH_SIZE).all()
+        if not rows:
+            break
+        entries.extend(_product_entries(rows))
+        last_id = rows[-1][0]
+    entries.extend(_brand_entries())
+    entries.extend(_category_entries())
+    return entries
+
+
+def heavy_prefixes(keys, limit=MAX_SCAN):
+    """[(prefix, lo, hi)] for every prefix of the sorted ``keys`` that more than ``limit`` of them start with"""
+    found = []
+    stack = [('', 0, len(keys))]
+    while stack:
+        prefix, lo, hi = stack.pop()
+        if hi - lo <= limit:
+            continue
+        if prefix:
+            found.append((prefix, lo, hi))
+        depth = len(prefix)
+        i = lo
+        while i < hi:
+            if len(keys[i]) <= depth:
+                i += 1
+                continue
+            child = keys[i][:depth + 1]
+            j = i + 1
+            while j < hi and keys[j].startswith(child):
+                j += 1
+            stack.append((child, i, j))
+            i = j
+    return sorted(found)
+
+
+def _top_records(entries, lo, hi, keys_b):
+    """Indexes of the best record per (kind, ref_id) among entries[lo:hi], best first"""
+    best = {}
+    for i in range(lo, hi):
+        key, display, kind, ref_id, slug, weight = entries[i]
+        ranked = (score(keys_b[i], display, weight), display)
+        target = (kind, ref_id)
+        if target not in best or best[target][0][0] < ranked[0]:
+            best[target] = (ranked, i)
+    ordered = sorted(best.values(), key=lambda item: (-item[0][0], item[0][1]))
+    return [i for _, i in ordered[:TOP_K]]
+
+
+def write_snapshot(path, entries, built_at):
+    """Write ``entries`` to ``path`` atomically"""
+    entries = sorted(entries, key=lambda e: (e[0].encode('utf-8'), -e[5]))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    keys_b = []
+    records = []
+    for key, display, kind, ref_id, slug, weight in entries:
+        key_b, display_b, slug_b = key.encode('utf-8'), display.encode('utf-8'), (slug or '').encode('utf-8')
+        keys_b.append(key_b)
+        records.append(RECORD.pack(weight, ref_id, KIND_CODES[kind], len(key_b), len(display_b), len(slug_b))
+                       + key_b + display_b + slug_b)
+
+    top_lists = []
+    for prefix, lo, hi in heavy_prefixes([entry[0] for entry in entries]):
+        prefix_b = prefix.encode('utf-8')
+        indexes = _top_records(entries, lo, hi, keys_b)
+        top_lists.append(TOP_LIST.pack(len(prefix_b), len(indexes)) + prefix_b
+                         + struct.pack(f'<{len(indexes)}I', *indexes))
+
+    offsets = []
+    position = HEADER.size + 4 * (len(records) + len(top_lists))
+    for block in records + top_lists:
+        offsets.append(position)
+        position += len(block)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, built_at, len(records), len(top_lists)))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        for block in records:
+            f.write(block)
+        for block in top_lists:
+            f.write(block)
+    os.replace(tmp_path, path)
+
+
+def snapshot_built_at(path):
+    """built_at of the snapshot at ``path``, or None when there is no usable one"""
+    try:
+        with open(path, 'rb') as f:
+            magic, built_at, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return built_at if magic == MAGIC else None
+
+
+class SuggestSnapshot:
+    """Read-only, memory-mapped view of a snapshot file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.built_at, self.count, self.prefix_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f'{path} is not a suggestion snapshot')
+
+    def _offset(self, i):
+        return struct.unpack_from('<I', self._mm, HEADER.size + 4 * i)[0]
+
+    def top_records(self, prefix_b):
+        """Precomputed best record indexes for ``prefix_b``, or None when it is short enough to scan"""
+        lo, hi = 0, self.prefix_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._offset(self.count + mid)
+            prefix_len, n = TOP_LIST.unpack_from(self._mm, offset)
+            start = offset + TOP_LIST.size
+            candidate = self._mm[start:start + prefix_len]
+            if candidate == prefix_b:
+                return struct.unpack_from(f'<{n}I', self._mm, start + prefix_len)
+            if candidate < prefix_b:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def key_at(self, i):
+        offset = self._offset(i)
+        key_len = RECORD.unpack_from(self._mm, offset)[3]
+        start = offset + RECORD.size
+        return self._mm[start:start + key_len]
+
+    def record_at(self, i):
+        offset = self._offset(i)
+        weight, ref_id, kind, key_len, display_len, slug_len = RECORD.unpack_from(self._mm, offset)
+        start = offset + RECORD.size + key_len
+        display = self._mm[start:start + display_len].decode('utf-8')
+        slug = self._mm[start + display_len:start + display_len + slug_len].decode('utf-8')
+        return KINDS[kind], ref_id, display, slug, weight
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        # Lets bisect search the keys directly
+        return self.key_at(i)
+
+
+class SuggestIndex:
+    """Snapshot plus a per-worker overlay of rows committed since it was built"""
+
+    def __init__(self, path, overlay_limit=500, sync_interval=30, reload_interval=5, app=None):
+        self.path = path
+        self.overlay_limit = overlay_limit
+        self.sync_interval = sync_interval
+        self.reload_interval = reload_interval
+        self.app = app
+        self.snapshot = None
+        self._lock = threading.RLock()
+        self._overlay = {}          # (kind, ref_id) -> (committed_at, [entries])
+        self._overlay_keys = None   # sorted [(key_bytes, entry)] built lazily
+        self._pending = {kind: set() for kind in KINDS}
+        self._pending_lock = threading.Lock()
+        self._synced_at = None
+        self._checked_at = 0.0
+        self._stat_at = 0.0
+        self._builder = None
+
+    # -- maintenance -----------------------------------------------------
+
+    def on_commit(self, changes):
+        """catalog_events subscriber: remember which rows to refresh"""
+        with self._pending_lock:
+            self._pending['product'] |= changes.touched('Product')
+            self._pending['brand'] |= changes.touched('Brand')
+            self._pending['category'] |= changes.touched('Category')
+
+    def _take_pending(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {kind: set() for kind in KINDS}
+        return pending
+
+    def rebuild(self, stale_before=None):
+        """Build a new snapshot from the database and load it; returns the entry count
+
+        With ``stale_before``, a snapshot another worker wrote since then is
+        loaded instead of building a new one (and 0 is returned).
+        """
+        lock_file = None
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            lock_file = open(f'{self.path}.lock', 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            built_at = snapshot_built_at(self.path)
+            if stale_before is not None and built_at is not None and built_at >= stale_before:
+                count = 0
+            else:
+                built_at = time.time()
+                # Anything committed so far is read by the build itself
+                self._take_pending()
+                entries = build_entries()
+                write_snapshot(self.path, entries, built_at)
+                count = len(entries)
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+        with self._lock:
+            self._load()
+        return count
+
+    def _build_in_background(self):
+        """Start a rebuild thread unless one is running; lookups keep the current snapshot meanwhile"""
+        if self.app is None or (self._builder is not None and self._builder.is_alive()):
+            return
+        self._builder = threading.Thread(target=self._run_build, args=(time.time(),),
+                                         name='suggest-rebuild', daemon=True)
+        self._builder.start()
+
+    def _run_build(self, stale_before):
+        try:
+            with self.app.app_context():
+                self.rebuild(stale_before=stale_before)
+        except Exception as e:
+            print(f"Error rebuilding the suggestion index: {e}")
+
+    def _load(self):
+        snapshot = SuggestSnapshot(self.path)
+        # The old snapshot is not closed: lookups still reading it keep it
+        # mapped, and it is unmapped when the last reference goes away
+        self.snapshot = snapshot
+        # Overlay rows committed before the snapshot started building are now in it
+        self._overlay = {k: v for k, v in self._overlay.items() if v[0] >= snapshot.built_at}
+        self._overlay_keys = None
+        if self._synced_at is None:
+            self._synced_at = datetime.utcfromtimestamp(snapshot.built_at)
+            self._checked_at = time.monotonic()
+
+    def _ensure_snapshot(self):
+        now = time.monotonic()
+        if self.snapshot is not None and now - self._stat_at < self.reload_interval:
+            return
+        self._stat_at = now
+        try:
+            if self.snapshot is None or os.stat(self.path).st_mtime_ns != self.snapshot.mtime_ns:
+                self._load()
+        except (OSError, ValueError):
+            # Missing or from an older release: keep serving what we have and build a new one
+            if self._synced_at is None:
+                self._synced_at = datetime.utcnow()
+                self._checked_at = now
+            self._build_in_background()
+
+    def _refresh_overlay(self):
+        pending = self._take_pending()
+        now = time.monotonic()
+        if now - self._checked_at >= self.sync_interval:
+            # Pick up other workers' edits
+            started = datetime.utcnow()
+            pending['product'].update(row[0] for row in db.session.query(Product.id)
+                                      .filter(Product.updated_at >= self._synced_at))
+            self._synced_at = started
+            self._checked_at = now
+        if not any(pending.values()):
+            return
+
+        committed_at = time.time()
+        fresh = {(kind, ref_id): [] for kind, ids in pending.items() for ref_id in ids}
+        product_ids = sorted(pending['product'])
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            rows = _product_rows_query().filter(Product.id.in_(product_ids[start:start + BATCH_SIZE])).all()
+            for entry in _product_entries(rows):
+                fresh[('product', entry[3])].append(entry)
+        if pending['brand']:
+            for entry in _brand_entries(pending['brand']):
+                fresh[('brand', entry[3])].append(entry)
+        if pending['category']:
+            for entry in _category_entries(pending['category']):
+                fresh[('category', entry[3])].append(entry)
+
+        # An empty entry list hides the row's snapshot entries (deleted or deactivated)
+        for target, entries in fresh.items():
+            self._overlay[target] = (committed_at, entries)
+        self._overlay_keys = None
+
+        if sum(len(entries) for _, entries in self._overlay.values()) > self.overlay_limit:
+            self._build_in_background()
+
+    def refresh(self):
+        with self._lock:
+            self._ensure_snapshot()
+            self._refresh_overlay()
+
+    # -- lookup ----------------------------------------------------------
+
+    def suggest(self, query, limit=8):
+        """Best ``limit`` suggestions whose key starts with ``query``"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.refresh()
+        prefix_b = prefix.encode('utf-8')
+
+        with self._lock:
+            snapshot = self.snapshot
+            overlay = self._overlay
+            if self._overlay_keys is None:
+                self._overlay_keys = sorted(
+                    (entry[0].encode('utf-8'), entry) for _, entries in overlay.values() for entry in entries
+                )
+            overlay_keys = self._overlay_keys
+
+        best = {}
+
+        def consider(key_b, kind, ref_id, display, slug, weight):
+            ranked = score(key_b, display, weight)
+            target = (kind, ref_id)
+            if target not in best or best[target]['score'] < ranked:
+                best[target] = {'type': kind, 'id': ref_id, 'text': display, 'slug': slug, 'score': ranked}
+
+        def consider_record(i):
+            kind, ref_id, display, slug, weight = snapshot.record_at(i)
+            if (kind, ref_id) not in overlay:
+                consider(snapshot.key_at(i), kind, ref_id, display, slug, weight)
+
+        if snapshot is not None:
+            top = snapshot.top_records(prefix_b)
+            if top is not None:
+                for i in top:
+                    consider_record(i)
+            else:
+                # Fewer than MAX_SCAN keys start with the prefix, so this sees all of them
+                i = bisect_left(snapshot, prefix_b)
+                end = min(len(snapshot), i + MAX_SCAN)
+                while i < end and snapshot.key_at(i).startswith(prefix_b):
+                    consider_record(i)
+                    i += 1
+
+        j = bisect_left(overlay_keys, (prefix_b,))
+        while j < len(overlay_keys) and overlay_keys[j][0].startswith(prefix_b):
+            key_b, (key, display, kind, ref_id, slug, weight) = overlay_keys[j]
+            consider(key_b, kind, ref_id, display, slug, weight)
+            j += 1
+
+        ranked = sorted(best.values(), key=lambda s: (-s['score'], s['text']))
+        return ranked[:limit]
+
+
+def init_suggest(app):
+    """Attach a SuggestIndex to ``app`` and subscribe it to catalog commits"""
+    path = app.config.get('SUGGEST_SNAPSHOT_PATH') or os.path.join(app.instance_path, 'suggest_index.bin')
+    index = SuggestIndex(
+        path,
+        overlay_limit=app.config.get('SUGGEST_OVERLAY_LIMIT', 500),
+        sync_interval=app.config.get('SUGGEST_SYNC_INTERVAL', 30),
+        reload_interval=app.config.get('SUGGEST_RELOAD_INTERVAL', 5),
+        app=app
+    )
+    app.extensions['suggest_index'] = index
+    catalog_events.subscribe(index.on_commit)
+    return index
+
+
+def get_suggest_index():
+    return current_app.extensions['suggest_index']
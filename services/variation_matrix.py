@@ -0,0 +1,161 @@
+# services/variation_matrix.py
+"""Per-product variation matrix for the product page option picker.
+
+One query reads a product's variations with their attribute values and
+builds::
+
+    {"attributes": [{"id": 1, "name": "Size", "slug": "size",
+                     "values": [{"id": 4, "value": "M", "color": null, "image": null}, ...]}, ...],
+     "variations": {"4-9": {"id": 31, "sku": "...", "price": "499.00", "compare_price": null,
+                            "stock_status": "in_stock", "stock": 12, "available": true, "image": null}, ...},
+     "default": "4-9"}
+
+Keys are the variation's attribute value ids, sorted and joined with "-",
+so the page finds the variation for any selection without a request.
+Prices are exact decimal strings; a null price means the product's own.
+
+The matrix and its compact, HTML-safe JSON are cached per product and dropped when that
+product's variations or their attribute links change (any attribute or
+value edit drops them all, since values are shared between products).
+"""
+import json
+from collections import namedtuple
+from functools import partial
+
+from flask import current_app
+from jinja2.utils import htmlsafe_json_dumps
+from sqlalchemy import select
+
+from extension import db
+from models.product import ProductAttribute, ProductAttributeValue, ProductVariation, VariationAttribute
+from services import catalog_events
+from services.cache import VersionedCache
+
+_compact_dumps = partial(json.dumps, separators=(',', ':'))
+
+# ``data`` renders the option picker, ``json`` is embedded in the page for the script
+VariationMatrix = namedtuple('VariationMatrix', 'data json')
+
+
+def variation_key(value_ids):
+    return '-'.join(str(value_id) for value_id in sorted(value_ids))
+
+
+def _decimal(value):
+    return str(value) if value is not None else None
+
+
+def build_variation_matrix(product_id):
+    """Matrix dict for ``product_id`` from one query, or None when it has no selectable variations"""
+    rows = db.session.execute(
+        select(
+            ProductVariation.id, ProductVariation.sku, ProductVariation.price, ProductVariation.compare_price,
+            ProductVariation.stock_quantity, ProductVariation.stock_status, ProductVariation.image_url,
+            ProductVariation.is_default,
+            ProductAttribute.id.label('attribute_id'), ProductAttribute.name.label('attribute_name'),
+            ProductAttribute.slug.label('attribute_slug'), ProductAttribute.sort_order.label('attribute_sort'),
+            ProductAttributeValue.id.label('value_id'), ProductAttributeValue.value,
+            ProductAttributeValue.color_code, ProductAttributeValue.image_url.label('value_image'),
+            ProductAttributeValue.sort_order.label('value_sort')
+        ).join(VariationAttribute, VariationAttribute.variation_id == ProductVariation.id)
+        .join(ProductAttribute, ProductAttribute.id == VariationAttribute.attribute_id)
+        .join(ProductAttributeValue, ProductAttributeValue.id == VariationAttribute.attribute_value_id)
+        .where(ProductVariation.product_id == product_id)
+    ).all()
+    if not rows:
+        return None
+
+    attributes = {}
+    variations = {}
+    for row in rows:
+        attribute = attributes.setdefault(row.attribute_id, {
+            'id': row.attribute_id, 'name': row.attribute_name, 'slug': row.attribute_slug,
+            'sort': (row.attribute_sort or 0, row.attribute_name), 'values': {}
+        })
+        attribute['values'].setdefault(row.value_id, {
+            'id': row.value_id, 'value': row.value, 'color': row.color_code, 'image': row.value_image,
+            'sort': (row.value_sort or 0, row.value_id)
+        })
+        variation = variations.setdefault(row.id, {'row': row, 'value_ids': []})
+        variation['value_ids'].append(row.value_id)
+
+    matrix = {'attributes': [], 'variations': {}, 'default': None}
+    for attribute in sorted(attributes.values(), key=lambda item: item.pop('sort')):
+        values = sorted(attribute['values'].values(), key=lambda item: item.pop('sort'))
+        matrix['attributes'].append(dict(attribute, values=values))
+
+    for variation_id, variation in sorted(variations.items()):
+        row = variation['row']
+        key = variation_key(variation['value_ids'])
+        matrix['variations'][key] = {
+            'id': variation_id,
+            'sku': row.sku,
+            'price': _decimal(row.price),
+            'compare_price': _decimal(row.compare_price),
+            'stock_status': row.stock_status,
+            'stock': row.stock_quantity or 0,
+            'available': row.stock_status in ('in_stock', 'low_stock', 'on_backorder'),
+            'image': row.image_url
+        }
+        if row.is_default:
+            matrix['default'] = key
+
+    # Without a marked default, preselect the first variation in stock
+    if matrix['default'] is None:
+        matrix['default'] = next((key for key, entry in matrix['variations'].items() if entry['available']),
+                                 next(iter(matrix['variations'])))
+    return matrix
+
+
+class VariationMatrixCache:
+    """Per-process cache of each product's matrix as ready-to-embed JSON"""
+
+    def __init__(self, maxsize=2048, ttl=300):
+        self.cache = VersionedCache(maxsize=maxsize, ttl=ttl)
+        # variation id -> product id, for VariationAttribute changes that only know their variation
+        self._variation_products = {}
+
+    def get(self, product_id):
+        """VariationMatrix for ``product_id``, or None without variations"""
+        return self.cache.get_or_set(product_id, lambda: self._build(product_id))
+
+    def _build(self, product_id):
+        matrix = build_variation_matrix(product_id)
+        if matrix is None:
+            return None
+        for variation in matrix['variations'].values():
+            self._variation_products[variation['id']] = product_id
+        return VariationMatrix(matrix, htmlsafe_json_dumps(matrix, dumps=_compact_dumps))
+
+    def on_commit(self, changes):
+        """catalog_events subscriber: drop the matrices whose variations changed"""
+        if changes.touched('ProductAttribute') or changes.touched('ProductAttributeValue'):
+            self.cache.invalidate()
+            return
+        product_ids = set(changes.owner_ids('ProductVariation'))
+        for variation_id in changes.owner_ids('VariationAttribute') | changes.touched('ProductVariation'):
+            product_id = self._variation_products.get(variation_id)
+            if product_id is not None:
+                product_ids.add(product_id)
+        for product_id in product_ids:
+            self.cache.discard(product_id)
+
+
+def get_variation_matrix(product):
+    """Cached VariationMatrix for ``product`` (None for simple products)"""
+    try:
+        return current_app.extensions['variation_matrix'].get(product.id)
+    except Exception as e:
+        print(f"Error building variation matrix for product {product.id}: {e}")
+        return None
+
+
+def init_variation_matrix(app):
+    """Attach the variation matrix cache to ``app`` and keep it in step with catalog commits"""
+    matrices = VariationMatrixCache(
+        maxsize=app.config.get('VARIATION_MATRIX_CACHE_SIZE', 2048),
+        ttl=app.config.get('VARIATION_MATRIX_CACHE_TTL', 300)
+    )
+    app.extensions['variation_matrix'] = matrices
+    catalog_events.subscribe(matrices.on_commit)
+    return matrices
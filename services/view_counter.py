@@ -0,0 +1,167 @@
+# services/view_counter.py
+"""Buffered product view counting.
+
+Product pages only bump an in-process counter.  A background thread per
+worker process flushes the aggregated deltas every VIEW_COUNT_FLUSH_INTERVAL
+seconds, or sooner once VIEW_COUNT_FLUSH_THRESHOLD views are waiting, as
+one transaction of atomic ``view_count = view_count + n`` updates plus
+upserts into the hourly product_view_stats series.  Views buffered in a
+worker that dies before its next flush are lost, which is acceptable for
+analytics counters.  So are views of products deleted before the flush,
+and a batch the database rejects outright; only transient errors
+(lost connection, deadlock, lock timeout) put the batch back for the next
+flush.
+"""
+import atexit
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.exc import OperationalError
+
+from extension import db
+from models.product import Product
+from models.product_view import ProductViewStat
+
+
+def _upsert_hourly(connection, rows):
+    """Add ``rows`` [{product_id, hour, views}] to product_view_stats"""
+    table = ProductViewStat.__table__
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        statement = statement.on_duplicate_key_update(views=table.c.views + statement.inserted.views)
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.product_id, table.c.hour],
+            set_={'views': table.c.views + statement.excluded.views}
+        )
+    else:
+        for row in rows:
+            result = connection.execute(
+                update(table)
+                .where(table.c.product_id == row['product_id'], table.c.hour == row['hour'])
+                .values(views=table.c.views + row['views'])
+            )
+            if not result.rowcount:
+                connection.execute(table.insert().values(**row))
+        return
+    connection.execute(statement, rows)
+
+
+class ViewCounter:
+    """Per-process accumulator of product views"""
+
+    def __init__(self, app, flush_interval=30, flush_threshold=1000):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.enabled = True
+        self._totals = Counter()
+        self._hourly = Counter()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, product_id, count=1):
+        """Count ``count`` views of ``product_id``; never touches the database"""
+        if not self.enabled:
+            return
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        with self._lock:
+            self._totals[product_id] += count
+            self._hourly[(product_id, hour)] += count
+            self._pending += count
+            pending = self._pending
+        self._ensure_worker()
+        if pending >= self.flush_threshold:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        # One flusher per process; forked workers start their own
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write buffered views to the database; returns the number of views written"""
+        with self._lock:
+            totals, self._totals = self._totals, Counter()
+            hourly, self._hourly = self._hourly, Counter()
+            self._pending = 0
+        if not totals:
+            return 0
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    # Products deleted since they were viewed would fail the stats foreign key
+                    existing = set(connection.execute(
+                        select(Product.id).where(Product.id.in_(list(totals)))
+                    ).scalars())
+                    # Sorted by id so concurrent flushes from several workers lock rows in the same order
+                    increments = [{'b_id': product_id, 'b_views': views}
+                                  for product_id, views in sorted(totals.items()) if product_id in existing]
+                    series = [{'product_id': product_id, 'hour': hour, 'views': views}
+                              for (product_id, hour), views in sorted(hourly.items()) if product_id in existing]
+                    if increments:
+                        connection.execute(
+                            update(Product.__table__)
+                            .where(Product.id == bindparam('b_id'))
+                            .values(view_count=Product.view_count + bindparam('b_views'),
+                                    # View bumps are not product edits; keep updated_at as it was
+                                    updated_at=Product.updated_at),
+                            increments
+                        )
+                        _upsert_hourly(connection, series)
+        except OperationalError as e:
+            # Lost connection, deadlock or lock timeout: try the same views again next time
+            print(f"Error flushing product view counts, will retry: {e}")
+            with self._lock:
+                self._totals.update(totals)
+                self._hourly.update(hourly)
+                self._pending += sum(totals.values())
+            return 0
+        except Exception as e:
+            # Retrying a batch the database rejects would fail forever and grow the buffers
+            print(f"Error flushing product view counts, dropping {sum(totals.values())} views: {e}")
+            return 0
+        return sum(increment['b_views'] for increment in increments)
+
+
+def record_product_view(product_id):
+    current_app.extensions['view_counter'].record(product_id)
+
+
+def init_view_counter(app):
+    """Attach a ViewCounter to ``app`` and flush it at interpreter exit"""
+    counter = ViewCounter(
+        app,
+        flush_interval=app.config.get('VIEW_COUNT_FLUSH_INTERVAL', 30),
+        flush_threshold=app.config.get('VIEW_COUNT_FLUSH_THRESHOLD', 1000)
+    )
+    app.extensions['view_counter'] = counter
+    atexit.register(counter.flush)
+    return counter
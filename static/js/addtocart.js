@@ -3,6 +3,12 @@
 
 console.log('addtocart.js loaded');
 
+// Variation chosen in the product page option picker (static/js/variation_picker.js), if any
+function selectedVariationId(productId) {
+    const input = document.querySelector(`[data-variation-picker][data-product-id="${productId}"] input[name="variation_id"]`);
+    return input && input.value ? Number(input.value) : null;
+}
+
 // Global add to cart function
 function addToCart(productId, buttonElement) {
     console.log('Adding product to cart:', productId);
@@ -31,6 +37,7 @@ function addToCart(productId, buttonElement) {
         credentials: 'same-origin',
         body: JSON.stringify({
             product_id: productId,
+            variation_id: selectedVariationId(productId),
             quantity: 1
         })
     })
@@ -78,11 +78,11 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
 
-        const exportPDF = document.getElementById('exportPDF');
-        if (exportPDF) {
-            exportPDF.addEventListener('click', function(e) {
+        const exportJSONL = document.getElementById('exportJSONL');
+        if (exportJSONL) {
+            exportJSONL.addEventListener('click', function(e) {
                 e.preventDefault();
-                quickExport('pdf');
+                quickExport('jsonl');
             });
         }
     }
@@ -142,7 +142,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const startDate = document.getElementById('startDate').value;
         const endDate = document.getElementById('endDate').value;
 
-        let exportUrl = `/admin/orders/export?format=${format}`;
+        let exportUrl = `/admin/orders/export?${listFilters(format)}`;
 
         if (dateRange !== 'all') {
             exportUrl += `&date_range=${dateRange}`;
@@ -168,8 +168,16 @@ document.addEventListener('DOMContentLoaded', function() {
         showAlert('Export started. Your download will begin shortly.', 'success');
     }
 
+    // Exports cover every order matching the list's current filters, not just this page
+    function listFilters(format) {
+        const params = new URLSearchParams(window.location.search);
+        params.delete('page');
+        params.set('format', format);
+        return params.toString();
+    }
+
     function quickExport(format) {
-        const exportUrl = `/admin/orders/export?format=${format}`;
+        const exportUrl = `/admin/orders/export?${listFilters(format)}`;
         window.open(exportUrl, '_blank');
         showAlert(`Exporting orders as ${format.toUpperCase()}...`, 'info');
     }
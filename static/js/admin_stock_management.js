@@ -53,6 +53,13 @@ document.addEventListener('DOMContentLoaded', function() {
                         row.style.display = 'none';
                     }
                 });
+
+                // Exports follow the selected movement type
+                document.querySelectorAll('.export-movements').forEach(link => {
+                    const url = new URL(link.href, window.location.origin);
+                    url.searchParams.set('movement_type', filterValue);
+                    link.href = url.toString();
+                });
             });
         }
     }
@@ -0,0 +1,99 @@
+// static/js/variation_picker.js
+// Product option picker: looks selections up in the variation matrix embedded in the page, no requests
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-variation-picker]').forEach(initVariationPicker);
+});
+
+function initVariationPicker(picker) {
+    const matrix = JSON.parse(picker.querySelector('[data-variation-matrix]').textContent);
+    const selects = Array.from(picker.querySelectorAll('select[data-attribute-id]'));
+    const variationInput = picker.querySelector('input[name="variation_id"]');
+    const status = picker.querySelector('[data-variation-status]');
+    const priceTarget = document.querySelector('[data-product-price]');
+    const comparePriceTarget = document.querySelector('[data-product-compare-price]');
+    const imageTarget = document.querySelector('[data-product-image]');
+
+    // Matrix keys are the selected value ids, sorted numerically and joined with "-"
+    function keyFor(valueIds) {
+        return valueIds.map(Number).sort((a, b) => a - b).join('-');
+    }
+
+    function selectedIds() {
+        return selects.map(select => select.value);
+    }
+
+    function formatPrice(value) {
+        return Number(value).toLocaleString('en-IN', {style: 'currency', currency: 'INR'});
+    }
+
+    // Mark values that have no variation in stock alongside the other current selections
+    function refreshOptions() {
+        selects.forEach(function(select, index) {
+            const others = selectedIds().filter((_, i) => i !== index);
+            Array.from(select.options).forEach(function(option) {
+                const entry = matrix.variations[keyFor(others.concat(option.value))];
+                let label = option.dataset.label;
+                if (!entry) {
+                    label += ' (unavailable)';
+                } else if (!entry.available) {
+                    label += ' (out of stock)';
+                }
+                option.textContent = label;
+            });
+        });
+    }
+
+    function update() {
+        const entry = matrix.variations[keyFor(selectedIds())];
+        variationInput.value = entry && entry.available ? entry.id : '';
+
+        const price = entry && entry.price !== null ? entry.price : picker.dataset.price;
+        const comparePrice = entry && entry.compare_price !== null ? entry.compare_price : picker.dataset.comparePrice;
+        if (priceTarget) {
+            priceTarget.textContent = formatPrice(price);
+        }
+        if (comparePriceTarget) {
+            comparePriceTarget.textContent = comparePrice ? formatPrice(comparePrice) : '';
+        }
+        if (imageTarget && entry && entry.image) {
+            imageTarget.src = entry.image;
+        }
+
+        if (!entry) {
+            status.textContent = 'This combination is not available';
+            status.className = 'small mb-3 text-danger';
+        } else if (!entry.available) {
+            status.textContent = 'Out of stock';
+            status.className = 'small mb-3 text-danger';
+        } else if (entry.stock_status === 'low_stock') {
+            status.textContent = `Only ${entry.stock} left`;
+            status.className = 'small mb-3 text-warning';
+        } else {
+            status.textContent = entry.stock_status === 'on_backorder' ? 'Available on backorder' : 'In stock';
+            status.className = 'small mb-3 text-success';
+        }
+
+        picker.dispatchEvent(new CustomEvent('variationchange', {bubbles: true, detail: entry || null}));
+    }
+
+    // Start from the default variation
+    if (matrix.default) {
+        const defaultIds = matrix.default.split('-');
+        selects.forEach(function(select) {
+            const match = defaultIds.find(id => select.querySelector(`option[value="${id}"]`));
+            if (match) {
+                select.value = match;
+            }
+        });
+    }
+
+    selects.forEach(function(select) {
+        select.addEventListener('change', function() {
+            refreshOptions();
+            update();
+        });
+    });
+    refreshOptions();
+    update();
+}